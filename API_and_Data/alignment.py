@@ -0,0 +1,76 @@
+"""
+This module contains a routine that aligns many timestamped dataframes on one timeline.
+
+Joining N frames with pd.merge_ordered in a loop copies the growing result N times.
+align_frames instead builds the union of all timestamps once, reindexes every frame
+onto it and concatenates them side by side in a single step.
+"""
+import pandas as pd
+
+
+def merge_frames(frames, on: str = "timestamp") -> pd.DataFrame:
+    """
+    This function joins dataframes by calling pd.merge_ordered on each one in turn.
+
+    Args:
+        frames (list): The dataframes to join.
+        on (str): The name of the key column (default: "timestamp").
+
+    Returns:
+        pd.DataFrame: The joined dataframe.
+    """
+    dataframe = frames[0]
+    for frame in frames[1:]:
+        dataframe = pd.merge_ordered(dataframe, frame, on=on)
+    return dataframe
+
+
+def can_align(frames, on: str = "timestamp") -> bool:
+    """
+    This function checks whether the frames can be aligned in a single pass.
+    That requires unique, non-missing keys of one dtype and no value column
+    that appears in more than one frame.
+
+    Args:
+        frames (list): The dataframes to join.
+        on (str): The name of the key column (default: "timestamp").
+
+    Returns:
+        bool: True if align_frames gives the same result as merge_frames.
+    """
+    columns = [column for frame in frames for column in frame.columns if column != on]
+    if len(set(columns)) != len(columns):
+        return False
+    if len({frame[on].dtype for frame in frames}) != 1:
+        return False
+    return all(frame[on].is_unique and not frame[on].isna().any() for frame in frames)
+
+
+def align_frames(frames, on: str = "timestamp") -> pd.DataFrame:
+    """
+    This function joins dataframes on their key column into one wide dataframe.
+    The result is the same as an outer pd.merge_ordered of all frames: the rows follow
+    the sorted union of all keys and the columns follow the order of the frames.
+    Frames with duplicated keys or shared value columns are joined with merge_frames.
+
+    Args:
+        frames (list): The dataframes to join.
+        on (str): The name of the key column (default: "timestamp").
+
+    Returns:
+        pd.DataFrame: The joined dataframe.
+    """
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    if not can_align(frames, on):
+        return merge_frames(frames, on)
+
+    timeline = pd.concat([frame[on] for frame in frames], ignore_index=True)
+    timeline = pd.Index(timeline.drop_duplicates().sort_values(kind="stable"), name=on)
+    dataframe = pd.concat([frame.set_index(on).reindex(timeline) for frame in frames],
+                          axis=1).reset_index()
+    # Keep the key column where the first frame had it
+    columns = list(frames[0].columns)
+    columns += [column for frame in frames[1:] for column in frame.columns if column != on]
+    return dataframe[columns]
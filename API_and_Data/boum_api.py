@@ -10,29 +10,36 @@ The script requires the following files:
     - boum_credentials_dev.txt: file containing the dev credentials for the Boum API
 
 The script creates the following files:
-    -../data/boum_dataframe.measurements_YYYY-MM-DD.csv:
-    a CSV file containing the data for each device
+    -../data/deltas/source=boum-dataframe/date=YYYY-MM-DD.json:
+    a snapshot containing the data for each device
+    -../data/boum_checkpoints/<device_id>/*.pkl:
+    the downloaded monthly telemetry slices of each device
 """
+import os
 import time
 from asyncio.log import logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import timedelta, datetime
 
 import pandas as pd
-from boum.api_client.constants import API_URL_PROD, API_URL_DEV
 from boum.api_client.v1.client import ApiClient
 from boum.resources.device import Device
 from tqdm import tqdm
 
+from API_and_Data.alignment import align_frames
+from API_and_Data.boum_client import environment_order, get_client, remember_environment
+from API_and_Data.rate_limiter import RateLimiter
+from API_and_Data.retry_policy import (DEFAULT_POLICY, CircuitBreaker, CircuitOpenError,
+                                       RetryError, RetryPolicy, get_breaker)
 from API_and_Data.save_data import save_data
+from API_and_Data.time_index import to_naive_utc
 
-with open("../data/boum_credentials_prod.txt",
-          encoding="utf-8", mode="r") as prod_credentials:
-    username_prod = prod_credentials.readline().strip()
-    password_prod = prod_credentials.readline().strip()
-with open("../data/boum_credentials_dev.txt",
-          encoding="utf-8", mode="r") as dev_credentials:
-    username_dev = dev_credentials.readline().strip()
-    password_dev = dev_credentials.readline().strip()
+# Directory in which downloaded telemetry slices are kept between runs
+CHECKPOINT_DIR = "../data/boum_checkpoints"
+
+# Slices ending less than this before now are not checkpointed,
+# the API may not have received all of their measurements yet
+CHECKPOINT_SETTLE_TIME = timedelta(days=2)
 
 
 def open_device_list(device_list_file):
@@ -50,9 +57,10 @@ def open_device_list(device_list_file):
     return device_list
 
 
-def authenticate(mode):
+def authenticate(mode) -> ApiClient:
     """
-    This function authenticates with the Boum API using the provided credentials.
+    This function returns the authenticated client for the given mode.
+    The client is shared with all other callers and only logs in once.
 
     Args:
         mode (str): The mode (production or development)
@@ -60,47 +68,168 @@ def authenticate(mode):
     Returns:
         ApiClient: The authenticated API client
     """
-    if mode == "dev":
-        client = ApiClient(username_dev, password_dev, base_url=API_URL_DEV)
-    else:
-        client = ApiClient(username_prod, password_prod, base_url=API_URL_PROD)
-    client.connect()
-    return client
+    return get_client("dev" if mode == "dev" else "prod")
+
+
+def split_time_range(start: datetime, end: datetime, months: int = 1):
+    """
+    This function splits a time range into slices along calendar month boundaries.
+
+    Args:
+        start (datetime): The start of the range
+        end (datetime): The end of the range
+        months (int): The number of calendar months per slice
+
+    Returns:
+        list: A list of (slice_start, slice_end) tuples covering the range in order
+    """
+    slices = []
+    slice_start = start
+    while slice_start < end:
+        year, month = divmod(slice_start.month - 1 + months, 12)
+        slice_end = min(datetime(slice_start.year + year, month + 1, 1), end)
+        slices.append((slice_start, slice_end))
+        slice_start = slice_end
+    return slices
+
+
+def checkpoint_path(device_id: str, mode: str, start: datetime,
+                    end: datetime, minutes: int) -> str:
+    """
+    This function returns the path of the checkpoint file of a telemetry slice.
+
+    Args:
+        device_id (str): The Boum device ID
+        mode (str): The mode (production or development)
+        start (datetime): The start of the slice
+        end (datetime): The end of the slice
+        minutes (int): The interval between data points (in minutes)
+
+    Returns:
+        str: The path of the checkpoint file
+    """
+    return (f"{CHECKPOINT_DIR}/{device_id}/{mode}_{start:%Y%m%dT%H%M%S}_"
+            f"{end:%Y%m%dT%H%M%S}_{minutes}m.pkl")
+
+
+def get_telemetry_slice(device: Device, start: datetime, end: datetime,
+                        minutes: int, rate_limiter: RateLimiter = None,
+                        policy: RetryPolicy = None, breaker: CircuitBreaker = None,
+                        deadline: float = None):
+    """
+    This function retrieves one slice of telemetry data, retrying on connection errors
+    according to the retry policy.
+
+    Args:
+        device (Device): The Boum device
+        start (datetime): The start of the slice
+        end (datetime): The end of the slice
+        minutes (int): The interval between data points (in minutes)
+        rate_limiter (RateLimiter): Limiter to wait on before every request (optional)
+        policy (RetryPolicy): The retry policy (default: DEFAULT_POLICY)
+        breaker (CircuitBreaker): The circuit breaker of the device (optional)
+        deadline (float): The time.monotonic value after which no retry is started (optional)
+
+    Returns:
+        pd.DataFrame: The data of the slice, or None if all attempts failed
+        or the circuit breaker stayed open until the deadline
+    """
+    policy = policy or DEFAULT_POLICY
+    try:
+        return pd.DataFrame(policy.call(
+            device.get_telemetry_data, start=start, end=end,
+            interval=timedelta(minutes=minutes), breaker=breaker, deadline=deadline,
+            before_attempt=rate_limiter.wait if rate_limiter is not None else None))
+    except CircuitOpenError as open_error:
+        logger.warning("Deferring device %s from %s to %s: %s",
+                       device.device_id, start, end, open_error)
+    except RetryError as retry_error:
+        logger.error("Giving up on device %s: %s", device.device_id, retry_error)
+    return None
 
 
 def get_device_data(device_id: str, mode: str,
                     time_offset: datetime = datetime(2023, 10, 30),
-                    days: int = 610, minutes: int = 60):
+                    days: int = 610, minutes: int = 60,
+                    rate_limiter: RateLimiter = None,
+                    slice_workers: int = 4, use_checkpoints: bool = True,
+                    policy: RetryPolicy = None, deadline: float = None):
     """
     This function retrieves data from a Boum device.
+    The range is split into monthly slices that are fetched in parallel and joined in order.
+    Slices that ended at least CHECKPOINT_SETTLE_TIME ago are saved to CHECKPOINT_DIR,
+    so an interrupted download resumes with the missing slices only.
+    Slices that still fail after all retries, or whose calls the circuit breaker still
+    refuses at the deadline, are left out of the data and returned as failed slices,
+    so the caller can try them again later.
+    All slices share the time budget of the retry policy and the circuit breaker
+    of the device, so a dead device gives up quickly without affecting the others.
+    Callers that try several environments pass one deadline to all of them,
+    so the budget holds for the device and not for each environment.
 
     Args:
         device_id (str): The Boum device ID
         mode (str): The mode (production or development)
-        time_offset (datetime): The start time for the data retrieval
+        time_offset (datetime): The end time for the data retrieval
         days (int): The number of days of data to retrieve
         minutes (int): The interval between data points (in minutes)
+        rate_limiter (RateLimiter): Limiter to wait on before every request (optional)
+        slice_workers (int): The number of slices fetched at the same time
+        use_checkpoints (bool): Whether to read and write slice checkpoints
+        policy (RetryPolicy): The retry policy (default: DEFAULT_POLICY)
+        deadline (float): The time.monotonic value after which no retry is started
+        (default: the time budget of the policy, starting now)
 
     Returns:
-        pd.DataFrame: The data retrieved from the Boum device
-    """
-    client = authenticate(mode)
-    device = Device(device_id, client)
-    attempts = 0
-    while attempts <= 35:
-        try:
-            return device.get_telemetry_data(start=time_offset - timedelta(days=days),
-                                             end=time_offset,
-                                             interval=timedelta(minutes=minutes))
-        except ConnectionError as connection_error:
-            logger.error("Connection error for device %s: %s",
-                         device_id, connection_error)
-        except TimeoutError as timeout_error:
-            logger.error("Timeout error for device %s: %s",
-                         device_id, timeout_error)
-        attempts += 1
-        time.sleep(2)  # Wait for 2 seconds before retrying
-    return pd.DataFrame()
+        (dataframe, failed_slices) (pd.DataFrame, list): The data retrieved from the Boum device
+        and the (start, end) ranges of the slices that could not be retrieved, in order
+    """
+    slices = split_time_range(time_offset - timedelta(days=days), time_offset)
+    parts = {}
+    missing = []
+    failed = []
+    for index, (start, end) in enumerate(slices):
+        path = checkpoint_path(device_id, mode, start, end, minutes)
+        if use_checkpoints and os.path.exists(path):
+            parts[index] = pd.read_pickle(path)
+        else:
+            missing.append(index)
+
+    if missing:
+        policy = policy or DEFAULT_POLICY
+        if deadline is None:
+            deadline = policy.deadline()
+        breaker = get_breaker(f"boum-{mode}-{device_id}")
+        device = Device(device_id, authenticate(mode))
+        with ThreadPoolExecutor(max_workers=slice_workers) as executor:
+            futures = {executor.submit(get_telemetry_slice, device, *slices[index],
+                                       minutes, rate_limiter, policy, breaker, deadline): index
+                       for index in missing}
+            for future in as_completed(futures):
+                index = futures[future]
+                start, end = slices[index]
+                part = future.result()
+                if part is None:
+                    logger.error("Failed to retrieve data for device %s from %s to %s",
+                                 device_id, start, end)
+                    failed.append(index)
+                    continue
+                parts[index] = part
+                if use_checkpoints and end <= datetime.now() - CHECKPOINT_SETTLE_TIME:
+                    path = checkpoint_path(device_id, mode, start, end, minutes)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    part.to_pickle(f"{path}.tmp")
+                    os.replace(f"{path}.tmp", path)
+
+    failed_slices = [slices[index] for index in sorted(failed)]
+    parts = [parts[index] for index in sorted(parts) if not parts[index].empty]
+    if not parts:
+        return pd.DataFrame(), failed_slices
+    dataframe = pd.concat(parts, ignore_index=True)
+    if "timestamp" in dataframe:
+        # Neighbouring slices share their boundary timestamp
+        dataframe = dataframe.drop_duplicates(subset="timestamp").reset_index(drop=True)
+    return dataframe, failed_slices
 
 
 def create_boum_dataframe(sensor_names, boum_data):
@@ -116,22 +245,111 @@ def create_boum_dataframe(sensor_names, boum_data):
         pd.DataFrame: A dataframe containing the data from all sensors
     """
     dfs = [boum_data[device_id] for device_id in sensor_names]
-    dataframe = dfs[0]
-    for column in range(len(dfs) - 1):
-        column += 1
-        dataframe = pd.merge_ordered(dataframe, dfs[column], on="timestamp")
-    dataframe = dataframe.copy()
-    dataframe["timestamp"] = pd.to_datetime(dataframe.timestamp).dt.tz_localize(None)
+    dataframe = align_frames(dfs, on="timestamp").copy()
+    dataframe["timestamp"] = to_naive_utc(dataframe["timestamp"])
     return dataframe
 
 
-def get_boum_data(device_list_file=None):
+def fetch_device(device_id: str, rate_limiter: RateLimiter = None):
+    """
+    This function retrieves the data of a single device.
+    The environment in which the device was found before is asked first,
+    falling back to the other environment if it has no data.
+    An environment in which slices failed is not left for the other one,
+    as its data may only be unavailable for the moment.
+    All environments share one time budget, so a dead device costs at most one budget.
+
+    Args:
+        device_id (str): The Boum device ID
+        rate_limiter (RateLimiter): Limiter to wait on before every request (optional)
+
+    Returns:
+        (dataframe, failed_slices) (pd.DataFrame, list): The data retrieved from the Boum device
+        (empty if there is none) and the (start, end) ranges of the slices that could not be retrieved
+    """
+    deadline = DEFAULT_POLICY.deadline()
+    for mode in environment_order(device_id):
+        data, failed_slices = get_device_data(device_id, mode, rate_limiter=rate_limiter,
+                                              deadline=deadline)
+        if not data.empty:
+            remember_environment(device_id, mode)
+        if not data.empty or failed_slices:
+            return data, failed_slices
+    return pd.DataFrame(), []
+
+
+def describe_slices(failed_slices) -> str:
+    """
+    This function describes failed slices for log and error messages.
+
+    Args:
+        failed_slices (list): The (start, end) ranges of the failed slices
+
+    Returns:
+        str: The ranges of the failed slices
+    """
+    return ", ".join(f"{start:%Y-%m-%d} to {end:%Y-%m-%d}" for start, end in failed_slices)
+
+
+def fetch_devices_concurrently(device_list, max_workers: int = 8,
+                               requests_per_second: float = 1.0):
+    """
+    This function retrieves the data of several devices with a bounded pool of workers.
+    All workers share one rate limiter, so the API never receives
+    more than `requests_per_second` telemetry requests.
+
+    Args:
+        device_list (list): A list of Boum device IDs
+        max_workers (int): The maximum number of devices fetched at the same time
+        requests_per_second (float): The maximum number of requests per second
+
+    Returns:
+        (boum_data, failures) (dict, dict): The dataframes of all devices with data,
+        in the order of the device list, and the reason of failure for all other devices
+        and for devices whose data is incomplete
+    """
+    rate_limiter = RateLimiter(requests_per_second)
+    fetched = {}
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_device, device_id, rate_limiter): device_id
+                   for device_id in device_list}
+        with tqdm(total=len(futures), desc="Processing devices") as progress:
+            for future in as_completed(futures):
+                device_id = futures[future]
+                try:
+                    dataframe, failed_slices = future.result()
+                    if failed_slices:
+                        failures[device_id] = f"missing slices {describe_slices(failed_slices)}"
+                        logger.warning("Incomplete data for device %s: %s",
+                                       device_id, failures[device_id])
+                    elif dataframe.empty:
+                        failures[device_id] = "no data in prod or dev"
+                        logger.warning("No data for device %s", device_id)
+                    if not dataframe.empty:
+                        fetched[device_id] = dataframe
+                except Exception as exception:
+                    failures[device_id] = str(exception)
+                    logger.error("Error processing device %s: %s", device_id, exception)
+                progress.update(1)
+                progress.set_postfix(failed=len(failures))
+    boum_data = {device_id: fetched[device_id]
+                 for device_id in device_list if device_id in fetched}
+    return boum_data, failures
+
+
+def get_boum_data(device_list_file=None, concurrent: bool = False,
+                  max_workers: int = 8, requests_per_second: float = 1.0):
     """
     This function retrieves data from all Boum devices and creates a dataframe.
 
     Args:
         device_list_file (str): The path to the file containing
         the list of Boum device IDs (optional)
+        concurrent (bool): Whether to fetch the devices with a pool of workers
+        instead of one after another (default: False)
+        max_workers (int): The number of workers in concurrent mode
+        requests_per_second (float): The request limit in concurrent mode
 
     Returns:
         pd.DataFrame: A dataframe containing the data from all sensors
@@ -140,17 +358,26 @@ def get_boum_data(device_list_file=None):
         device_list_file = "../data/boum_device_list.txt"
     device_list = open_device_list(device_list_file)
     boum_data = {}
-    for device_id in tqdm(device_list, desc="Processing devices"):
-        time.sleep(5)
-        try:
-            data = get_device_data(device_id, "prod")
-            if pd.DataFrame(data).empty:
-                data = get_device_data(device_id, mode="dev")
-            if not pd.DataFrame(data).empty:
-                dataframe = pd.DataFrame(data)
-                boum_data[device_id] = dataframe
-        except Exception as exception:
-            print(f"Error processing device {device_id}: {exception}")
+    if concurrent:
+        boum_data, failures = fetch_devices_concurrently(
+            device_list, max_workers=max_workers,
+            requests_per_second=requests_per_second)
+        print(f"Retrieved {len(boum_data)} of {len(device_list)} devices, "
+              f"{len(failures)} failed or incomplete.")
+        for device_id, reason in failures.items():
+            print(f"Error processing device {device_id}: {reason}")
+    else:
+        for device_id in tqdm(device_list, desc="Processing devices"):
+            time.sleep(5)
+            try:
+                dataframe, failed_slices = fetch_device(device_id)
+                if failed_slices:
+                    print(f"Incomplete data for device {device_id}: "
+                          f"missing slices {describe_slices(failed_slices)}")
+                if not dataframe.empty:
+                    boum_data[device_id] = dataframe
+            except Exception as exception:
+                print(f"Error processing device {device_id}: {exception}")
     if not boum_data:
         return pd.DataFrame()
     sensor_names = list(boum_data)
@@ -0,0 +1,192 @@
+"""
+This module keeps one authenticated Boum API client per environment (prod/dev).
+
+The clients are created on first use, log in once and are then shared by every
+caller in the process, both in API_and_Data and in clustering_new_data.
+Each client owns a keep-alive session, so consecutive requests reuse the
+same connection. The access token is refreshed by the client itself when the
+API answers with 401, so there is no login handshake per device or per retry.
+
+It also remembers in which environment each device was found, so that later
+fetches ask that environment first instead of trying prod before dev every time.
+
+The module requires the following files:
+    - boum_credentials_prod.txt: file containing the prod credentials for the Boum API
+    - boum_credentials_dev.txt: file containing the dev credentials for the Boum API
+
+The module creates the following files:
+    -../data/boum_environments.json: the environment of each resolved device
+"""
+import json
+import os
+import threading
+
+import requests
+from boum.api_client.constants import API_URL_PROD, API_URL_DEV
+from boum.api_client.v1.client import ApiClient
+from requests.adapters import HTTPAdapter
+
+CREDENTIAL_FILES = {"prod": "../data/boum_credentials_prod.txt",
+                    "dev": "../data/boum_credentials_dev.txt"}
+BASE_URLS = {"prod": API_URL_PROD, "dev": API_URL_DEV}
+
+ENVIRONMENT_FILE = "../data/boum_environments.json"
+
+# Number of connections kept alive per environment
+POOL_SIZE = 16
+
+_credentials = {}
+_clients = {}
+_lock = threading.Lock()
+_environments = None
+_environments_lock = threading.Lock()
+
+
+def _check_mode(mode: str):
+    """
+    This function validates the environment name.
+
+    Args:
+        mode (str): The environment, either "dev" or "prod".
+
+    Raises:
+        ValueError: If an invalid environment is specified.
+    """
+    if mode not in BASE_URLS:
+        raise ValueError(f"Invalid environment: {mode}. Must be 'dev' or 'prod'.")
+
+
+def read_credentials(mode: str) -> (str, str):
+    """
+    This function reads the credentials of an environment.
+    The credential file is only read the first time.
+
+    Args:
+        mode (str): The environment, either "dev" or "prod".
+
+    Returns:
+        (username, password) (str, str): The credentials for the environment.
+    """
+    _check_mode(mode)
+    if mode not in _credentials:
+        with open(CREDENTIAL_FILES[mode], encoding="utf-8", mode="r") as credentials:
+            username = credentials.readline().strip()
+            password = credentials.readline().strip()
+        _credentials[mode] = (username, password)
+    return _credentials[mode]
+
+
+def create_session() -> requests.Session:
+    """
+    This function creates a keep-alive session with a connection pool
+    large enough for concurrent fetches.
+
+    Returns:
+        requests.Session: The session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_client(mode: str) -> ApiClient:
+    """
+    This function returns the authenticated API client of an environment.
+    The client logs in on the first call and is reused afterwards.
+
+    Args:
+        mode (str): The environment, either "dev" or "prod".
+
+    Returns:
+        ApiClient: The authenticated API client.
+
+    Raises:
+        ValueError: If an invalid environment is specified.
+    """
+    _check_mode(mode)
+    with _lock:
+        client = _clients.get(mode)
+        if client is None:
+            username, password = read_credentials(mode)
+            client = ApiClient(username, password, base_url=BASE_URLS[mode],
+                               session=create_session())
+            client.connect()
+            _clients[mode] = client
+    return client
+
+
+def reset_client(mode: str = None):
+    """
+    This function closes cached clients, so that the next call to
+    get_client logs in again. Without a mode, all clients are closed.
+
+    Args:
+        mode (str): The environment to reset, either "dev" or "prod" (optional).
+    """
+    with _lock:
+        modes = [mode] if mode is not None else list(_clients)
+        for name in modes:
+            client = _clients.pop(name, None)
+            if client is not None:
+                client.disconnect()
+
+
+def load_environments() -> dict:
+    """
+    This function loads the known environments of all devices.
+    The file is only read the first time.
+
+    Returns:
+        dict: A dictionary mapping device IDs to "dev" or "prod".
+    """
+    global _environments
+    with _environments_lock:
+        if _environments is None:
+            _environments = {}
+            if os.path.exists(ENVIRONMENT_FILE):
+                with open(ENVIRONMENT_FILE, encoding="utf-8", mode="r") as environment_file:
+                    _environments = json.load(environment_file)
+        return _environments
+
+
+def environment_order(device_id: str) -> list:
+    """
+    This function returns the environments to try for a device, in order.
+    The known environment of the device comes first, otherwise prod is tried before dev.
+
+    Args:
+        device_id (str): The Boum device ID.
+
+    Returns:
+        list: The environments to try.
+    """
+    known = load_environments().get(device_id)
+    if known == "dev":
+        return ["dev", "prod"]
+    return ["prod", "dev"]
+
+
+def remember_environment(device_id: str, mode: str):
+    """
+    This function stores the environment in which a device was found.
+    The file is replaced atomically and only written when the environment changed.
+
+    Args:
+        device_id (str): The Boum device ID.
+        mode (str): The environment, either "dev" or "prod".
+
+    Raises:
+        ValueError: If an invalid environment is specified.
+    """
+    _check_mode(mode)
+    environments = load_environments()
+    with _environments_lock:
+        if environments.get(device_id) == mode:
+            return
+        environments[device_id] = mode
+        os.makedirs(os.path.dirname(ENVIRONMENT_FILE), exist_ok=True)
+        with open(f"{ENVIRONMENT_FILE}.tmp", encoding="utf-8", mode="w") as environment_file:
+            json.dump(environments, environment_file, indent=2, sort_keys=True)
+        os.replace(f"{ENVIRONMENT_FILE}.tmp", ENVIRONMENT_FILE)
@@ -0,0 +1,226 @@
+"""
+API_and_Data/boum_sync.py
+
+This script incrementally synchronises the stored Boum history with the Boum API.
+
+For every device the timestamp of the last ingested measurement (its high-watermark)
+is kept, so each run only asks the API for data newer than that and appends it
+to the stored history of the device. The first run of a device downloads
+the full history.
+
+The script requires the following files:
+    - boum_device_list.txt: file containing the list of devices to synchronise
+
+The script creates the following files:
+    -../data/boum_watermarks.json: the last ingested timestamp and environment of each device
+    -../data/boum_history/<device_id>.pkl: the stored history of each device
+    -../data/deltas/source=boum-dataframe/date=YYYY-MM-DD.json:
+    a snapshot containing the merged history of all devices
+"""
+import json
+import os
+from asyncio.log import logger
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+from tqdm import tqdm
+
+from API_and_Data.boum_api import (create_boum_dataframe, describe_slices, get_device_data,
+                                   open_device_list)
+from API_and_Data.boum_client import environment_order, remember_environment
+from API_and_Data.rate_limiter import RateLimiter
+from API_and_Data.retry_policy import DEFAULT_POLICY
+from API_and_Data.save_data import save_data
+
+WATERMARK_FILE = "../data/boum_watermarks.json"
+HISTORY_DIR = "../data/boum_history"
+
+
+def load_watermarks() -> dict:
+    """
+    This function loads the high-watermarks of all devices.
+
+    Returns:
+        dict: A dictionary mapping device IDs to their last ingested
+        timestamp (ISO format, UTC) and environment
+    """
+    if not os.path.exists(WATERMARK_FILE):
+        return {}
+    with open(WATERMARK_FILE, encoding="utf-8", mode="r") as watermark_file:
+        return json.load(watermark_file)
+
+
+def save_watermarks(watermarks: dict):
+    """
+    This function saves the high-watermarks of all devices.
+    The file is replaced atomically, so an interrupted run never leaves it half written.
+
+    Args:
+        watermarks (dict): A dictionary mapping device IDs to their watermark
+    """
+    os.makedirs(os.path.dirname(WATERMARK_FILE), exist_ok=True)
+    with open(f"{WATERMARK_FILE}.tmp", encoding="utf-8", mode="w") as watermark_file:
+        json.dump(watermarks, watermark_file, indent=2, sort_keys=True)
+    os.replace(f"{WATERMARK_FILE}.tmp", WATERMARK_FILE)
+
+
+def history_path(device_id: str) -> str:
+    """
+    This function returns the path of the stored history of a device.
+
+    Args:
+        device_id (str): The Boum device ID
+
+    Returns:
+        str: The path of the history file
+    """
+    return f"{HISTORY_DIR}/{device_id}.pkl"
+
+
+def load_history(device_id: str) -> pd.DataFrame:
+    """
+    This function loads the stored history of a device.
+
+    Args:
+        device_id (str): The Boum device ID
+
+    Returns:
+        pd.DataFrame: The stored history, or an empty dataframe if there is none
+    """
+    path = history_path(device_id)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_pickle(path)
+
+
+def append_history(device_id: str, new_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function appends new measurements to the stored history of a device.
+    Measurements that are already stored are replaced by the new ones.
+
+    Args:
+        device_id (str): The Boum device ID
+        new_data (pd.DataFrame): The new measurements
+
+    Returns:
+        pd.DataFrame: The updated history
+    """
+    history = pd.concat([load_history(device_id), new_data], ignore_index=True)
+    history = history.drop_duplicates(subset="timestamp", keep="last")
+    history = history.sort_values("timestamp", kind="stable").reset_index(drop=True)
+    path = history_path(device_id)
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    history.to_pickle(f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return history
+
+
+def sync_device(device_id: str, watermark: dict = None, now: datetime = None,
+                initial_days: int = 610, minutes: int = 60,
+                rate_limiter: RateLimiter = None):
+    """
+    This function fetches the measurements of a device that are newer than its watermark
+    and appends them to its stored history.
+    If slices of the range could not be retrieved, the watermark only moves up to
+    the last measurement before the first failed slice, so the next run asks for
+    the failed slices again. All environments share one time budget.
+
+    Args:
+        device_id (str): The Boum device ID
+        watermark (dict): The watermark of the device, or None on the first run
+        now (datetime): The end of the requested range in UTC (default: current time)
+        initial_days (int): The number of days to download on the first run
+        minutes (int): The interval between data points (in minutes)
+        rate_limiter (RateLimiter): Limiter to wait on before every request (optional)
+
+    Returns:
+        dict: The new watermark of the device, or the old one if there was no new data
+    """
+    if now is None:
+        now = datetime.utcnow()
+    if watermark:
+        start = pd.Timestamp(watermark["timestamp"]).tz_convert(None).to_pydatetime()
+        modes = [watermark["mode"]]
+    else:
+        start = now - timedelta(days=initial_days)
+        modes = environment_order(device_id)
+    days = (now - start).total_seconds() / 86400
+    deadline = DEFAULT_POLICY.deadline()
+    for mode in modes:
+        data, failed_slices = get_device_data(device_id, mode, time_offset=now, days=days,
+                                              minutes=minutes, rate_limiter=rate_limiter,
+                                              use_checkpoints=False, deadline=deadline)
+        if not data.empty or failed_slices:
+            break
+    if data.empty:
+        return watermark
+
+    timestamps = pd.to_datetime(data["timestamp"], utc=True)
+    if watermark:
+        newer = timestamps > pd.Timestamp(watermark["timestamp"])
+        data, timestamps = data[newer.values], timestamps[newer.values]
+        if data.empty:
+            return watermark
+    append_history(device_id, data)
+    remember_environment(device_id, mode)
+    if failed_slices:
+        logger.warning("Watermark of device %s held before failed slices %s",
+                       device_id, describe_slices(failed_slices))
+        timestamps = timestamps[timestamps < pd.Timestamp(failed_slices[0][0], tz="UTC")]
+        if timestamps.empty:
+            return watermark
+    return {"timestamp": timestamps.max().isoformat(), "mode": mode}
+
+
+def sync_boum_data(device_list_file=None, initial_days: int = 610,
+                   max_workers: int = 1, requests_per_second: float = 1.0):
+    """
+    This function synchronises all devices and creates a dataframe from the stored history.
+
+    Args:
+        device_list_file (str): The path to the file containing
+        the list of Boum device IDs (optional)
+        initial_days (int): The number of days to download for devices without a watermark
+        max_workers (int): The number of devices synchronised at the same time
+        requests_per_second (float): The maximum number of requests per second
+
+    Returns:
+        pd.DataFrame: A dataframe containing the history of all devices
+    """
+    if device_list_file is None:
+        device_list_file = "../data/boum_device_list.txt"
+    device_list = open_device_list(device_list_file)
+    watermarks = load_watermarks()
+    rate_limiter = RateLimiter(requests_per_second)
+    now = datetime.utcnow()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {device_id: executor.submit(sync_device, device_id, watermarks.get(device_id),
+                                              now=now, initial_days=initial_days,
+                                              rate_limiter=rate_limiter)
+                   for device_id in device_list}
+        for device_id, future in tqdm(futures.items(), desc="Synchronising devices"):
+            try:
+                watermark = future.result()
+            except Exception as exception:
+                logger.error("Error synchronising device %s: %s", device_id, exception)
+                continue
+            if watermark:
+                watermarks[device_id] = watermark
+                save_watermarks(watermarks)
+
+    boum_data = {}
+    for device_id in device_list:
+        history = load_history(device_id)
+        if not history.empty:
+            boum_data[device_id] = history
+    if not boum_data:
+        return pd.DataFrame()
+    return create_boum_dataframe(list(boum_data), boum_data)
+
+
+if __name__ == "__main__":
+    boum_dataframe = sync_boum_data()
+    save_data(name="boum-dataframe", data=boum_dataframe)
+    print(boum_dataframe)
@@ -0,0 +1,105 @@
+"""
+This module keeps the merged dataframes small in memory.
+
+Measurements are downcast to float32 and the smallest integer type that holds them,
+and repeated strings become categoricals. Per-sensor metadata (location, orientation,
+device) is kept in a separate small table with one row per sensor instead of being
+repeated on every row of the measurements.
+
+The module creates the following files:
+    -../data/deltas/source=sensor-metadata/...: the sensor metadata table
+"""
+import pandas as pd
+
+from API_and_Data.save_data import load_data, save_data, snapshot_dates
+
+SENSOR_METADATA_NAME = "sensor-metadata"
+METADATA_COLUMNS = ["location", "orientation", "device"]
+
+
+def compact_dtypes(dataframe: pd.DataFrame, float_dtype: str = "float32",
+                   category_ratio: float = 0.5) -> pd.DataFrame:
+    """
+    This function downcasts the columns of a dataframe in place.
+    Floats become `float_dtype`, integers the smallest integer type that holds them
+    and text columns with few distinct values become categoricals.
+    Datetime and boolean columns are left as they are.
+
+    Args:
+        dataframe (pd.DataFrame): The dataframe.
+        float_dtype (str, optional): The dtype of float columns (default: "float32").
+        category_ratio (float, optional): The maximum ratio of distinct values to rows
+        for a text column to become categorical (default: 0.5).
+
+    Returns:
+        pd.DataFrame: The dataframe with compact dtypes.
+    """
+    for position in range(dataframe.shape[1]):
+        values = dataframe.iloc[:, position]
+        if pd.api.types.is_bool_dtype(values.dtype):
+            continue
+        if pd.api.types.is_float_dtype(values.dtype):
+            if values.dtype == float_dtype:
+                continue
+            values = values.astype(float_dtype)
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            values = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_object_dtype(values.dtype) and len(values):
+            try:
+                if values.nunique(dropna=True) > category_ratio * len(values):
+                    continue
+            except TypeError:
+                # Columns holding lists or other unhashable values stay as they are
+                continue
+            values = values.astype("category")
+        else:
+            continue
+        dataframe.isetitem(position, values)
+    return dataframe
+
+
+def sensor_metadata(sensor_location: dict, orientation: dict = None,
+                    devices: dict = None) -> pd.DataFrame:
+    """
+    This function builds the metadata table of the sensors.
+
+    Args:
+        sensor_location (dict): A dictionary mapping each location to its sensor IDs.
+        orientation (dict, optional): A dictionary mapping each sensor ID to its orientation.
+        devices (dict, optional): A dictionary mapping each sensor ID to its Boum device ID.
+
+    Returns:
+        pd.DataFrame: A table indexed by sensor ID (as string) with categorical
+        location, orientation and device columns.
+    """
+    locations = {str(sensor): location for location, sensors in sensor_location.items()
+                 for sensor in sensors}
+    table = pd.DataFrame(index=pd.Index(list(locations), name="sensor"))
+    table["location"] = pd.Series(locations)
+    table["orientation"] = pd.Series({str(key): value for key, value in (orientation or {}).items()})
+    table["device"] = pd.Series({str(key): value for key, value in (devices or {}).items()})
+    return table[METADATA_COLUMNS].astype("category")
+
+
+def save_sensor_metadata(table: pd.DataFrame):
+    """
+    This function saves the metadata table of the sensors.
+
+    Args:
+        table (pd.DataFrame): The metadata table.
+    """
+    save_data(SENSOR_METADATA_NAME, table, index=True)
+
+
+def load_sensor_metadata() -> pd.DataFrame:
+    """
+    This function loads the latest saved metadata table of the sensors.
+
+    Returns:
+        pd.DataFrame: The metadata table, or an empty table if none was saved.
+    """
+    saved_dates = snapshot_dates(SENSOR_METADATA_NAME)
+    if not saved_dates:
+        return pd.DataFrame(columns=METADATA_COLUMNS, index=pd.Index([], name="sensor"))
+    table = load_data(SENSOR_METADATA_NAME, first_save=saved_dates[-1])
+    return table.drop(columns=["save_date"])
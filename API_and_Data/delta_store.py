@@ -0,0 +1,519 @@
+"""
+This module stores daily snapshots of a source as content-addressed deltas.
+
+A snapshot is split into blocks of rows: one block per calendar month of its
+timestamps, or fixed-size blocks of rows for data without timestamps.
+Every block is saved as a Parquet file named after the hash of its content,
+so a block that did not change since an earlier snapshot is not written again.
+A snapshot itself is a small manifest listing its blocks in order, which makes
+each daily save append-only: only the new or changed blocks and the manifest are written.
+
+Reading the full history replays the manifests from the newest to the oldest
+and keeps the value of every column at a timestamp only once, from the newest
+snapshot that has the column at that timestamp.
+Blocks shared by several snapshots are read once.
+Compaction folds all manifests except the newest ones into a single base manifest
+with the same history and deletes the blocks that are no longer referenced.
+
+The module creates the following files:
+    -../data/deltas/source=<name>/date=YYYY-MM-DD.json: the manifest of a snapshot
+    -../data/deltas/source=<name>/blocks/<hash>.parquet: the blocks of all snapshots
+"""
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from API_and_Data.time_index import to_epoch_seconds, to_naive_utc
+
+DELTA_DIR = "../data/deltas"
+COMPRESSION = "zstd"
+
+# Number of rows per block of data without timestamps
+BLOCK_ROWS = 50000
+
+# Columns that are kept with every part of a snapshot instead of being merged per column
+SHARED_COLUMNS = ("timestamp", "save_date")
+
+
+def source_dir(name: str) -> str:
+    """
+    This function returns the directory of the deltas of a source.
+
+    Args:
+        name (str): The name of the source.
+
+    Returns:
+        str: The directory of the source.
+    """
+    return f"{DELTA_DIR}/source={name}"
+
+
+def manifest_path(name: str, save_date: date) -> str:
+    """
+    This function returns the path of the manifest of a snapshot.
+
+    Args:
+        name (str): The name of the source.
+        save_date (date): The save date.
+
+    Returns:
+        str: The path of the manifest.
+    """
+    return f"{source_dir(name)}/date={save_date}.json"
+
+
+def block_path(name: str, digest: str) -> str:
+    """
+    This function returns the path of a block.
+
+    Args:
+        name (str): The name of the source.
+        digest (str): The hash of the block.
+
+    Returns:
+        str: The path of the block.
+    """
+    return f"{source_dir(name)}/blocks/{digest}.parquet"
+
+
+def delta_dates(name: str) -> list:
+    """
+    This function lists the save dates of the snapshots of a source.
+
+    Args:
+        name (str): The name of the source.
+
+    Returns:
+        list: The save dates, oldest first.
+    """
+    saved_dates = []
+    for path in glob.glob(f"{source_dir(name)}/date=*.json"):
+        try:
+            saved_dates.append(datetime.strptime(
+                os.path.basename(path)[len("date="):-len(".json")], "%Y-%m-%d").date())
+        except ValueError:
+            continue
+    return sorted(saved_dates)
+
+
+def time_values(dataframe: pd.DataFrame):
+    """
+    This function returns the timestamps of the rows of a dataframe,
+    taken from the timestamp column or else from a datetime index.
+
+    Args:
+        dataframe (pd.DataFrame): The dataframe.
+
+    Returns:
+        pd.Series: The naive UTC timestamps, or None if the rows have no timestamps.
+    """
+    if "timestamp" in dataframe.columns:
+        values = dataframe["timestamp"]
+    elif isinstance(dataframe.index, pd.DatetimeIndex):
+        values = dataframe.index
+    else:
+        return None
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        return None
+    return to_naive_utc(values)
+
+
+def block_bounds(dataframe: pd.DataFrame) -> list:
+    """
+    This function splits the rows of a dataframe into blocks.
+    Consecutive rows of the same calendar month form a block, so a dataframe sorted
+    by time has one block per month. Rows without timestamps are split
+    into blocks of BLOCK_ROWS rows.
+
+    Args:
+        dataframe (pd.DataFrame): The dataframe.
+
+    Returns:
+        list: The (start, stop) positions of the blocks, in order.
+    """
+    length = len(dataframe)
+    timestamps = time_values(dataframe)
+    if timestamps is None:
+        return [(start, min(start + BLOCK_ROWS, length)) for start in range(0, length, BLOCK_ROWS)]
+    months = timestamps.to_numpy(dtype="datetime64[ns]").astype("datetime64[M]").view(np.int64)
+    starts = np.flatnonzero(np.diff(months)) + 1
+    edges = [0] + starts.tolist() + [length]
+    return [(start, stop) for start, stop in zip(edges[:-1], edges[1:]) if start < stop]
+
+
+def content_arrays(dataframe: pd.DataFrame, index: bool) -> list:
+    """
+    This function returns one array per column whose bytes describe the content of each row.
+    Numeric and datetime columns are used as they are, all other columns
+    (text, categoricals, timestamps with timezone) are hashed row by row.
+
+    Args:
+        dataframe (pd.DataFrame): The dataframe.
+        index (bool): Whether the index is part of the content.
+
+    Returns:
+        list: The arrays, one value per row each.
+    """
+    columns = [dataframe.iloc[:, position] for position in range(dataframe.shape[1])]
+    if index:
+        columns.append(dataframe.index.to_series(index=pd.RangeIndex(len(dataframe))))
+    arrays = []
+    for column in columns:
+        if isinstance(column.dtype, np.dtype) and column.dtype.kind in "mM":
+            arrays.append(column.to_numpy().view(np.int64))
+        elif isinstance(column.dtype, np.dtype) and column.dtype.kind in "biuf":
+            arrays.append(column.to_numpy())
+        else:
+            arrays.append(pd.util.hash_pandas_object(column, index=False).to_numpy())
+    return arrays
+
+
+def block_digest(header: bytes, arrays: list, start: int, stop: int) -> str:
+    """
+    This function hashes the content of a block of rows.
+
+    Args:
+        header (bytes): The column names and dtypes of the dataframe.
+        arrays (list): The content arrays of the dataframe (see content_arrays).
+        start (int): The position of the first row of the block.
+        stop (int): The position after the last row of the block.
+
+    Returns:
+        str: The hexadecimal hash of the block.
+    """
+    digest = hashlib.sha256(header)
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array[start:stop]).data)
+    return digest.hexdigest()
+
+
+def write_delta(name: str, dataframe: pd.DataFrame, save_date: date,
+                index: bool = False) -> (str, int):
+    """
+    This function saves a snapshot as a delta.
+    Only blocks that are not stored yet are written; the manifest of the save date
+    is replaced atomically.
+
+    Args:
+        name (str): The name of the source.
+        dataframe (pd.DataFrame): The snapshot.
+        save_date (date): The save date.
+        index (bool, optional): Whether to save the index as well (default: False).
+
+    Returns:
+        (path, written) (str, int): The path of the manifest and the number of blocks written.
+    """
+    os.makedirs(f"{source_dir(name)}/blocks", exist_ok=True)
+    timestamps = time_values(dataframe)
+    header = json.dumps([[str(column), str(dtype)] for column, dtype in dataframe.dtypes.items()]
+                        + ([[str(level) for level in dataframe.index.names]] if index else [])
+                        ).encode("utf-8")
+    arrays = content_arrays(dataframe, index)
+    blocks = []
+    written = 0
+    for start, stop in block_bounds(dataframe):
+        digest = block_digest(header, arrays, start, stop)
+        path = block_path(name, digest)
+        if not os.path.exists(path):
+            table = pa.Table.from_pandas(dataframe.iloc[start:stop], preserve_index=index)
+            pq.write_table(table, f"{path}.tmp", compression=COMPRESSION)
+            os.replace(f"{path}.tmp", path)
+            written += 1
+        entry = {"digest": digest, "rows": stop - start, "first": None, "last": None}
+        if timestamps is not None:
+            entry["first"] = str(timestamps.iloc[start:stop].min())
+            entry["last"] = str(timestamps.iloc[start:stop].max())
+        blocks.append(entry)
+    manifest = {"index": index, "columns": [str(column) for column in dataframe.columns],
+                "blocks": blocks}
+    path = manifest_path(name, save_date)
+    with open(f"{path}.tmp", encoding="utf-8", mode="w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    os.replace(f"{path}.tmp", path)
+    return path, written
+
+
+def read_manifest(name: str, save_date: date) -> dict:
+    """
+    This function reads the manifest of a snapshot.
+
+    Args:
+        name (str): The name of the source.
+        save_date (date): The save date.
+
+    Returns:
+        dict: The manifest with the blocks of the snapshot.
+    """
+    with open(manifest_path(name, save_date), encoding="utf-8", mode="r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def manifest_range(manifest: dict) -> (str, str):
+    """
+    This function returns the time range of a snapshot from its manifest.
+
+    Args:
+        manifest (dict): The manifest of the snapshot.
+
+    Returns:
+        (first, last) (str, str): The first and last timestamp in ISO format,
+        or (None, None) if the snapshot has no timestamps.
+    """
+    firsts = [block["first"] for block in manifest["blocks"] if block["first"] not in (None, "NaT")]
+    lasts = [block["last"] for block in manifest["blocks"] if block["last"] not in (None, "NaT")]
+    if not firsts:
+        return None, None
+    return str(min(pd.Timestamp(first) for first in firsts)), \
+        str(max(pd.Timestamp(last) for last in lasts))
+
+
+def in_range(block: dict, start=None, end=None) -> bool:
+    """
+    This function checks whether a block may contain timestamps in a range.
+
+    Args:
+        block (dict): The manifest entry of the block.
+        start (datetime or str, optional): The first timestamp of the range.
+        end (datetime or str, optional): The last timestamp of the range.
+
+    Returns:
+        bool: False if all timestamps of the block lie outside the range.
+    """
+    if block["first"] in (None, "NaT"):
+        return True
+    if start is not None and pd.Timestamp(block["last"]) < pd.Timestamp(start):
+        return False
+    return end is None or pd.Timestamp(block["first"]) <= pd.Timestamp(end)
+
+
+def read_blocks(name: str, digests: list, columns: list = None,
+                max_workers: int = 4) -> dict:
+    """
+    This function reads blocks with a pool of workers.
+
+    Args:
+        name (str): The name of the source.
+        digests (list): The hashes of the blocks.
+        columns (list, optional): The columns to read (default: all columns).
+        max_workers (int, optional): The number of blocks read at the same time.
+
+    Returns:
+        dict: A dictionary mapping each hash to its block as an Arrow table.
+    """
+    def read_block(digest):
+        path = block_path(name, digest)
+        wanted = None if columns is None else [
+            column for column in pq.read_schema(path).names if column in columns]
+        return pq.read_table(path, columns=wanted, use_pandas_metadata=True)
+
+    digests = list(dict.fromkeys(digests))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(digests, executor.map(read_block, digests)))
+
+
+def to_dataframe(tables: list) -> pd.DataFrame:
+    """
+    This function joins blocks into one dataframe.
+
+    Args:
+        tables (list): The blocks as Arrow tables, in order.
+
+    Returns:
+        pd.DataFrame: The joined blocks.
+    """
+    if not tables:
+        return pd.DataFrame()
+    return pa.concat_tables(tables, promote_options="default").to_pandas()
+
+
+def read_delta(name: str, save_date: date = None, columns: list = None, start=None,
+               end=None, max_workers: int = 4) -> pd.DataFrame:
+    """
+    This function reads one snapshot from its blocks.
+    Blocks outside the requested time range are skipped.
+
+    Args:
+        name (str): The name of the source.
+        save_date (date, optional): The save date (default: the newest snapshot).
+        columns (list, optional): The columns to read (default: all columns).
+        start (datetime or str, optional): Skip blocks that end before this time.
+        end (datetime or str, optional): Skip blocks that start after this time.
+        max_workers (int, optional): The number of blocks read at the same time.
+
+    Returns:
+        pd.DataFrame: The snapshot.
+    """
+    if save_date is None:
+        saved_dates = delta_dates(name)
+        if not saved_dates:
+            return pd.DataFrame()
+        save_date = saved_dates[-1]
+    digests = [block["digest"] for block in read_manifest(name, save_date)["blocks"]
+               if in_range(block, start, end)]
+    tables = read_blocks(name, digests, columns, max_workers)
+    return to_dataframe([tables[digest] for digest in digests])
+
+
+class NewestFirstMerge:
+    """
+    The NewestFirstMerge class combines the snapshots of a source from the newest to the oldest.
+    Every column keeps its value at a timestamp from the newest snapshot that has the column,
+    so the columns of a device that is missing from a newer snapshot, e.g. because it could
+    not be retrieved on that day, are still taken from the older snapshots.
+    Columns that were taken from the same snapshots so far share the timestamps seen for them,
+    so every snapshot is only split into as many parts as there are such groups of columns.
+
+    Attributes:
+        parts (list): The new parts of the snapshots added so far.
+        origins (dict): The snapshots each column was taken from so far, by column.
+        seen (dict): The timestamps (in seconds) seen for each group of origins.
+        count (int): The number of snapshots added so far.
+    """
+
+    def __init__(self):
+        """
+        Initializes the NewestFirstMerge class.
+        """
+        self.parts = []
+        self.origins = {}
+        self.seen = {(): np.array([], dtype=np.int64)}
+        self.count = 0
+
+    def add(self, dataframe: pd.DataFrame, seconds: np.ndarray):
+        """
+        Adds the next older snapshot and keeps the values it adds.
+
+        Args:
+            dataframe (pd.DataFrame): The snapshot.
+            seconds (np.ndarray): The timestamps of its rows in seconds since the epoch.
+        """
+        shared = [column for column in SHARED_COLUMNS if column in dataframe.columns]
+        groups = {}
+        for column in dataframe.columns:
+            if column not in shared:
+                groups.setdefault(self.origins.get(column, ()), []).append(column)
+        for origin, columns in groups.items():
+            new = ~np.isin(seconds, self.seen[origin])
+            if new.any():
+                self.parts.append(dataframe.loc[new, shared + columns])
+            key = origin + (self.count,)
+            self.seen[key] = np.union1d(self.seen[origin], seconds)
+            self.origins.update(dict.fromkeys(columns, key))
+        self.count += 1
+        # Forget the timestamps of groups that no column belongs to anymore
+        keys = set(self.origins.values())
+        self.seen = {key: seen for key, seen in self.seen.items() if key == () or key in keys}
+
+    def result(self) -> pd.DataFrame:
+        """
+        Returns the combined snapshots with one row per timestamp.
+
+        Returns:
+            pd.DataFrame: The combined snapshots, sorted by timestamp.
+        """
+        if not self.parts:
+            return pd.DataFrame()
+        dataframe = pd.concat(self.parts,
+                              ignore_index=all(part.index.name is None for part in self.parts))
+        by_column = "timestamp" in dataframe.columns
+        keys = dataframe["timestamp"] if by_column else dataframe.index
+        if keys.duplicated().any():
+            # Parts of one timestamp hold different columns, and the newest part comes first
+            grouped = dataframe.groupby("timestamp" if by_column else dataframe.index,
+                                        sort=False, dropna=False)
+            dataframe = grouped.first()
+            if by_column:
+                dataframe = dataframe.reset_index()
+        if by_column:
+            return dataframe.sort_values("timestamp", kind="stable", ignore_index=True)
+        return dataframe.sort_index(kind="stable")
+
+
+def replay(name: str, start=None, end=None, until: date = None,
+           max_workers: int = 4, with_save_date: bool = False) -> pd.DataFrame:
+    """
+    This function reads the full history of a source from all its snapshots.
+    The manifests are replayed from the newest to the oldest and the value of every column
+    at a timestamp is kept only once, from the newest snapshot that has the column.
+    Without timestamps, the newest snapshot is returned.
+
+    Args:
+        name (str): The name of the source.
+        start (datetime or str, optional): Skip blocks that end before this time.
+        end (datetime or str, optional): Skip blocks that start after this time.
+        until (date, optional): Ignore snapshots saved after this date.
+        max_workers (int, optional): The number of blocks read at the same time.
+        with_save_date (bool, optional): Whether to add a save_date column with the date
+        of the snapshot each row was taken from.
+
+    Returns:
+        pd.DataFrame: The history, sorted by timestamp.
+    """
+    saved_dates = [saved_date for saved_date in delta_dates(name)
+                   if until is None or saved_date <= until]
+    origins = {}
+    for save_date in reversed(saved_dates):
+        for block in read_manifest(name, save_date)["blocks"]:
+            if in_range(block, start, end):
+                origins.setdefault(block["digest"], save_date)
+    digests = list(origins)
+    tables = read_blocks(name, digests, max_workers=max_workers)
+
+    merge = NewestFirstMerge()
+    for digest in digests:
+        dataframe = tables[digest].to_pandas()
+        timestamps = time_values(dataframe)
+        if timestamps is None:
+            return read_delta(name, saved_dates[-1], max_workers=max_workers)
+        if with_save_date:
+            dataframe = dataframe.assign(save_date=str(origins[digest]))
+        merge.add(dataframe, to_epoch_seconds(timestamps))
+    return merge.result()
+
+
+def compact(name: str, keep: int = 7, max_workers: int = 4) -> int:
+    """
+    This function folds all snapshots except the newest `keep` ones into one base snapshot
+    with the same history and deletes the blocks that are no longer referenced.
+    Replaying the source gives the same result before and after compaction.
+
+    Args:
+        name (str): The name of the source.
+        keep (int, optional): The number of newest snapshots that are kept as they are.
+        max_workers (int, optional): The number of blocks read at the same time.
+
+    Returns:
+        int: The number of deleted blocks.
+    """
+    saved_dates = delta_dates(name)
+    folded = saved_dates[:-keep] if keep > 0 else saved_dates
+    if len(folded) > 1:
+        base_date = folded[-1]
+        history = replay(name, until=base_date, max_workers=max_workers)
+        index = any(level is not None for level in history.index.names)
+        write_delta(name, history, base_date, index=index)
+        for save_date in folded[:-1]:
+            os.remove(manifest_path(name, save_date))
+
+    referenced = set()
+    for save_date in delta_dates(name):
+        referenced.update(block["digest"] for block in read_manifest(name, save_date)["blocks"])
+    deleted = 0
+    for path in glob.glob(f"{source_dir(name)}/blocks/*.parquet"):
+        if os.path.basename(path)[:-len(".parquet")] not in referenced:
+            os.remove(path)
+            deleted += 1
+    return deleted
+
+
+if __name__ == "__main__":
+    for source in ("boum-dataframe", "fyta-dataframe", "weather-dataframe"):
+        print(f"Compacted {source}: {compact(source)} blocks deleted")
@@ -3,60 +3,86 @@ This script is used to retrieve data from the Fyta API and save it as a CSV file
 
 The script requires the following files:
     - fyta_credentials.txt: A file containing the Fyta username and password
+    - sensor_registry.json: A file containing the location of each sensor
 
 The script creates the following files:
-    -../data/fyta_dataframe.measurements_YYYY-MM-DD.csv:
-    a CSV file containing the combined dataframe for each sensor for each plant.
+    -../data/deltas/source=fyta-dataframe/date=YYYY-MM-DD.json:
+    a snapshot containing the combined dataframe for each sensor for each plant.
 """
-from datetime import datetime
+from asyncio.log import logger
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+
+from API_and_Data.alignment import align_frames
+from API_and_Data.compact_frames import compact_dtypes, save_sensor_metadata
+from API_and_Data.save_data import save_data
+from API_and_Data.sensor_registry import load_registry
+from API_and_Data.time_index import to_naive_utc
 
 # Base URL for Fyta API
 BASE_URL = "https://web.fyta.de/api"
 
+# Maximum number of measurement requests in flight at the same time
+MAX_WORKERS = 8
+
 # Read Fyta credentials from file
 with open("../data/fyta_credentials.txt", encoding="utf-8", mode="r") as fyta_file:
     username = fyta_file.readline().strip()
     password = fyta_file.readline().strip()
 
-# Dictionary mapping sensor location to sensor IDs
-sensor_locations = {"tank": [21328, 21335, 14541, 21355, 21352, 21349, 21344, 21339],
-                    "sun": [21329, 21332, 21356, 21347, 21337, 21353, 21350, 21326, 21345, 21341],
-                    "pot": [21331, 21334, 14539, 21348, 21338, 21354, 21351, 21327, 21346, 21343]}
+
+def create_session(pool_size=MAX_WORKERS):
+    """
+    Creates a keep-alive session, so that all requests reuse the same connections.
+
+    Args:
+        pool_size (int): Number of connections kept alive
+
+    Returns:
+        requests.Session: The session
+    """
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return session
 
 
-def authentication(user, pwd):
+def authentication(user, pwd, session=None):
     """
     Authenticates with the Fyta API using the provided username and password.
 
     Args:
         user (str): Fyta username
         pwd (str): Fyta password
+        session (requests.Session): Session to send the request with (optional)
 
     Returns:
         dict: Dictionary containing the authentication token and expiration time
     """
+    http = session or requests
     headers = {"Content-Type": "application/json"}
     login = {"email": user, "password": pwd}
-    auth = requests.post(f"{BASE_URL}/auth/login", headers=headers, json=login, timeout=60).json()
+    auth = http.post(f"{BASE_URL}/auth/login", headers=headers, json=login, timeout=60).json()
     headers = {"Authorization": f"Bearer {auth['access_token']}",
                "Content-Type": "application/json"}
     return headers
 
 
-def get_plants(headers):
+def get_plants(headers, session=None):
     """
     Retrieves the list of plant associated with the authenticated user.
 
     Args:
         headers (dict): Dictionary containing the authentication token
+        session (requests.Session): Session to send the request with (optional)
 
     Returns:
         dict: Dictionary containing the plant list and pagination information
     """
-    return requests.get(f"{BASE_URL}/user-plant", headers=headers, timeout=60).json()
+    http = session or requests
+    return http.get(f"{BASE_URL}/user-plant", headers=headers, timeout=60).json()
 
 
 def get_sensor_ids(plants):
@@ -72,28 +98,116 @@ def get_sensor_ids(plants):
     return [plant["id"] for plant in plants["plants"]]
 
 
-def get_fyta_data(user=username, pwd=password):
+def get_measurements(session, headers, sensor_id, timeline="month", anchor=None):
+    """
+    Retrieves one page of measurements of a plant.
+
+    Args:
+        session (requests.Session): Session to send the request with
+        headers (dict): Dictionary containing the authentication token
+        sensor_id (int): ID of the plant
+        timeline (str): Length of the page ("day", "week" or "month")
+        anchor (date): Last day of the page (default: today)
+
+    Returns:
+        pandas.DataFrame: Measurements of the page
+    """
+    search = {"timeline": timeline}
+    if anchor is not None:
+        search["date"] = f"{anchor:%Y-%m-%d}"
+    timeseries = session.post(
+        f"{BASE_URL}/user-plant/measurements/{sensor_id}",
+        headers=headers, json={"search": search}, timeout=60).json()
+    return pd.DataFrame.from_dict(timeseries["measurements"])
+
+
+def get_sensor_history(session, headers, sensor_id, months=1):
+    """
+    Retrieves the measurements of a plant by walking back one month per page.
+    The walk stops early when a page is empty or does not reach further back
+    than the page before it, e.g. because the API ignores the anchor date.
+
+    Args:
+        session (requests.Session): Session to send the request with
+        headers (dict): Dictionary containing the authentication token
+        sensor_id (int): ID of the plant
+        months (int): Number of monthly pages to retrieve
+
+    Returns:
+        pandas.DataFrame: Measurements of the plant, oldest first
+    """
+    today = pd.Timestamp.now().normalize()
+    pages = []
+    oldest = None
+    for page in range(months):
+        anchor = None if page == 0 else (today - pd.DateOffset(months=page)).date()
+        measurements = get_measurements(session, headers, sensor_id, anchor=anchor)
+        if measurements.empty:
+            break
+        # The timestamp is the last column
+        first = pd.to_datetime(measurements[measurements.columns[-1]], utc=True).min()
+        if oldest is not None and not first < oldest:
+            logger.warning("Page %s of plant %s does not go back further than %s, "
+                           "stopping the walk", page, sensor_id, oldest)
+            break
+        oldest = first
+        pages.append(measurements)
+    if not pages:
+        return pd.DataFrame()
+    history = pd.concat(pages[::-1], ignore_index=True)
+    # Neighbouring pages overlap at their boundary; the timestamp is the last column
+    history = history.drop_duplicates(subset=history.columns[-1], keep="last")
+    return history.sort_values(history.columns[-1], kind="stable").reset_index(drop=True)
+
+
+def harvest_measurements(user, pwd, months=1, max_workers=MAX_WORKERS):
+    """
+    Retrieves the measurements of all plants concurrently over one keep-alive session.
+    At most `max_workers` requests are in flight at the same time.
+
+    Args:
+        user (str): Fyta username
+        pwd (str): Fyta password
+        months (int): Number of monthly pages to retrieve per plant
+        max_workers (int): Maximum number of parallel requests
+
+    Returns:
+        dict: Dictionary mapping plant IDs (as strings) to their measurements,
+        in the order of the plant list
+    """
+    session = create_session(max_workers)
+    headers = authentication(user, pwd, session)
+    sensor_ids = get_sensor_ids(get_plants(headers, session))
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(get_sensor_history, session, headers,
+                                   sensor_id, months): sensor_id
+                   for sensor_id in sensor_ids}
+        for future in as_completed(futures):
+            sensor_id = futures[future]
+            try:
+                fetched[sensor_id] = future.result()
+            except Exception as exception:
+                logger.error("Error retrieving plant %s: %s", sensor_id, exception)
+    session.close()
+    return {f"{sensor_id}": fetched[sensor_id]
+            for sensor_id in sensor_ids if sensor_id in fetched}
+
+
+def get_fyta_data(user=username, pwd=password, months=1, max_workers=MAX_WORKERS):
     """
     Retrieves data from Fyta and saves it as a CSV file.
 
     Args:
         user (str): Fyta username (default: username from credential file)
         pwd (str): Fyta password (default: password from credential file)
+        months (int): Number of months to retrieve per plant (default: 1)
+        max_workers (int): Maximum number of parallel requests (default: MAX_WORKERS)
 
     Returns:
         pandas.DataFrame: Combined data from Fyta sensors
     """
-    headers = authentication(user, pwd)
-    plants = get_plants(headers)
-    sensor_ids = get_sensor_ids(plants)
-    measurements = {}
-    for sensor_id in sensor_ids:
-        data = {"search": {"timeline": "month"}}
-        timeseries = requests.post(
-            f"{BASE_URL}/user-plant/measurements/{sensor_id}",
-            headers=headers, json=data, timeout=60).json()
-        key_name = f"{sensor_id}"
-        measurements[key_name] = pd.DataFrame.from_dict(timeseries["measurements"])
+    measurements = harvest_measurements(user, pwd, months, max_workers)
 
     for sensor, value in measurements.items():
         for col in value.columns:
@@ -102,12 +216,14 @@ def get_fyta_data(user=username, pwd=password):
             measurements[sensor].rename(
                 columns={measurements[sensor].columns[-1]: "timestamp"}, inplace=True)
     sensor_names = list(measurements)
-    return create_dataframe(sensor_names, measurements, sensor_locations)
+    return create_dataframe(sensor_names, measurements, load_registry().sensor_location())
 
 
 def create_dataframe(sensor_names, measurements, sensor_location):
     """
     Combines the data from each sensor into a single dataframe.
+    The location of each sensor is saved in the sensor metadata table
+    instead of a column per sensor, and the measurements are stored in compact dtypes.
 
     Args:
         sensor_names (list): List of sensor names
@@ -118,22 +234,13 @@ def create_dataframe(sensor_names, measurements, sensor_location):
         pandas.DataFrame: Combined data from Fyta sensors
     """
     dfs = [measurements[sensor] for sensor in sensor_names]
-    dataframe = dfs[0]
-    for cols in range(1, len(dfs)):
-        if "timestamp" in dfs[cols]:
-            dataframe = pd.merge_ordered(dataframe, dfs[cols], on="timestamp")
-    dataframe = dataframe.copy()
-    for location in sensor_location:
-        for sensor in sensor_location[location]:
-            name = f"location_{sensor}"
-            dataframe[name] = location
+    dfs = dfs[:1] + [frame for frame in dfs[1:] if "timestamp" in frame]
+    dataframe = align_frames(dfs, on="timestamp").copy()
     if "timestamp" in dataframe:
-        dataframe["timestamp"] = pd.to_datetime(dataframe["timestamp"])
-    dataframe = pd.DataFrame(dataframe)
-    current_date = datetime.now().date()
-    filename = f"data/fyta-dataframe.measurements_{current_date}.csv"
-    dataframe.to_csv(filename, index=False)
-    print(f"Data saved successfully as {filename}.")
+        dataframe["timestamp"] = to_naive_utc(dataframe["timestamp"])
+    dataframe = compact_dtypes(pd.DataFrame(dataframe))
+    save_sensor_metadata(load_registry().metadata(sensor_location))
+    save_data("fyta-dataframe", dataframe)
     return dataframe
 
 
@@ -1,14 +1,11 @@
 """
 This script is used to retrieve data from various sources and save it as a CSV file.
 """
-import os
-
-import pandas as pd
-
 from API_and_Data.merge_data import merge_dataframe
 from API_and_Data.boum_api import get_boum_data
 from API_and_Data.fyta_api import get_fyta_data
-from API_and_Data.weather_api import get_weather_data
+from API_and_Data.snapshot_loader import load_snapshots
+from API_and_Data.weather_api import get_grid_weather_data
 
 
 class GetData:
@@ -26,6 +23,9 @@ class GetData:
     def get_data(coordinates_dict=None, norm=False):
         """
         Retrieves data from various sources and returns it as a Pandas DataFrame.
+        The weather data is retrieved and merged once per model grid cell, with columns such as
+        temperature_2m_<cell_id>. The cell of each device is saved in the "weather-cells" snapshot
+        and its columns are resolved with weather_api.device_column.
 
         Args:
             coordinates_dict (dict):
@@ -39,29 +39,21 @@ class GetData:
         print("Retrieving weather_data...")
         boum_dataframe = get_boum_data()
         fyta_dataframe = get_fyta_data()
-        weather_dataframe = get_weather_data(coordinates_dict)
+        weather_dataframe, _ = get_grid_weather_data(coordinates_dict)
         return merge_dataframe(boum_dataframe, fyta_dataframe, weather_dataframe, norm=norm)
 
     def merge_all_dataframes(self):
         """
         Merges all dataframes into one dataframe.
+        The snapshots of each source are read in parallel and
+        timestamps that occur in several snapshots are kept only once.
 
         Returns:
             pandas.DataFrame: the merged data
         """
-        boum_cdf = pd.DataFrame()
-        fyta_cdf = pd.DataFrame()
-        weather_cdf = pd.DataFrame()
-        for file in os.listdir(self.path):
-            if file.startswith("boum-dataframe.measurement"):
-                boum_cdf1 = pd.read_csv("../weather_data/" + file, low_memory=False)
-                boum_cdf = pd.concat([boum_cdf, boum_cdf1])
-            elif file.startswith("fyta-dataframe.measurement"):
-                fyta_cdf1 = pd.read_csv("../weather_data/" + file, low_memory=False)
-                fyta_cdf = pd.concat([fyta_cdf, fyta_cdf1])
-            elif file.startswith("weather-dataframe.measurement"):
-                weather_cdf1 = pd.read_csv("../weather_data/" + file, low_memory=False)
-                weather_cdf = pd.concat([weather_cdf, weather_cdf1])
+        boum_cdf = load_snapshots("boum-dataframe")
+        fyta_cdf = load_snapshots("fyta-dataframe")
+        weather_cdf = load_snapshots("weather-grid")
         return merge_dataframe(boum_cdf, fyta_cdf, weather_cdf, norm=False)
 
 
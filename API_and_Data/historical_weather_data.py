@@ -3,7 +3,8 @@ This module contains a function that calls the OpenWeatherMap API
 to retrieve historical weather data.
 """
 import pandas as pd
-import requests
+
+from API_and_Data.weather_cache import get_archive_data
 
 
 def call_historical_weather_data(lat: float, lon: float, start_date: str,
@@ -23,12 +24,10 @@ def call_historical_weather_data(lat: float, lon: float, start_date: str,
     Returns:
         pd.DataFrame: historical weather data
     """
-    api_url = "https://archive-api.open-meteo.com/v1/archive"
     params = {"latitude": lat, "longitude": lon, "start_date": start_date,
               "end_date": end_date, "hourly": hourly,
               "timezone": timezone}
-    response = requests.get(api_url, params=params, timeout=60)
-    data = response.json()
+    data = get_archive_data(params)
     hist_weather = pd.DataFrame(data)
     hist_weather = hist_weather[hist_weather["is_day"] == 1]
     hist_weather = hist_weather.set_index("time")
@@ -4,7 +4,9 @@ This module contains functions for merging three dataframes based on their times
 import numpy as np
 import pandas as pd
 
+from API_and_Data.compact_frames import compact_dtypes
 from API_and_Data.save_data import save_data
+from API_and_Data.time_index import normalise_time_column
 
 
 def merge_dataframe(data_1, data_2, data_3, norm=False):
@@ -25,10 +27,7 @@ def merge_dataframe(data_1, data_2, data_3, norm=False):
             data.drop(columns=["Unnamed: 0"], inplace=True)
     dataframe = pd.merge_ordered(pd.merge_ordered(
         data_1, data_2, on="timestamp"), data_3, on="timestamp")
-    dataframe = dataframe.copy()
-    dataframe["timestamp"] = pd.to_datetime(dataframe.timestamp).dt.tz_localize(None)
-    dataframe["timestamp"] = dataframe["timestamp"].apply(lambda x: x.value // 10 ** 6 // 1000)
-    dataframe["timestamp"] = pd.to_datetime(dataframe["timestamp"], unit="s")
+    dataframe = compact_dtypes(normalise_time_column(dataframe.copy(), "timestamp"))
     dataframe["time"] = dataframe["timestamp"]
     save_data("complete-dataframe", dataframe)
     dataframe = dataframe.set_index("timestamp")
@@ -41,6 +40,50 @@ def merge_dataframe(data_1, data_2, data_3, norm=False):
     return dataframe
 
 
+def split_numeric(data):
+    """
+    Splits the column positions of the dataframe into non-numeric and numeric columns.
+    Only the dtypes are inspected, the data itself is not copied.
+    The numeric columns are ordered by their first index level, as a groupby would.
+
+    Args:
+        data (DataFrame): The dataframe to split.
+
+    Returns:
+        (other_columns, numeric_columns) (list, list): The positions of the non-numeric
+        columns in their original order and of the numeric columns grouped by their
+        first index level.
+    """
+    numeric = set(data.iloc[:0].select_dtypes(include=np.number).columns)
+    other_columns = [position for position, column in enumerate(data.columns)
+                     if column not in numeric]
+    numeric_columns = sorted((position for position, column in enumerate(data.columns)
+                              if column in numeric),
+                             key=lambda position: data.columns[position][0]
+                             if isinstance(data.columns[position], tuple)
+                             else data.columns[position])
+    return other_columns, numeric_columns
+
+
+def order_columns(data):
+    """
+    Moves the numeric columns behind the non-numeric ones, grouped by their first index level.
+    The rows are sorted by timestamp.
+
+    Args:
+        data (DataFrame): The dataframe to order.
+
+    Returns:
+        (dataframe, numeric_columns) (DataFrame, list): The ordered dataframe
+        and the positions of its numeric columns.
+    """
+    other_columns, numeric_columns = split_numeric(data)
+    dataframe = data.take(other_columns + numeric_columns, axis=1)
+    if not dataframe.index.is_monotonic_increasing:
+        dataframe = dataframe.sort_index(kind="stable")
+    return dataframe, list(range(len(other_columns), dataframe.shape[1]))
+
+
 def group_index(data):
     """
     Groups the dataframe by its index level and selects only numeric columns.
@@ -51,19 +94,15 @@ def group_index(data):
     Returns:
         DataFrame: The grouped and numeric dataframe.
     """
-    df_grouped = data.groupby(level=0, axis=1).apply(lambda x: x.select_dtypes(include=np.number))
-    df_grouped.columns = df_grouped.columns.droplevel(0)
-    dataframe = data.drop(columns=df_grouped.columns, axis=1)
-    dataframe = pd.merge_ordered(dataframe, df_grouped, on="timestamp")
-    dataframe = dataframe.copy()
-    save_data("complete-dataframe", dataframe)
-    dataframe.set_index("timestamp", inplace=True)
+    dataframe, _ = order_columns(data)
+    save_data("complete-dataframe", dataframe, index=True)
     return dataframe
 
 
 def normalize_df(data):
     """
     Normalizes the dataframe by dividing each column by its maximum value.
+    The numeric columns are divided one at a time, so no second copy of the frame is made.
 
     Args:
         data (DataFrame): The dataframe to normalize.
@@ -71,13 +110,11 @@ def normalize_df(data):
     Returns:
         DataFrame: The normalized dataframe.
     """
-    df_norm = data.groupby(level=0, axis=1).apply(
-        lambda x: x.select_dtypes(include=np.number) / x.select_dtypes(include=np.number).max())
-    df_norm.columns = df_norm.columns.droplevel(0)
-    dataframe = data.drop(columns=df_norm.columns, axis=1)
-    dataframe = pd.merge_ordered(dataframe, df_norm, on="timestamp")
-    save_data("norm-complete-dataframe", dataframe)
-    dataframe.set_index("timestamp", inplace=True)
+    dataframe, numeric_columns = order_columns(data)
+    for position in numeric_columns:
+        values = dataframe.iloc[:, position]
+        dataframe.isetitem(position, values / values.max())
+    save_data("norm-complete-dataframe", dataframe, index=True)
     return dataframe
 
 
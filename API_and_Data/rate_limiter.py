@@ -0,0 +1,39 @@
+"""
+This module contains a small thread-safe rate limiter used to throttle API calls
+that are issued from several worker threads at once.
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    The RateLimiter class spaces calls so that at most a given number
+    of calls per second is issued, no matter how many threads share it.
+
+    Attributes:
+        interval (float): The minimum number of seconds between two calls.
+    """
+
+    def __init__(self, calls_per_second: float = 1.0):
+        """
+        Initializes the RateLimiter class.
+
+        Args:
+            calls_per_second (float): The maximum number of calls per second.
+            A value of 0 or None disables the limit.
+        """
+        self.interval = 1.0 / calls_per_second if calls_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_call = time.monotonic()
+
+    def wait(self):
+        """
+        Blocks the calling thread until it is allowed to issue the next call.
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,265 @@
+"""
+This module contains the retry policy shared by all calls to the Boum API.
+
+Failed calls are retried with exponential backoff and jitter until either the
+number of attempts or the time budget of the caller runs out. A circuit breaker
+per device counts consecutive failures; once a device keeps failing, its calls
+wait for the breaker to let a trial call through instead of retrying on their own,
+and give up with CircuitOpenError when the time budget does not allow waiting.
+Every device has its own breaker, so one broken device does not stop the others.
+"""
+import random
+import threading
+import time
+from asyncio.log import logger
+
+import requests
+
+# Seconds between two checks of a breaker whose trial call is still running
+TRIAL_POLL_INTERVAL = 1.0
+
+
+class RetryError(Exception):
+    """
+    Raised when a call still fails after all attempts or when its time budget is used up.
+    """
+
+
+class CircuitOpenError(RetryError):
+    """
+    Raised when a call is refused because the circuit breaker of its endpoint is open
+    and the time budget does not allow waiting for it. The call may be tried again later.
+    """
+
+
+def is_retryable(exception: Exception) -> bool:
+    """
+    This function decides whether a failed call is worth retrying.
+    Connection problems, timeouts, rate limiting (429) and server errors (5xx) are retried,
+    all other errors are raised immediately.
+
+    Args:
+        exception (Exception): The exception raised by the call.
+
+    Returns:
+        bool: True if the call should be retried.
+    """
+    if isinstance(exception, (ConnectionError, TimeoutError,
+                              requests.exceptions.ConnectionError,
+                              requests.exceptions.Timeout)):
+        return True
+    if isinstance(exception, requests.exceptions.HTTPError) and exception.response is not None:
+        status = exception.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    The CircuitBreaker class stops calls to an endpoint that is failing consistently.
+
+    After `failure_threshold` consecutive failures the breaker opens and refuses all calls.
+    After `reset_timeout` seconds it lets a single trial call through; a success closes
+    the breaker again, a failure keeps it open for another `reset_timeout` seconds.
+
+    Attributes:
+        name (str): The name of the endpoint.
+        failure_threshold (int): The number of consecutive failures that open the breaker.
+        reset_timeout (float): The number of seconds the breaker stays open.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 10, reset_timeout: float = 60.0):
+        """
+        Initializes the CircuitBreaker class.
+
+        Args:
+            name (str): The name of the endpoint.
+            failure_threshold (int): The number of consecutive failures that open the breaker.
+            reset_timeout (float): The number of seconds the breaker stays open.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        """
+        Checks whether a call may be issued.
+
+        Returns:
+            bool: True if the breaker is closed or a trial call is due.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if (not self._trial_running
+                    and time.monotonic() - self._opened_at >= self.reset_timeout):
+                self._trial_running = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """
+        Returns how long a refused call should wait before asking the breaker again.
+
+        Returns:
+            float: The number of seconds, 0 if the breaker is closed or a trial call is due.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            return max(remaining, TRIAL_POLL_INTERVAL if self._trial_running else 0.0)
+
+    def record_success(self):
+        """
+        Records a successful call and closes the breaker.
+        """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """
+        Records a failed call and opens the breaker if the threshold is reached.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Circuit breaker for %s opened after %s failures",
+                                   self.name, self._failures)
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+
+class RetryPolicy:
+    """
+    The RetryPolicy class retries failed calls with exponential backoff and full jitter.
+
+    Attributes:
+        max_attempts (int): The maximum number of attempts per call.
+        base_delay (float): The delay before the first retry in seconds.
+        max_delay (float): The upper limit of a single delay in seconds.
+        budget (float): The time budget in seconds for all calls made for one device.
+    """
+
+    def __init__(self, max_attempts: int = 6, base_delay: float = 1.0,
+                 max_delay: float = 30.0, budget: float = 60.0):
+        """
+        Initializes the RetryPolicy class.
+
+        Args:
+            max_attempts (int): The maximum number of attempts per call.
+            base_delay (float): The delay before the first retry in seconds.
+            max_delay (float): The upper limit of a single delay in seconds.
+            budget (float): The time budget in seconds for all calls made for one device.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def deadline(self) -> float:
+        """
+        Returns the point in time (time.monotonic) at which a budget starting now runs out.
+
+        Returns:
+            float: The deadline.
+        """
+        return time.monotonic() + self.budget
+
+    def delay(self, attempt: int) -> float:
+        """
+        Returns the delay before the next attempt.
+
+        Args:
+            attempt (int): The number of failed attempts so far.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, func, *args, breaker: CircuitBreaker = None, deadline: float = None,
+             before_attempt=None, **kwargs):
+        """
+        Calls a function and retries it on retryable errors.
+        While the circuit breaker refuses calls, the call waits for it
+        as long as the deadline allows.
+
+        Args:
+            func (callable): The function to call.
+            *args: The positional arguments of the function.
+            breaker (CircuitBreaker): The circuit breaker of the endpoint (optional).
+            deadline (float): The time.monotonic value after which no retry is started (optional).
+            before_attempt (callable): A function called before every attempt,
+            e.g. to wait on a rate limiter (optional).
+            **kwargs: The keyword arguments of the function.
+
+        Returns:
+            The return value of the function.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker stays open beyond the deadline.
+            RetryError: If all attempts failed or the time budget is used up.
+        """
+        attempt = 0
+        while True:
+            if breaker is not None and not breaker.allow():
+                wait = breaker.retry_after()
+                if deadline is None or time.monotonic() + wait > deadline:
+                    raise CircuitOpenError(f"Circuit breaker for {breaker.name} is open")
+                time.sleep(wait)
+                continue
+            if before_attempt is not None:
+                before_attempt()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exception:
+                if not is_retryable(exception):
+                    raise
+                if breaker is not None:
+                    breaker.record_failure()
+                attempt += 1
+                delay = self.delay(attempt)
+                if attempt >= self.max_attempts:
+                    raise RetryError(f"Failed after {attempt} attempts: {exception}") \
+                        from exception
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    raise RetryError(f"Time budget used up after {attempt} attempts: "
+                                     f"{exception}") from exception
+                logger.warning("Attempt %s failed, retrying in %.1f s: %s",
+                               attempt, delay, exception)
+                time.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    This function returns the circuit breaker of an endpoint.
+    All callers in the process share one breaker per endpoint.
+
+    Args:
+        name (str): The name of the endpoint, e.g. "boum-prod-<device_id>".
+
+    Returns:
+        CircuitBreaker: The circuit breaker.
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
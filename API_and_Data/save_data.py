@@ -1,14 +1,39 @@
 """
 This is a script for checking if the last save was made today.
-It saves the data to a CSV file if it was not saved today or more than 7 days ago.
+It saves the data if it was not saved today or more than 7 days ago.
+
+Snapshots are stored as content-addressed deltas (see delta_store): every save
+only writes the monthly row blocks that changed since an earlier snapshot and a
+small manifest, ../data/deltas/source=<name>/date=YYYY-MM-DD.json.
+Full snapshots can still be written as Parquet files partitioned by source and save date:
+    -../data/parquet/source=<name>/date=YYYY-MM-DD/part-0.parquet
+Timestamp columns are stored typed and the files are compressed, so readers
+can load only the columns and time ranges they need with load_data.
+The old CSV format (../data/<name>.measurements_YYYY-MM-DD.csv) can still be written.
 """
 import glob
+import os
 from datetime import datetime, date
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from API_and_Data.delta_store import delta_dates, manifest_path, read_delta, write_delta
 
 current_date = datetime.now().date()
 
+DATA_DIR = "../data"
+PARQUET_DIR = "../data/parquet"
+
+# Default storage format of save_data, either "delta", "parquet" or "csv"
+STORAGE_FORMAT = "delta"
+COMPRESSION = "zstd"
+
+# Columns that are stored as typed timestamps
+TIMESTAMP_COLUMNS = ("timestamp", "time")
+
 
 def check_last_save(last_save_date: datetime.date) -> bool:
     """
@@ -42,53 +67,283 @@ def find_last_save_date(name: str) -> (date, int):
         A tuple containing the latest save date and the number of days since the last save.
     """
     curr_date = datetime.now().date()
-    saved_files = glob.glob(f"../data/{name}.measurements_*.csv")
-    if not saved_files:
+    saved_dates = snapshot_dates(name)
+    if not saved_dates:
         return curr_date, 0
-    latest_file = max(saved_files)
-    latest_save_date_str = latest_file.split("_")[1].split(".")[0]
-    latest_save_date = datetime.strptime(latest_save_date_str, "%Y-%m-%d").date()
+    latest_save_date = max(saved_dates)
     time_difference = latest_save_date - curr_date
     time_difference = max(abs(time_difference.days), 0)
     return latest_save_date, time_difference
 
 
-def save_data(name: str, data: pd.DataFrame):
+def snapshot_dates(name: str) -> list:
     """
-    Saves data as a CSV file in the data directory.
+    This function lists the dates on which snapshots with the given name were saved,
+    as deltas, in the Parquet store and as CSV files.
 
     Args:
-        name (str): The name of the file, including the file extension.
+        name (str): The name of the snapshot.
+
+    Returns:
+        list: The save dates, oldest first.
+    """
+    saved_dates = {str(saved_date) for saved_date in delta_dates(name)}
+    for path in glob.glob(f"{PARQUET_DIR}/source={name}/date=*/part-0.parquet"):
+        saved_dates.add(os.path.basename(os.path.dirname(path))[len("date="):])
+    for path in glob.glob(f"{DATA_DIR}/{name}.measurements_*.csv"):
+        saved_dates.add(path[len(f"{DATA_DIR}/{name}.measurements_"):-len(".csv")])
+    parsed = []
+    for saved_date in saved_dates:
+        try:
+            parsed.append(datetime.strptime(saved_date, "%Y-%m-%d").date())
+        except ValueError:
+            continue
+    return sorted(parsed)
+
+
+def snapshot_path(name: str, save_date: date) -> str:
+    """
+    This function returns the path of the Parquet snapshot of a source on a given date.
+
+    Args:
+        name (str): The name of the snapshot.
+        save_date (date): The save date.
+
+    Returns:
+        str: The path of the Parquet file.
+    """
+    return f"{PARQUET_DIR}/source={name}/date={save_date}/part-0.parquet"
+
+
+def type_timestamps(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function converts timestamp columns that are stored as text to datetimes.
+
+    Args:
+        dataframe (pd.DataFrame): The dataframe.
+
+    Returns:
+        pd.DataFrame: The dataframe with typed timestamp columns.
+    """
+    for column in TIMESTAMP_COLUMNS:
+        if column in dataframe and pd.api.types.is_object_dtype(dataframe[column]):
+            try:
+                dataframe[column] = pd.to_datetime(dataframe[column])
+            except (ValueError, TypeError):
+                continue
+    return dataframe
+
+
+def write_csv(name: str, dataframe: pd.DataFrame, index: bool = False) -> str:
+    """
+    This function saves a dataframe as a CSV file with a save_date column.
+
+    Args:
+        name (str): The name of the snapshot.
+        dataframe (pd.DataFrame): The dataframe to save.
+        index (bool, optional): Whether to save the index as well (default: False).
+
+    Returns:
+        str: The path of the CSV file.
+    """
+    df_new = dataframe.copy()
+    df_new["save_date"] = current_date
+    filename = f"{DATA_DIR}/{name}.measurements_{current_date}.csv"
+    df_new.to_csv(filename, index=index)
+    return filename
+
+
+def write_parquet(name: str, dataframe: pd.DataFrame, index: bool = False) -> str:
+    """
+    This function saves a dataframe as a compressed Parquet file in the partition
+    of its source and the current date. A snapshot of the same day is replaced.
+
+    Args:
+        name (str): The name of the snapshot.
+        dataframe (pd.DataFrame): The dataframe to save.
+        index (bool, optional): Whether to save the index as well (default: False).
+
+    Returns:
+        str: The path of the Parquet file.
+    """
+    filename = snapshot_path(name, current_date)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # A shallow copy is enough, type_timestamps only replaces whole columns
+    table = pa.Table.from_pandas(type_timestamps(dataframe.copy(deep=False)),
+                                 preserve_index=index)
+    pq.write_table(table, f"{filename}.tmp", compression=COMPRESSION)
+    os.replace(f"{filename}.tmp", filename)
+    return filename
+
+
+def write_delta_snapshot(name: str, dataframe: pd.DataFrame, index: bool = False) -> str:
+    """
+    This function saves a dataframe as a delta of the current date.
+    Only row blocks that were not saved before are written.
+
+    Args:
+        name (str): The name of the snapshot.
+        dataframe (pd.DataFrame): The dataframe to save.
+        index (bool, optional): Whether to save the index as well (default: False).
+
+    Returns:
+        str: The path of the manifest.
+    """
+    filename, _ = write_delta(name, type_timestamps(dataframe.copy(deep=False)),
+                              current_date, index)
+    return filename
+
+
+def save_data(name: str, data: pd.DataFrame, fmt: str = None, index: bool = False):
+    """
+    Saves data as a snapshot in the data directory.
+
+    Args:
+        name (str): The name of the snapshot.
         data (pd.DataFrame): A dataframe to be saved.
+        fmt (str, optional): The storage format, "delta", "parquet" or "csv"
+        (default: STORAGE_FORMAT).
+        index (bool, optional): Whether to save the index as well (default: False).
 
     Returns:
         None
+
+    Raises:
+        ValueError: If an invalid storage format is specified.
     """
+    fmt = fmt or STORAGE_FORMAT
     dataframe = pd.DataFrame(data)
-    df_new = dataframe.copy()
-    df_new["save_date"] = current_date
-    filename = f"../data/{name}.measurements_{current_date}.csv"
-    df_new.to_csv(filename, index=False)
+    if fmt == "delta":
+        filename = write_delta_snapshot(name, dataframe, index)
+    elif fmt == "parquet":
+        filename = write_parquet(name, dataframe, index)
+    elif fmt == "csv":
+        filename = write_csv(name, dataframe, index)
+    else:
+        raise ValueError(f"Invalid storage format: {fmt}. Must be 'delta', 'parquet' or 'csv'.")
     print(f"Measurements saved successfully as {filename}.")
 
 
-def create_file(name: str, data: pd.DataFrame):
+def create_file(name: str, data: pd.DataFrame, fmt: str = None):
     """
-    Saves a list of data as a CSV file in the data directory.
+    Saves a list of data as a snapshot in the data directory.
 
     Args:
-        name (str): The name of the file, including the file extension.
+        name (str): The name of the snapshot.
         data (pd.DataFrame): A list of data to be saved.
+        fmt (str, optional): The storage format, "delta", "parquet" or "csv"
+        (default: STORAGE_FORMAT).
 
     Returns:
         None
     """
-    dataframe = pd.DataFrame(data)
-    df_new = dataframe.copy()
-    df_new["save_date"] = current_date
-    filename = f"../data/{name}.measurements_{current_date}.csv"
-    df_new.to_csv(filename, index=False)
-    print(f"Measurements saved successfully as {filename}.")
+    save_data(name, data, fmt)
+
+
+def timestamp_filter(schema: pa.Schema, start=None, end=None, column: str = "timestamp"):
+    """
+    This function builds a filter on the timestamp column of a Parquet file,
+    so that row groups outside the range are skipped.
+
+    Args:
+        schema (pa.Schema): The schema of the file.
+        start (datetime or str, optional): The first timestamp to load.
+        end (datetime or str, optional): The last timestamp to load.
+        column (str, optional): The name of the timestamp column (default: "timestamp").
+
+    Returns:
+        pyarrow.dataset.Expression: The filter, or None if no range is requested.
+    """
+    if (start is None and end is None) or column not in schema.names:
+        return None
+    field_type = schema.field(column).type
+    expression = None
+    for bound, compare in ((start, "__ge__"), (end, "__le__")):
+        if bound is None:
+            continue
+        bound = pd.Timestamp(bound)
+        if pa.types.is_timestamp(field_type) and field_type.tz is not None:
+            bound = bound.tz_localize("UTC") if bound.tzinfo is None else bound
+        elif bound.tzinfo is not None:
+            bound = bound.tz_convert(None)
+        condition = getattr(ds.field(column), compare)(pa.scalar(bound, type=field_type))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def filter_time_range(dataframe: pd.DataFrame, start=None, end=None,
+                      column: str = "timestamp") -> pd.DataFrame:
+    """
+    This function keeps the rows of a dataframe whose timestamp lies in a range.
+
+    Args:
+        dataframe (pd.DataFrame): The dataframe.
+        start (datetime or str, optional): The first timestamp to keep.
+        end (datetime or str, optional): The last timestamp to keep.
+        column (str, optional): The name of the timestamp column (default: "timestamp").
+
+    Returns:
+        pd.DataFrame: The rows in the range.
+    """
+    if (start is None and end is None) or column not in dataframe.columns:
+        return dataframe
+    timestamps = dataframe[column]
+    aware = getattr(timestamps.dt, "tz", None) is not None
+    keep = pd.Series(True, index=dataframe.index)
+    for bound, compare in ((start, "__ge__"), (end, "__le__")):
+        if bound is None:
+            continue
+        bound = pd.Timestamp(bound)
+        if aware and bound.tzinfo is None:
+            bound = bound.tz_localize("UTC")
+        elif not aware and bound.tzinfo is not None:
+            bound = bound.tz_convert(None)
+        keep &= getattr(timestamps, compare)(bound)
+    return dataframe[keep.to_numpy()]
+
+
+def load_data(name: str, columns: list = None, start=None, end=None,
+              first_save=None, last_save=None) -> pd.DataFrame:
+    """
+    Loads the delta and Parquet snapshots of a source.
+    Only the requested columns, time range and save dates are read from disk.
+
+    Args:
+        name (str): The name of the snapshot.
+        columns (list, optional): The columns to load (default: all columns).
+        start (datetime or str, optional): The first timestamp to load.
+        end (datetime or str, optional): The last timestamp to load.
+        first_save (date, optional): The first save date to load.
+        last_save (date, optional): The last save date to load.
+
+    Returns:
+        pd.DataFrame: The snapshots, oldest first, with a save_date column.
+    """
+    frames = []
+    for save_date in snapshot_dates(name):
+        if ((first_save is not None and save_date < first_save)
+                or (last_save is not None and save_date > last_save)):
+            continue
+        filename = snapshot_path(name, save_date)
+        if os.path.exists(filename):
+            schema = pq.read_schema(filename)
+            wanted = None if columns is None else [
+                column for column in columns if column in schema.names]
+            table = pq.read_table(filename, columns=wanted,
+                                  filters=timestamp_filter(schema, start, end))
+            dataframe = table.to_pandas()
+        elif os.path.exists(manifest_path(name, save_date)):
+            dataframe = filter_time_range(
+                read_delta(name, save_date, columns=columns, start=start, end=end), start, end)
+        else:
+            continue
+        dataframe["save_date"] = save_date
+        frames.append(dataframe)
+    if not frames:
+        return pd.DataFrame()
+    # Snapshots saved with their index keep it
+    ignore_index = all(frame.index.name is None for frame in frames)
+    return pd.concat(frames, ignore_index=ignore_index)
 
 
 if __name__ == "__main__":
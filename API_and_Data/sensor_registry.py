@@ -0,0 +1,301 @@
+"""
+This module contains the registry of the FYTA sensors and Boum devices of all balconies.
+
+The sensors, devices and balconies are described once in a data file.
+On loading, the registry builds dictionaries from sensor to balcony,
+from device to balcony, from orientation to sensors and devices,
+and from short device ID to full device ID, so every lookup takes constant time.
+A new balcony is added by editing the data file only.
+
+A sensor without an orientation of its own has the orientation of the device
+of its balcony. Sensors marked as inactive belong to a balcony but are not
+used in the analysis of the balcony.
+
+The module requires the following files:
+    -../data/sensor_registry.json: the balconies, devices and sensors
+"""
+import json
+import threading
+
+from API_and_Data.compact_frames import sensor_metadata
+
+REGISTRY_FILE = "../data/sensor_registry.json"
+
+# Number of characters of a device ID used in column names
+SHORT_ID_LENGTH = 8
+
+_registries = {}
+_registry_lock = threading.Lock()
+
+
+def short_id(device_id: str) -> str:
+    """
+    This function returns the short form of a Boum device ID used in column names.
+
+    Args:
+        device_id (str): The full Boum device ID
+
+    Returns:
+        str: The short device ID
+    """
+    return device_id[:SHORT_ID_LENGTH]
+
+
+class SensorRegistry:
+    """
+    The SensorRegistry class indexes the balconies, devices and sensors of the data file.
+
+    Attributes:
+        balconies (list): The balcony names, in the order of the data file.
+        devices (list): The Boum device IDs, in the order of the data file.
+    """
+
+    def __init__(self, registry: dict):
+        """
+        Initializes the SensorRegistry class.
+
+        Args:
+            registry (dict): The content of the data file with the keys
+            "balconies", "devices" and "sensors".
+        """
+        self.balconies = [balcony["name"] for balcony in registry["balconies"]]
+        self.devices = [device["id"] for device in registry["devices"]]
+        self._balcony_device = {balcony["name"]: balcony["device"]
+                                for balcony in registry["balconies"]}
+        self._device_balcony = {device: balcony for balcony, device in self._balcony_device.items()}
+        self._short_ids = {short_id(device): device for device in self.devices}
+        self._orientation = {device["id"]: device["orientation"] for device in registry["devices"]}
+        self._sensor_balcony = {}
+        self._sensor_location = {}
+        self._balcony_sensors = {balcony: [] for balcony in self.balconies}
+        self._inactive_sensors = {balcony: [] for balcony in self.balconies}
+        self._location_sensors = {}
+        for sensor in registry["sensors"]:
+            sensor_id = sensor["id"]
+            balcony = sensor.get("balcony")
+            if balcony is not None:
+                self._sensor_balcony[sensor_id] = balcony
+                if sensor.get("active", True):
+                    self._balcony_sensors[balcony].append(sensor_id)
+                else:
+                    self._inactive_sensors[balcony].append(sensor_id)
+            if sensor.get("location") is not None:
+                self._sensor_location[sensor_id] = sensor["location"]
+                self._location_sensors.setdefault(sensor["location"], []).append(sensor_id)
+            orientation = sensor.get("orientation")
+            if orientation is None and balcony is not None:
+                orientation = self._orientation.get(self._balcony_device[balcony])
+            if orientation is not None:
+                self._orientation[sensor_id] = orientation
+        self._orientation_ids = {}
+        for identifier, orientation in self._orientation.items():
+            self._orientation_ids.setdefault(orientation, []).append(identifier)
+
+    def balcony_of(self, identifier) -> str:
+        """
+        Returns the balcony of a sensor or device.
+
+        Args:
+            identifier (str or int): The FYTA sensor ID or the full Boum device ID.
+
+        Returns:
+            str: The balcony name, or None if the sensor or device is on no balcony.
+        """
+        identifier = str(identifier)
+        return self._sensor_balcony.get(identifier, self._device_balcony.get(identifier))
+
+    def device_of(self, identifier) -> str:
+        """
+        Returns the Boum device of a balcony or of the balcony of a sensor.
+
+        Args:
+            identifier (str or int): The balcony name or the FYTA sensor ID.
+
+        Returns:
+            str: The full Boum device ID, or None if there is none.
+        """
+        identifier = str(identifier)
+        return self._balcony_device.get(self._sensor_balcony.get(identifier, identifier))
+
+    def sensors_of(self, balcony: str, include_inactive: bool = False) -> list:
+        """
+        Returns the sensors of a balcony.
+
+        Args:
+            balcony (str): The balcony name.
+            include_inactive (bool): Whether to include the inactive sensors.
+
+        Returns:
+            list: The FYTA sensor IDs of the balcony.
+        """
+        sensors = list(self._balcony_sensors[balcony])
+        if include_inactive:
+            sensors += self._inactive_sensors[balcony]
+        return sensors
+
+    def location_of(self, sensor) -> str:
+        """
+        Returns the location of a sensor (sun, tank or pot).
+
+        Args:
+            sensor (str or int): The FYTA sensor ID.
+
+        Returns:
+            str: The location, or None if it is unknown.
+        """
+        return self._sensor_location.get(str(sensor))
+
+    def sensors_at(self, location: str, on_balcony: bool = True) -> list:
+        """
+        Returns the sensors at a location.
+
+        Args:
+            location (str): The location (sun, tank or pot).
+            on_balcony (bool): Whether to return only the active sensors of a balcony.
+
+        Returns:
+            list: The FYTA sensor IDs at the location.
+        """
+        sensors = self._location_sensors.get(location, [])
+        if on_balcony:
+            sensors = [sensor for sensor in sensors
+                       if sensor in self._balcony_sensors.get(self._sensor_balcony.get(sensor), [])]
+        return list(sensors)
+
+    def orientation_of(self, identifier) -> str:
+        """
+        Returns the orientation of a sensor or device.
+
+        Args:
+            identifier (str or int): The FYTA sensor ID or the full Boum device ID.
+
+        Returns:
+            str: The orientation (N, E, S or W), or None if it is unknown.
+        """
+        return self._orientation.get(str(identifier))
+
+    def with_orientation(self, orientation: str) -> list:
+        """
+        Returns the sensors and devices with an orientation.
+
+        Args:
+            orientation (str): The orientation (N, E, S or W).
+
+        Returns:
+            list: The FYTA sensor IDs and full Boum device IDs.
+        """
+        return list(self._orientation_ids.get(orientation, []))
+
+    def device_id(self, short: str) -> str:
+        """
+        Returns the full Boum device ID of a short device ID.
+
+        Args:
+            short (str): The short device ID used in column names.
+
+        Returns:
+            str: The full Boum device ID, or None if the device is unknown.
+        """
+        return self._short_ids.get(short[:SHORT_ID_LENGTH])
+
+    def sensor_dict(self) -> dict:
+        """
+        Returns the active sensors of every balcony.
+
+        Returns:
+            dict: A dictionary mapping balcony names to lists of FYTA sensor IDs.
+        """
+        return {balcony: self.sensors_of(balcony) for balcony in self.balconies}
+
+    def device_dict(self) -> dict:
+        """
+        Returns the Boum device of every balcony.
+
+        Returns:
+            dict: A dictionary mapping balcony names to full Boum device IDs.
+        """
+        return dict(self._balcony_device)
+
+    def sensor_id_dict(self) -> dict:
+        """
+        Returns the active sensors of the balcony of every Boum device.
+
+        Returns:
+            dict: A dictionary mapping full Boum device IDs to lists of FYTA sensor IDs.
+        """
+        return {self._balcony_device[balcony]: self.sensors_of(balcony)
+                for balcony in self.balconies}
+
+    def sensor_location(self) -> dict:
+        """
+        Returns the sensors of every location.
+
+        Returns:
+            dict: A dictionary mapping locations to lists of FYTA sensor IDs (int).
+        """
+        return {location: [int(sensor) for sensor in sensors]
+                for location, sensors in self._location_sensors.items()}
+
+    def orientation_dict(self) -> dict:
+        """
+        Returns the sensors and devices of every orientation.
+
+        Returns:
+            dict: A dictionary mapping orientations to lists of FYTA sensor IDs
+            and full Boum device IDs.
+        """
+        return {orientation: list(ids) for orientation, ids in self._orientation_ids.items()}
+
+    def metadata(self, sensor_location: dict = None):
+        """
+        Returns the sensor metadata table with the location,
+        orientation and Boum device of every sensor.
+
+        Args:
+            sensor_location (dict): A dictionary mapping each location to its sensor IDs
+            (default: the locations of the registry).
+
+        Returns:
+            pd.DataFrame: The sensor metadata table.
+        """
+        if sensor_location is None:
+            sensor_location = self.sensor_location()
+        devices = {sensor: self.device_of(sensor) for sensor in self._sensor_balcony}
+        return sensor_metadata(sensor_location, orientation=self._orientation, devices=devices)
+
+    def temperature_columns(self, balconies: list) -> (list, list):
+        """
+        Returns the internal temperature column of the Boum device and the external
+        temperature columns of the FYTA sensors of each balcony.
+
+        Args:
+            balconies (list): The balcony names.
+
+        Returns:
+            (internal_temp_cols, external_temp_cols) (list, list): The internal temperature
+            column of each balcony and the list of external temperature columns of each balcony.
+        """
+        internal_temp_cols = [f"temperature_boum_{short_id(self._balcony_device[balcony])}"
+                              for balcony in balconies]
+        external_temp_cols = [[f"temperature_{sensor}"
+                               for sensor in self.sensors_of(balcony, include_inactive=True)]
+                              for balcony in balconies]
+        return internal_temp_cols, external_temp_cols
+
+
+def load_registry(registry_file: str = REGISTRY_FILE) -> SensorRegistry:
+    """
+    This function returns the sensor registry.
+    The data file is only read the first time.
+
+    Args:
+        registry_file (str): The path of the data file.
+
+    Returns:
+        SensorRegistry: The sensor registry.
+    """
+    with _registry_lock:
+        if registry_file not in _registries:
+            with open(registry_file, encoding="utf-8", mode="r") as file:
+                _registries[registry_file] = SensorRegistry(json.load(file))
+        return _registries[registry_file]
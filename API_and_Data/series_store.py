@@ -0,0 +1,280 @@
+"""
+This module stores sensor time series that lie on a regular time grid
+as memory-mapped NumPy arrays.
+
+Every metric and sensor is kept in its own .npy file next to a small JSON header
+holding the time of the first value (seconds since the epoch, naive UTC)
+and the step between values in seconds. The time of value i is start + i * step,
+so a date range is selected by offset arithmetic on the memory map: nothing is
+read from disk until the values are used, and slices are views instead of copies.
+Gaps in the grid are stored as NaN.
+
+Column names are split into metric and sensor at the last underscore,
+e.g. temperature_boum_13235f69 is stored as metric temperature_boum, sensor 13235f69.
+
+The module creates the following files:
+    -../data/series/<metric>/<sensor>.npy: the values of a series
+    -../data/series/<metric>/<sensor>.json: the header of a series
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from API_and_Data.time_index import to_epoch_seconds
+
+SERIES_DIR = "../data/series"
+
+
+def split_column(column) -> (str, str):
+    """
+    This function splits a column name into metric and sensor.
+    For columns with several levels the last level is used.
+
+    Args:
+        column (str or tuple): The column name, e.g. temperature_21328.
+
+    Returns:
+        (metric, sensor) (str, str): The metric and the sensor.
+    """
+    if isinstance(column, tuple):
+        column = column[-1]
+    metric, _, sensor = str(column).rpartition("_")
+    return metric, sensor
+
+
+def series_path(metric: str, sensor: str) -> str:
+    """
+    This function returns the path of a series without file extension.
+
+    Args:
+        metric (str): The metric, e.g. temperature_boum.
+        sensor (str): The sensor or short device ID.
+
+    Returns:
+        str: The path of the series.
+    """
+    return f"{SERIES_DIR}/{metric}/{sensor}"
+
+
+def grid_step(index: pd.DatetimeIndex) -> int:
+    """
+    This function returns the step of a regular time index.
+
+    Args:
+        index (pd.DatetimeIndex): The time index.
+
+    Returns:
+        int: The step between two timestamps in seconds.
+
+    Raises:
+        ValueError: If the index has fewer than two timestamps or is not regular.
+    """
+    seconds = to_epoch_seconds(index)
+    steps = np.diff(seconds)
+    if len(steps) == 0 or steps[0] <= 0 or not (steps == steps[0]).all():
+        raise ValueError("The index is not a regular time grid, resample it first.")
+    return int(steps[0])
+
+
+def write_series(metric: str, sensor: str, values, start: int, step: int):
+    """
+    This function writes a series and its header.
+    Both files are replaced atomically.
+
+    Args:
+        metric (str): The metric, e.g. temperature_boum.
+        sensor (str): The sensor or short device ID.
+        values (array-like): The values on the time grid.
+        start (int): The time of the first value in seconds since the epoch.
+        step (int): The step between two values in seconds.
+    """
+    path = series_path(metric, sensor)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.npy.tmp", mode="wb") as series_file:
+        np.save(series_file, np.ascontiguousarray(values))
+    os.replace(f"{path}.npy.tmp", f"{path}.npy")
+    with open(f"{path}.json.tmp", encoding="utf-8", mode="w") as header_file:
+        json.dump({"start": int(start), "step": int(step)}, header_file)
+    os.replace(f"{path}.json.tmp", f"{path}.json")
+
+
+def write_frame(dataframe: pd.DataFrame, float_dtype: str = None) -> list:
+    """
+    This function writes every numeric column of a dataframe as a series.
+    The timestamps must form a regular time grid, as after resampling.
+
+    Args:
+        dataframe (pd.DataFrame): The dataframe indexed by naive UTC timestamps
+        or with a timestamp column.
+        float_dtype (str): The dtype to store the values in (default: the dtype of each column).
+
+    Returns:
+        list: The (metric, sensor) pairs that were written.
+    """
+    if "timestamp" in dataframe.columns:
+        dataframe = dataframe.set_index("timestamp")
+    index = pd.DatetimeIndex(dataframe.index)
+    step = grid_step(index)
+    start = int(to_epoch_seconds(index[:1])[0])
+    written = []
+    for position, column in enumerate(dataframe.columns):
+        values = dataframe.iloc[:, position]
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            continue
+        if float_dtype is not None or pd.api.types.is_extension_array_dtype(values):
+            values = values.to_numpy(dtype=float_dtype or "float64", na_value=np.nan)
+        else:
+            values = values.to_numpy()
+        metric, sensor = split_column(column)
+        write_series(metric, sensor, values, start, step)
+        written.append((metric, sensor))
+    return written
+
+
+def read_header(metric: str, sensor: str) -> dict:
+    """
+    This function reads the header of a series.
+
+    Args:
+        metric (str): The metric, e.g. temperature_boum.
+        sensor (str): The sensor or short device ID.
+
+    Returns:
+        dict: The header with the start and the step of the series in seconds.
+    """
+    with open(f"{series_path(metric, sensor)}.json", encoding="utf-8", mode="r") as header_file:
+        return json.load(header_file)
+
+
+def open_series(metric: str, sensor: str) -> (np.memmap, dict):
+    """
+    This function opens a series as a read-only memory map.
+
+    Args:
+        metric (str): The metric, e.g. temperature_boum.
+        sensor (str): The sensor or short device ID.
+
+    Returns:
+        (values, header) (np.memmap, dict): The memory-mapped values and the header.
+    """
+    values = np.load(f"{series_path(metric, sensor)}.npy", mmap_mode="r")
+    return values, read_header(metric, sensor)
+
+
+def slice_offsets(header: dict, length: int, start=None, end=None) -> (int, int):
+    """
+    This function computes the offsets of a date range in a series.
+    The range includes both ends.
+
+    Args:
+        header (dict): The header of the series.
+        length (int): The number of values in the series.
+        start (str or datetime): The start of the range (default: first value).
+        end (str or datetime): The end of the range (default: last value).
+
+    Returns:
+        (first, stop) (int, int): The offset of the first value and the offset after the last value.
+    """
+    first, stop = 0, length
+    if start is not None:
+        seconds = int(to_epoch_seconds([start])[0])
+        first = -((header["start"] - seconds) // header["step"])
+    if end is not None:
+        seconds = int(to_epoch_seconds([end])[0])
+        stop = (seconds - header["start"]) // header["step"] + 1
+    first = min(max(first, 0), length)
+    return first, max(min(stop, length), first)
+
+
+def slice_series(metric: str, sensor: str, start=None, end=None) -> (np.ndarray, int, int):
+    """
+    This function selects a date range of a series without reading or copying it.
+
+    Args:
+        metric (str): The metric, e.g. temperature_boum.
+        sensor (str): The sensor or short device ID.
+        start (str or datetime): The start of the range (default: first value).
+        end (str or datetime): The end of the range (default: last value).
+
+    Returns:
+        (values, first_time, step) (np.ndarray, int, int): A view of the values in the range,
+        the time of the first of them and the step, both in seconds.
+    """
+    values, header = open_series(metric, sensor)
+    first, stop = slice_offsets(header, len(values), start, end)
+    return values[first:stop], header["start"] + first * header["step"], header["step"]
+
+
+def read_series(metric: str, sensor: str, start=None, end=None) -> pd.Series:
+    """
+    This function returns a date range of a series as a pandas series.
+    The values are not copied, they stay backed by the memory map.
+
+    Args:
+        metric (str): The metric, e.g. temperature_boum.
+        sensor (str): The sensor or short device ID.
+        start (str or datetime): The start of the range (default: first value).
+        end (str or datetime): The end of the range (default: last value).
+
+    Returns:
+        pd.Series: The values indexed by naive UTC timestamps, named <metric>_<sensor>.
+    """
+    values, first_time, step = slice_series(metric, sensor, start, end)
+    index = pd.date_range(pd.Timestamp(first_time, unit="s"), periods=len(values),
+                          freq=pd.Timedelta(seconds=step), name="timestamp")
+    return pd.Series(values, index=index, name=f"{metric}_{sensor}", copy=False)
+
+
+def list_series(metric: str = None) -> list:
+    """
+    This function lists the stored series.
+
+    Args:
+        metric (str): Only list the series of this metric (optional).
+
+    Returns:
+        list: The (metric, sensor) pairs of the stored series.
+    """
+    if not os.path.isdir(SERIES_DIR):
+        return []
+    metrics = [metric] if metric is not None else sorted(os.listdir(SERIES_DIR))
+    return [(name, file_name[:-len(".npy")])
+            for name in metrics if os.path.isdir(f"{SERIES_DIR}/{name}")
+            for file_name in sorted(os.listdir(f"{SERIES_DIR}/{name}"))
+            if file_name.endswith(".npy")]
+
+
+def read_frame(metric: str, sensors: list = None, start=None, end=None) -> pd.DataFrame:
+    """
+    This function returns a date range of several series of a metric as a dataframe.
+    Unlike read_series, the values are copied into the dataframe.
+
+    Args:
+        metric (str): The metric, e.g. temperature_boum.
+        sensors (list): The sensors to read (default: all sensors of the metric).
+        start (str or datetime): The start of the range (default: first value).
+        end (str or datetime): The end of the range (default: last value).
+
+    Returns:
+        pd.DataFrame: The series as columns named <metric>_<sensor>.
+    """
+    if sensors is None:
+        sensors = [sensor for _, sensor in list_series(metric)]
+    series = [read_series(metric, sensor, start, end) for sensor in sensors]
+    if not series:
+        return pd.DataFrame()
+    return pd.concat(series, axis=1)
+
+
+if __name__ == "__main__":
+    # Convert the resampled pickles of the notebook into the series store
+    for pickle_file in ("../data/boum_data_new", "../data/data_pickled"):
+        if not os.path.exists(pickle_file):
+            continue
+        try:
+            stored = write_frame(pd.read_pickle(pickle_file))
+            print(f"Stored {len(stored)} series from {pickle_file}")
+        except ValueError as value_error:
+            print(f"Error storing {pickle_file}: {value_error}")
@@ -0,0 +1,237 @@
+"""
+This module loads all saved snapshots of a source into one dataframe.
+
+Consecutive daily snapshots overlap, because every snapshot contains the full
+history that was available on its save date. The loader keeps a manifest of all
+snapshots by source and save date, reads them in parallel (newest first) and
+keeps the value of every column at a timestamp only once, taking it from the newest
+snapshot that has the column. Columns missing from a newer snapshot, e.g. of a device
+that could not be retrieved on that day, are taken from the older snapshots.
+The de-duplicated parts are combined once at the end.
+Sources saved as deltas only are replayed by delta_store, which reads every block once.
+
+The module creates the following files:
+    -../data/snapshot_manifest.json: path, format, size and time range of each snapshot
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from API_and_Data.delta_store import (NewestFirstMerge, manifest_path, manifest_range,
+                                      read_delta, read_manifest, replay)
+from API_and_Data.save_data import DATA_DIR, snapshot_dates, snapshot_path
+from API_and_Data.time_index import to_epoch_seconds, to_naive_utc
+
+MANIFEST_FILE = "../data/snapshot_manifest.json"
+
+
+def load_manifest() -> dict:
+    """
+    This function loads the snapshot manifest.
+
+    Returns:
+        dict: A dictionary mapping each source to a dictionary of its snapshots by save date.
+    """
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    with open(MANIFEST_FILE, encoding="utf-8", mode="r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(manifest: dict):
+    """
+    This function saves the snapshot manifest.
+    The file is replaced atomically, so an interrupted run never leaves it half written.
+
+    Args:
+        manifest (dict): The snapshot manifest.
+    """
+    os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok=True)
+    with open(f"{MANIFEST_FILE}.tmp", encoding="utf-8", mode="w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(f"{MANIFEST_FILE}.tmp", MANIFEST_FILE)
+
+
+def find_snapshot(name: str, save_date) -> (str, str):
+    """
+    This function returns the file of the snapshot of a source on a given date.
+    A Parquet snapshot is preferred over a delta and a delta over a CSV file of the same day.
+
+    Args:
+        name (str): The name of the source.
+        save_date (date): The save date.
+
+    Returns:
+        (path, fmt) (str, str): The path and format of the file, or (None, None).
+    """
+    path = snapshot_path(name, save_date)
+    if os.path.exists(path):
+        return path, "parquet"
+    path = manifest_path(name, save_date)
+    if os.path.exists(path):
+        return path, "delta"
+    path = f"{DATA_DIR}/{name}.measurements_{save_date}.csv"
+    if os.path.exists(path):
+        return path, "csv"
+    return None, None
+
+
+def parquet_time_range(path: str, column: str = "timestamp"):
+    """
+    This function reads the time range of a Parquet snapshot from its metadata.
+
+    Args:
+        path (str): The path of the Parquet file.
+        column (str): The name of the timestamp column.
+
+    Returns:
+        (first, last) (str, str): The first and last timestamp in ISO format,
+        or (None, None) if the file has no statistics for the column.
+    """
+    metadata = pq.ParquetFile(path).metadata
+    if column not in metadata.schema.names:
+        return None, None
+    index = metadata.schema.names.index(column)
+    first, last = None, None
+    for row_group in range(metadata.num_row_groups):
+        statistics = metadata.row_group(row_group).column(index).statistics
+        if statistics is None or not statistics.has_min_max:
+            return None, None
+        minimum, maximum = pd.Timestamp(statistics.min), pd.Timestamp(statistics.max)
+        first = minimum if first is None else min(first, minimum)
+        last = maximum if last is None else max(last, maximum)
+    if first is None:
+        return None, None
+    return str(to_naive_utc([first])[0]), str(to_naive_utc([last])[0])
+
+
+def update_manifest(names) -> dict:
+    """
+    This function adds new and changed snapshots of the given sources to the manifest
+    and removes snapshots that no longer exist. Unchanged snapshots are not opened.
+
+    Args:
+        names (list): The names of the sources.
+
+    Returns:
+        dict: The updated manifest.
+    """
+    manifest = load_manifest()
+    for name in names:
+        known = manifest.get(name, {})
+        entries = {}
+        for save_date in snapshot_dates(name):
+            path, fmt = find_snapshot(name, save_date)
+            if path is None:
+                continue
+            stat = os.stat(path)
+            entry = known.get(str(save_date))
+            if (entry is None or entry["path"] != path or entry["size"] != stat.st_size
+                    or entry["modified"] != stat.st_mtime):
+                entry = {"path": path, "format": fmt, "size": stat.st_size,
+                         "modified": stat.st_mtime, "first": None, "last": None}
+                if fmt == "parquet":
+                    entry["first"], entry["last"] = parquet_time_range(path)
+                elif fmt == "delta":
+                    entry["source"], entry["date"] = name, str(save_date)
+                    entry["first"], entry["last"] = manifest_range(read_manifest(name, save_date))
+            entries[str(save_date)] = entry
+        manifest[name] = entries
+    save_manifest(manifest)
+    return manifest
+
+
+def read_snapshot(entry: dict) -> pd.DataFrame:
+    """
+    This function reads one snapshot and brings its timestamps into canonical form.
+
+    Args:
+        entry (dict): The manifest entry of the snapshot.
+
+    Returns:
+        pd.DataFrame: The snapshot.
+    """
+    if entry["format"] == "parquet":
+        dataframe = pq.read_table(entry["path"]).to_pandas()
+        dataframe["save_date"] = os.path.basename(os.path.dirname(entry["path"]))[len("date="):]
+    elif entry["format"] == "delta":
+        dataframe = read_delta(entry["source"], pd.Timestamp(entry["date"]).date())
+        dataframe["save_date"] = entry["date"]
+    else:
+        dataframe = pd.read_csv(entry["path"], low_memory=False)
+    if "Unnamed: 0" in dataframe.columns:
+        dataframe.drop(columns=["Unnamed: 0"], inplace=True)
+    if "timestamp" in dataframe:
+        dataframe["timestamp"] = to_naive_utc(dataframe["timestamp"]).to_numpy()
+    return dataframe
+
+
+def read_in_parallel(entries, max_workers: int):
+    """
+    This function reads snapshots with a pool of workers and yields them in order.
+    At most `max_workers` snapshots are read ahead, so memory stays bounded.
+
+    Args:
+        entries (list): The manifest entries of the snapshots.
+        max_workers (int): The number of snapshots read at the same time.
+
+    Yields:
+        (entry, dataframe) (dict, pd.DataFrame): Each entry with its snapshot.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = []
+        for entry in entries:
+            pending.append((entry, executor.submit(read_snapshot, entry)))
+            if len(pending) >= max_workers:
+                entry, future = pending.pop(0)
+                yield entry, future.result()
+        for entry, future in pending:
+            yield entry, future.result()
+
+
+def load_snapshots(name: str, start=None, end=None, max_workers: int = 4) -> pd.DataFrame:
+    """
+    This function loads all snapshots of a source into one dataframe
+    in which every timestamp occurs only once. Every column is taken from the newest
+    snapshot that has it at that timestamp.
+
+    Args:
+        name (str): The name of the source, e.g. "boum-dataframe".
+        start (datetime or str, optional): Skip snapshots that end before this time.
+        end (datetime or str, optional): Skip snapshots that start after this time.
+        max_workers (int, optional): The number of snapshots read at the same time.
+
+    Returns:
+        pd.DataFrame: The de-duplicated data of all snapshots, sorted by timestamp.
+    """
+    manifest = update_manifest([name])
+    entries = [manifest[name][save_date] for save_date in sorted(manifest[name], reverse=True)]
+    if start is not None:
+        entries = [entry for entry in entries
+                   if entry["last"] is None or pd.Timestamp(entry["last"]) >= pd.Timestamp(start)]
+    if end is not None:
+        entries = [entry for entry in entries
+                   if entry["first"] is None or pd.Timestamp(entry["first"]) <= pd.Timestamp(end)]
+
+    if entries and all(entry["format"] == "delta" for entry in entries):
+        dataframe = replay(name, start, end, max_workers=max_workers, with_save_date=True)
+        if "timestamp" in dataframe:
+            dataframe["timestamp"] = to_naive_utc(dataframe["timestamp"]).to_numpy()
+        return dataframe
+
+    merge = NewestFirstMerge()
+    changed = False
+    for entry, dataframe in read_in_parallel(entries, max_workers):
+        if "timestamp" not in dataframe or dataframe.empty:
+            continue
+        if entry["first"] is None:
+            entry["first"] = str(dataframe["timestamp"].min())
+            entry["last"] = str(dataframe["timestamp"].max())
+            changed = True
+        merge.add(dataframe, to_epoch_seconds(dataframe["timestamp"]))
+    if changed:
+        save_manifest(manifest)
+    return merge.result()
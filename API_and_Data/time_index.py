@@ -0,0 +1,84 @@
+"""
+This module converts timestamps from all sources to one canonical time index.
+
+The canonical form is naive UTC: timezone-aware timestamps are converted to UTC
+and then stripped of their timezone, naive timestamps are taken as they are.
+Internally the index is an int64 number of seconds since the epoch.
+All conversions are vectorized and never call Python code per row.
+"""
+import numpy as np
+import pandas as pd
+
+
+def to_naive_utc(values) -> pd.Series:
+    """
+    This function converts timestamps to naive UTC datetimes.
+
+    Args:
+        values (array-like): The timestamps as strings, datetimes or pandas timestamps,
+        with or without timezone.
+
+    Returns:
+        pd.Series: The timestamps as naive UTC datetime64 values.
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    timestamps = pd.to_datetime(values, utc=True)
+    if isinstance(timestamps, pd.Series):
+        return timestamps.dt.tz_convert(None)
+    return pd.Series(pd.DatetimeIndex(timestamps).tz_convert(None), index=index)
+
+
+def to_epoch_seconds(values) -> np.ndarray:
+    """
+    This function converts timestamps to whole seconds since the epoch (UTC).
+    Fractions of a second are floored.
+
+    Args:
+        values (array-like): The timestamps, with or without timezone.
+
+    Returns:
+        np.ndarray: The timestamps as int64 seconds.
+    """
+    nanoseconds = to_naive_utc(values).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return nanoseconds // 10 ** 9
+
+
+def from_epoch_seconds(seconds) -> pd.Series:
+    """
+    This function converts seconds since the epoch back to naive UTC datetimes.
+
+    Args:
+        seconds (array-like): The timestamps as seconds.
+
+    Returns:
+        pd.Series: The timestamps as naive UTC datetime64 values.
+    """
+    index = seconds.index if isinstance(seconds, pd.Series) else None
+    return pd.Series(pd.to_datetime(np.asarray(seconds), unit="s"), index=index)
+
+
+def normalise_time_column(dataframe: pd.DataFrame, column: str = "timestamp",
+                          unit: str = "datetime") -> pd.DataFrame:
+    """
+    This function replaces a timestamp column by its canonical form in place.
+
+    Args:
+        dataframe (pd.DataFrame): The dataframe.
+        column (str, optional): The name of the timestamp column (default: "timestamp").
+        unit (str, optional): "datetime" for naive UTC datetimes floored to seconds
+        or "seconds" for int64 seconds since the epoch (default: "datetime").
+
+    Returns:
+        pd.DataFrame: The dataframe.
+
+    Raises:
+        ValueError: If an invalid unit is specified.
+    """
+    seconds = to_epoch_seconds(dataframe[column])
+    if unit == "seconds":
+        dataframe[column] = seconds
+    elif unit == "datetime":
+        dataframe[column] = from_epoch_seconds(seconds).to_numpy()
+    else:
+        raise ValueError(f"Invalid unit: {unit}. Must be 'datetime' or 'seconds'.")
+    return dataframe
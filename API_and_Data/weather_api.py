@@ -1,15 +1,29 @@
 """
 This module contains a function that retrieves weather data from the Open Meteo API.
 """
-from datetime import date
+import hashlib
+from datetime import date, datetime
 
 import pandas as pd
-import requests
 
-from API_and_Data.save_data import save_data
+from API_and_Data.save_data import load_data, save_data
+from API_and_Data.time_index import to_naive_utc
+from API_and_Data.weather_cache import get_archive_data
 
+# Upper limits for a single multi-location request
+MAX_LOCATIONS_PER_REQUEST = 100
+MAX_VALUES_PER_REQUEST = 5_000_000
 
-def get_weather_data(coordinates_dict: dict, timezone: str = "Europe/Berlin"):
+# Grid spacing in degrees of the archive models that can be requested per grid cell
+MODEL_RESOLUTIONS = {"era5": 0.25, "era5_land": 0.1}
+
+# Archive model requested per grid cell
+GRID_MODEL = "era5_land"
+
+
+def get_weather_data(coordinates_dict: dict, timezone: str = "Europe/Berlin",
+                     batched: bool = False, batch_size: int = None, model: str = None,
+                     name: str = "weather-dataframe"):
     """
     This function retrieves weather data from the Open Meteo API for a given set of coordinates.
 
@@ -18,32 +32,194 @@ def get_weather_data(coordinates_dict: dict, timezone: str = "Europe/Berlin"):
         the coordinates as (latitude, longitude) pairs.
         timezone (str, optional): The timezone for
         the requested data (default: "Europe/Berlin").
+        batched (bool, optional): Whether to request several locations
+        per call (default: False).
+        batch_size (int, optional): The number of locations per call in batched mode
+        (default: chosen from the size of the requested range).
+        model (str, optional): The archive model to request, e.g. "era5_land"
+        (default: the model chosen by the API).
+        name (str, optional): The name of the snapshot, or None to not save one
+        (default: "weather-dataframe").
 
     Returns:
         pd.DataFrame: A pandas dataframe containing the weather data.
     """
     weather_data = []
-    forecast_base_url = "https://archive-api.open-meteo.com/v1"
-    headers = {"Content-Type": "application/json"}
     hourly_forecast_data = ["temperature_2m", "direct_normal_irradiance"]
-    for key, (latitude, longitude) in coordinates_dict.items():
-        url = (f"{forecast_base_url}/archive?latitude={latitude}"
-               f"&longitude={longitude}&start_date=2018-01-01&"
-               f"end_date={date.today()}"
-               f"&hourly={','.join(hourly_forecast_data)}"
-               f"&timezone={timezone}")
-        response = requests.get(url, headers=headers, timeout=60)
-        weather_data.append(response.json())
-    return create_dataframe(weather_data, list(coordinates_dict.keys()))
+    start_date = "2018-01-01"
+    end_date = str(date.today())
+    model_params = {"models": model} if model is not None else {}
+    if batched:
+        if batch_size is None:
+            batch_size = choose_batch_size(start_date, end_date,
+                                           hourly_forecast_data, len(coordinates_dict))
+        coordinates = list(coordinates_dict.values())
+        for first in range(0, len(coordinates), batch_size):
+            batch = coordinates[first:first + batch_size]
+            params = {"latitude": ",".join(str(latitude) for latitude, _ in batch),
+                      "longitude": ",".join(str(longitude) for _, longitude in batch),
+                      "start_date": start_date, "end_date": end_date,
+                      "hourly": ",".join(hourly_forecast_data), "timezone": timezone,
+                      **model_params}
+            weather_data.extend(split_locations(get_archive_data(params), len(batch)))
+    else:
+        for key, (latitude, longitude) in coordinates_dict.items():
+            params = {"latitude": latitude, "longitude": longitude,
+                      "start_date": start_date, "end_date": end_date,
+                      "hourly": ",".join(hourly_forecast_data), "timezone": timezone,
+                      **model_params}
+            weather_data.append(get_archive_data(params))
+    return create_dataframe(weather_data, list(coordinates_dict.keys()), name=name)
+
+
+def get_grid_weather_data(coordinates_dict: dict, timezone: str = "Europe/Berlin",
+                          batched: bool = True, model: str = GRID_MODEL):
+    """
+    This function retrieves weather data once per model grid cell instead of once per device.
+    Devices in the same cell share one series; the returned frame has one column per
+    variable and cell (e.g. temperature_2m_<cell_id>) and no per-device copies.
+    The model is requested explicitly, so the cells are those of its grid
+    (see MODEL_RESOLUTIONS). The frame is saved as the "weather-grid" snapshot.
+
+    Args:
+        coordinates_dict (dict): A dictionary containing
+        the coordinates as (latitude, longitude) pairs.
+        timezone (str, optional): The timezone for
+        the requested data (default: "Europe/Berlin").
+        batched (bool, optional): Whether to request several cells per call (default: True).
+        model (str, optional): The archive model, one of MODEL_RESOLUTIONS (default: GRID_MODEL).
+
+    Returns:
+        (dataframe, device_cells) (pd.DataFrame, dict): The weather data per cell and
+        a dictionary mapping each device to the ID of its cell.
+
+    Raises:
+        ValueError: If the grid spacing of the model is unknown.
+    """
+    if model not in MODEL_RESOLUTIONS:
+        raise ValueError(f"Unknown grid spacing of model {model}, "
+                         f"must be one of {', '.join(MODEL_RESOLUTIONS)}.")
+    cells, device_cells = snap_to_grid(coordinates_dict, MODEL_RESOLUTIONS[model])
+    dataframe = get_weather_data(cells, timezone=timezone, batched=batched,
+                                 model=model, name="weather-grid")
+    save_data("weather-cells", pd.DataFrame(
+        [(device_id, cell_id, *cells[cell_id]) for device_id, cell_id in device_cells.items()],
+        columns=["device_id", "cell_id", "latitude", "longitude"]))
+    return dataframe, device_cells
+
+
+def load_device_cells() -> dict:
+    """
+    This function loads the grid cell of every device from the newest "weather-cells" snapshot.
+
+    Returns:
+        dict: A dictionary mapping each device to the ID of its cell (empty if there is no snapshot).
+    """
+    mapping = load_data("weather-cells")
+    if mapping.empty:
+        return {}
+    mapping = mapping[mapping["save_date"] == mapping["save_date"].max()]
+    return dict(zip(mapping["device_id"], mapping["cell_id"]))
+
+
+def device_column(variable: str, device_id: str, device_cells: dict) -> str:
+    """
+    This function returns the name of the weather column of a device,
+    e.g. temperature_2m_<cell_id> for weather data retrieved per grid cell.
+    Devices without a cell fall back to the per-device column of get_weather_data.
+
+    Args:
+        variable (str): The weather variable, e.g. "temperature_2m".
+        device_id (str): The device ID.
+        device_cells (dict): A dictionary mapping each device to the ID of its cell.
+
+    Returns:
+        str: The name of the column.
+    """
+    # The coordinates may be keyed by the full or by the short device ID
+    cell_id = device_cells.get(device_id, device_cells.get(device_id[:8]))
+    return f"{variable}_{cell_id}" if cell_id is not None else f"{variable}_{device_id[:8]}"
+
+
+def snap_to_grid(coordinates_dict: dict, resolution: float = MODEL_RESOLUTIONS[GRID_MODEL]):
+    """
+    This function snaps coordinates to the centre of their model grid cell.
+
+    Args:
+        coordinates_dict (dict): A dictionary containing
+        the coordinates as (latitude, longitude) pairs.
+        resolution (float, optional): The grid spacing in degrees
+        (default: that of GRID_MODEL).
+
+    Returns:
+        (cells, device_cells) (dict, dict): A dictionary mapping each unique cell ID to the
+        coordinates of the cell, and a dictionary mapping each device to its cell ID.
+    """
+    cells = {}
+    device_cells = {}
+    decimals = len(f"{resolution:g}".partition(".")[2])
+    for device_id, (latitude, longitude) in coordinates_dict.items():
+        cell = (round(round(latitude / resolution) * resolution, decimals),
+                round(round(longitude / resolution) * resolution, decimals))
+        # Eight characters, like the short device IDs used in the column names
+        cell_id = hashlib.sha1(f"{cell[0]},{cell[1]}".encode("utf-8")).hexdigest()[:8]
+        cells[cell_id] = cell
+        device_cells[device_id] = cell_id
+    return cells, device_cells
+
+
+def choose_batch_size(start_date: str, end_date: str, variables: list, locations: int) -> int:
+    """
+    This function chooses how many locations to request per call, so that
+    a single response stays below MAX_VALUES_PER_REQUEST hourly values.
+
+    Args:
+        start_date (str): The start date of the range (YYYY-MM-DD).
+        end_date (str): The end date of the range (YYYY-MM-DD).
+        variables (list): The requested hourly variables.
+        locations (int): The total number of locations.
+
+    Returns:
+        int: The number of locations per request.
+    """
+    days = (datetime.strptime(end_date, "%Y-%m-%d")
+            - datetime.strptime(start_date, "%Y-%m-%d")).days + 1
+    values_per_location = days * 24 * max(len(variables), 1)
+    return max(1, min(locations, MAX_LOCATIONS_PER_REQUEST,
+                      MAX_VALUES_PER_REQUEST // values_per_location))
+
+
+def split_locations(response, locations: int) -> list:
+    """
+    This function splits a multi-location response into one response per location.
+    Open Meteo returns a list for several locations and a single object for one location.
+
+    Args:
+        response (dict or list): The decoded response.
+        locations (int): The number of requested locations.
+
+    Returns:
+        list: One response per location, in the order of the request.
+
+    Raises:
+        ValueError: If the response does not contain one entry per location.
+    """
+    responses = response if isinstance(response, list) else [response]
+    if len(responses) != locations:
+        raise ValueError(f"Expected weather data for {locations} locations, "
+                         f"got {len(responses)}: {response}")
+    return responses
 
 
-def create_dataframe(weather_data: list, keys: list):
+def create_dataframe(weather_data: list, keys: list, name: str = "weather-dataframe"):
     """
     This function creates a pandas dataframe from the retrieved weather data.
 
     Args:
         weather_data (list): A list of dictionaries containing the weather data.
         keys (list): A list of the keys from the coordinates_dict.
+        name (str, optional): The name of the snapshot, or None to not save one
+        (default: "weather-dataframe").
 
     Returns:
         pd.DataFrame: A pandas dataframe containing the weather data.
@@ -52,6 +228,7 @@ def create_dataframe(weather_data: list, keys: list):
     dataframe = pd.concat(dfs, axis=1)
     dataframe.columns = [f"{col}_{key[:8]}" for i, key in enumerate(keys) for col in dfs[i].columns]
     dataframe.rename(columns={dataframe.columns[0]: "timestamp"}, inplace=True)
-    dataframe["timestamp"] = pd.to_datetime(dataframe["timestamp"])
-    save_data("weather-dataframe", dataframe)
+    dataframe["timestamp"] = to_naive_utc(dataframe["timestamp"])
+    if name is not None:
+        save_data(name, dataframe)
     return dataframe
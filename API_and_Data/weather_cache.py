@@ -0,0 +1,152 @@
+"""
+This module contains an on-disk cache for calls to the Open-Meteo archive API.
+
+Responses are keyed by coordinates, date range, variables and timezone.
+Coordinates are rounded to four decimal places (about 10 m) both in the key and in
+the request, so a cached response always belongs to the coordinates of its key.
+Ranges that end before the last few days never change any more and are cached
+permanently. Ranges that reach into the recent days are still being filled
+by Open-Meteo and expire after a short time to live.
+
+The module creates the following files:
+    -../data/weather_cache/<key>.json: one cached response per request
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import requests
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+CACHE_DIR = "../data/weather_cache"
+
+# Ranges ending within this many days of today are considered recent
+RECENT_DAYS = 5
+
+# Time to live of recent ranges in seconds
+RECENT_TTL = 6 * 60 * 60
+
+
+def normalise_params(params: dict) -> dict:
+    """
+    This function brings the request parameters into a canonical form,
+    so that equivalent requests share one cache entry.
+
+    Args:
+        params (dict): The query parameters of the request.
+
+    Returns:
+        dict: The canonical parameters.
+    """
+    normalised = {}
+    for key, value in params.items():
+        if key in ("latitude", "longitude"):
+            value = ",".join(f"{float(coordinate):.4f}"
+                             for coordinate in str(value).split(","))
+        elif isinstance(value, (list, tuple)):
+            value = ",".join(str(item) for item in value)
+        normalised[key] = str(value)
+    return normalised
+
+
+def cache_key(params: dict) -> str:
+    """
+    This function computes the cache key of a request.
+
+    Args:
+        params (dict): The query parameters of the request.
+
+    Returns:
+        str: The cache key.
+    """
+    canonical = json.dumps(normalise_params(params), sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_historical(end_date, recent_days: int = RECENT_DAYS) -> bool:
+    """
+    This function checks whether a range ends before the recent days.
+
+    Args:
+        end_date (str or date): The end date of the range (YYYY-MM-DD).
+        recent_days (int): The number of days before today that are still recent.
+
+    Returns:
+        bool: True if the data of the range can no longer change.
+    """
+    if isinstance(end_date, str):
+        end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+    return end_date < date.today() - timedelta(days=recent_days)
+
+
+def read_cache(key: str):
+    """
+    This function reads a cached response if it exists and has not expired.
+
+    Args:
+        key (str): The cache key.
+
+    Returns:
+        dict or list: The cached response, or None if there is no valid entry.
+    """
+    path = f"{CACHE_DIR}/{key}.json"
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8", mode="r") as cache_file:
+        entry = json.load(cache_file)
+    if entry["expires_at"] is not None and entry["expires_at"] < time.time():
+        return None
+    return entry["response"]
+
+
+def write_cache(key: str, response, ttl):
+    """
+    This function writes a response to the cache.
+
+    Args:
+        key (str): The cache key.
+        response (dict or list): The decoded response.
+        ttl (float): The time to live in seconds, or None to keep the entry forever.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = f"{CACHE_DIR}/{key}.json"
+    entry = {"fetched_at": time.time(),
+             "expires_at": None if ttl is None else time.time() + ttl,
+             "response": response}
+    with open(f"{path}.tmp", encoding="utf-8", mode="w") as cache_file:
+        json.dump(entry, cache_file)
+    os.replace(f"{path}.tmp", path)
+
+
+def get_archive_data(params: dict, url: str = ARCHIVE_URL, timeout: int = 60,
+                     recent_ttl: float = RECENT_TTL):
+    """
+    This function returns the response of the Open-Meteo archive API for the given parameters,
+    from the cache when possible.
+
+    Args:
+        params (dict): The query parameters, including start_date and end_date.
+        url (str): The URL of the archive endpoint.
+        timeout (int): The timeout of the request in seconds.
+        recent_ttl (float): The time to live of ranges that reach the recent days.
+
+    Returns:
+        dict or list: The decoded JSON response.
+    """
+    key = cache_key(params)
+    response = read_cache(key)
+    if response is not None:
+        return response
+    # Request the rounded coordinates of the key, not the exact ones
+    canonical = normalise_params(params)
+    params = {name: canonical[name] if name in ("latitude", "longitude") else value
+              for name, value in params.items()}
+    reply = requests.get(url, params=params, timeout=timeout)
+    response = reply.json()
+    # Errors are returned as {"error": true, "reason": ...} and must not be cached
+    if reply.ok and not (isinstance(response, dict) and response.get("error")):
+        ttl = None if is_historical(params["end_date"]) else recent_ttl
+        write_cache(key, response, ttl)
+    return response
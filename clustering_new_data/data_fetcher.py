@@ -3,17 +3,19 @@ This module contains the functions to retrieve data from the Boum API and the Op
 """
 
 import logging
-import time
 from asyncio.log import logger
 from datetime import datetime, timedelta
 
 import pandas as pd
-import requests
-from boum.api_client.constants import API_URL_PROD, API_URL_DEV
-from boum.api_client.v1.client import ApiClient
 from boum.resources.device import Device
-from geopy import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
+
+from API_and_Data.alignment import align_frames
+from API_and_Data.boum_client import (environment_order, get_client, read_credentials,
+                                      remember_environment)
+from API_and_Data.retry_policy import DEFAULT_POLICY, CircuitOpenError, RetryError, get_breaker
+from API_and_Data.time_index import to_naive_utc
+from API_and_Data.weather_cache import get_archive_data
+from clustering_new_data.geocoder import format_address, geocode_address
 
 logging.basicConfig(level=logging.INFO)
 
@@ -53,14 +55,8 @@ class DataFetcher:
             A tuple containing the Boum API credentials for
             the production and development environments.
         """
-        with open("../data/boum_credentials_prod.txt",
-                  encoding="utf-8", mode="r") as prod_credentials:
-            username_prod = prod_credentials.readline().strip()
-            password_prod = prod_credentials.readline().strip()
-        with open("../data/boum_credentials_dev.txt",
-                  encoding="utf-8", mode="r") as dev_credentials:
-            username_dev = dev_credentials.readline().strip()
-            password_dev = dev_credentials.readline().strip()
+        username_prod, password_prod = read_credentials("prod")
+        username_dev, password_dev = read_credentials("dev")
         return username_prod, password_prod, username_dev, password_dev
 
     def process_date_input(self):
@@ -82,6 +78,7 @@ class DataFetcher:
         """
         This function attempts to retrieve the coordinates for
         the target location using the Nominatim API.
+        Addresses that were looked up before are served from the geocoding cache.
 
         Parameters:
             self (DataFetcher): The DataFetcher object.
@@ -94,21 +91,20 @@ class DataFetcher:
             Exception: If an error occurs while attempting to retrieve the location.
         """
 
-        locator = Nominatim(user_agent="cluster_micro_climate")
-        geocode = RateLimiter(locator.geocode)
-        full_address = (f"{self.user_data.get('street_name')}, "
-                        f"{self.user_data.get('street_number')}, "
-                        f"{self.user_data.get('postal_code')}, "
-                        f"{self.user_data.get('city')}, 'Switzerland'")
-        location = geocode(full_address)
+        full_address = format_address(self.user_data.get('street_name'),
+                                      self.user_data.get('street_number'),
+                                      self.user_data.get('postal_code'),
+                                      self.user_data.get('city'))
+        location = geocode_address(full_address)
         if location:
-            return {"latitude": location.latitude, "longitude": location.longitude}
+            return location
         print("Unable to find location. Please check the address details.")
         return None
 
     def authenticate(self, mode):
         """
-        Authenticates the API client with the specified credentials and environment.
+        Returns the authenticated API client for the specified environment.
+        The client is shared across the process and only logs in once.
 
         Args:
             mode (str): The environment to authenticate against either "dev" or "prod".
@@ -119,24 +115,18 @@ class DataFetcher:
         Raises:
             ValueError: If an invalid environment is specified.
         """
-        (username_prod, password_prod,
-         username_dev, password_dev) = self.get_credentials()
-        if mode == "dev":
-            client = ApiClient(username_dev, password_dev, base_url=API_URL_DEV)
-        elif mode == "prod":
-            client = ApiClient(username_prod, password_prod, base_url=API_URL_PROD)
-        else:
-            raise ValueError(f"Invalid environment: {mode}. Must be 'dev' or 'prod'.")
-        client.connect()
-        return client
-
-    def get_device_data(self, mode, days=30):
+        return get_client(mode)
+
+    def get_device_data(self, mode, days=30, deadline=None):
         """
         This function retrieves the data for a specific device from the Boum API.
+        Failed calls are retried according to the shared retry policy.
 
         Args:
             mode (str): The environment to authenticate against either "dev" or "prod".
             days (int, optional): The number of days of data to retrieve (default is 30).
+            deadline (float, optional): The time.monotonic value after which no retry is started
+            (default: the time budget of the retry policy, starting now).
 
         Returns:
             A pandas dataframe containing the data for the specified device.
@@ -145,26 +135,24 @@ class DataFetcher:
             ValueError: If an invalid environment is specified.
             Exception: If an error occurs while retrieving the data.
         """
+        if deadline is None:
+            deadline = DEFAULT_POLICY.deadline()
         client = self.authenticate(mode)
-        device = Device(self.user_data.get('device_id'), client)
-        attempts = 0
-        max_attempts = 30
-
-        while attempts < max_attempts:
-            try:
-                return device.get_telemetry_data(start=self.target_date - timedelta(days=days),
-                                                 end=self.target_date + timedelta(days=days),
-                                                 interval=timedelta(minutes=60))
-            except ConnectionError as connection_error:
-                logger.error("Connection error for device %s: %s",
-                             self.user_data.get('device_id'), connection_error)
-            except TimeoutError as timeout_error:
-                logger.error("Timeout error for device %s: %s",
-                             self.user_data.get('device_id'), timeout_error)
-            attempts += 1
-            time.sleep(2)  # Wait for 2 seconds before retrying
-
-        logger.error("Failed to retrieve data after %s attempts", max_attempts)
+        device_id = self.user_data.get('device_id')
+        device = Device(device_id, client)
+        try:
+            return DEFAULT_POLICY.call(device.get_telemetry_data,
+                                       start=self.target_date - timedelta(days=days),
+                                       end=self.target_date + timedelta(days=days),
+                                       interval=timedelta(minutes=60),
+                                       breaker=get_breaker(f"boum-{mode}-{device_id}"),
+                                       deadline=deadline)
+        except CircuitOpenError as open_error:
+            logger.warning("Device %s is unavailable for now, try again later: %s",
+                           device_id, open_error)
+        except RetryError as retry_error:
+            logger.error("Failed to retrieve data for device %s: %s",
+                         device_id, retry_error)
         return pd.DataFrame()
 
     def create_boum_dataframe(self, sensor_names):
@@ -178,17 +166,16 @@ class DataFetcher:
             A pandas dataframe containing the merged data.
         """
         dfs = [self.boum_data[device_id] for device_id in sensor_names]
-        dataframe = dfs[0]
-        for device in range(len(dfs) - 1):
-            device += 1
-            dataframe = pd.merge_ordered(dataframe, dfs[device], on="timestamp")
-        dataframe = dataframe.copy()
-        dataframe["timestamp"] = pd.to_datetime(dataframe.timestamp).dt.tz_localize(None)
+        dataframe = align_frames(dfs, on="timestamp").copy()
+        dataframe["timestamp"] = to_naive_utc(dataframe["timestamp"])
         return dataframe
 
     def get_boum_data(self):
         """
         This function retrieves the boum data for the device.
+        The environment in which the device was found before is asked first.
+        All environments share one time budget.
+
         Args:
             self (DataFetcher): The DataFetcher object.
 
@@ -197,9 +184,13 @@ class DataFetcher:
         """
         device_id = self.user_data.get("device_id")[:8]
         try:
-            data = self.get_device_data("prod")
-            if pd.DataFrame(data).empty:
-                data = self.get_device_data("dev")
+            data = None
+            deadline = DEFAULT_POLICY.deadline()
+            for mode in environment_order(self.user_data.get("device_id")):
+                data = self.get_device_data(mode, deadline=deadline)
+                if not pd.DataFrame(data).empty:
+                    remember_environment(self.user_data.get("device_id"), mode)
+                    break
             if not pd.DataFrame(data).empty:
                 dataframe = pd.DataFrame(data)
                 dataframe.rename(columns=lambda col: f"{col}", inplace=True)
@@ -233,6 +224,7 @@ class DataFetcher:
     def get_weather_data(self):
         """
         This function retrieves the weather data for the target month and location.
+        Responses are served from the shared Open-Meteo cache when possible.
 
         Parameters:
             self (DataFetcher): The DataFetcher object.
@@ -240,20 +232,17 @@ class DataFetcher:
         Returns:
             A pandas dataframe containing the weather data.
         """
-        forecast_base_url = "http://archive-api.open-meteo.com/v1"
-        headers = {"Content-Type": "application/json"}
         hourly_forecast_data = ["temperature_2m", "direct_normal_irradiance", ]
         start_date = (self.target_date - timedelta(30)).strftime('%Y-%m-%d')
         end_date = (self.target_date + timedelta(30)).strftime('%Y-%m-%d')
 
-        url = (f"{forecast_base_url}/archive?latitude={self.coordinates['latitude']}&"
-               f"longitude={self.coordinates['longitude']}&"
-               f"start_date={start_date}&"
-               f"end_date={end_date}&"
-               f"hourly={','.join(hourly_forecast_data)}"
-               f"&timezone=Europe/Berlin")
-        response = requests.get(url, headers=headers, timeout=60)
-        self.weather_data = response.json()['hourly']
+        params = {"latitude": self.coordinates['latitude'],
+                  "longitude": self.coordinates['longitude'],
+                  "start_date": start_date,
+                  "end_date": end_date,
+                  "hourly": ','.join(hourly_forecast_data),
+                  "timezone": "Europe/Berlin"}
+        self.weather_data = get_archive_data(params)['hourly']
         return self.create_weather_dataframe(self.user_data.get('device_id'))
 
     def create_weather_dataframe(self, key):
@@ -269,7 +258,7 @@ class DataFetcher:
         dataframe = pd.DataFrame(self.weather_data)
         dataframe.columns = [f"{col}_{key[:8]}" for col in dataframe.columns]
         dataframe.rename(columns={f"time_{key[:8]}": "timestamp"}, inplace=True)
-        dataframe["timestamp"] = pd.to_datetime(dataframe["timestamp"])
+        dataframe["timestamp"] = to_naive_utc(dataframe["timestamp"])
         return dataframe
 
     def fetch_data(self):
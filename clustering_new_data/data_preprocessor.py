@@ -6,11 +6,15 @@ import gc
 import numpy as np
 import pandas as pd
 
+from API_and_Data.time_index import from_epoch_seconds, normalise_time_column
 from clustering_new_data.config import (MAX_TIME, MIN_TIME, VOLTAGE_THRESHOLD,
                                         RADIATION_THRESHOLDS, TEMPERATURE_THRESHOLDS,
                                         TEMP_CORRECTION_COEFFICIENT, TEMP_CORRECTION_INTERCEPT)
 from msc.MathClass import interpolate_dataframe_to_resolution
 
+# Interval of the interpolated BOUM data in seconds
+GRID_RESOLUTION = 600
+
 
 class DataPreprocessor:
     """
@@ -57,8 +61,8 @@ class DataPreprocessor:
     def preprocess_timestamps(self):
         """
         This function preprocesses the timestamps in the BOUM data.
-        It attempts to convert the timestamps to datetime objects, remove the time zone information,
-        convert the timestamps to milliseconds, and then resample the data to a 10-minute interval.
+        It converts the timestamps to seconds since the epoch (naive UTC)
+        and then resamples the data to a 10-minute interval.
 
         Returns:
             DataFrame: The processed BOUM data, or None if an error occurred.
@@ -67,15 +71,12 @@ class DataPreprocessor:
             ValueError: If an error occurs while preparing the timestamps.
         """
         try:
-            self.boum_data['timestamp'] = pd.to_datetime(
-                self.boum_data['timestamp']).dt.tz_localize(None)
-            self.boum_data['timestamp'] = self.boum_data['timestamp'].values.astype(
-                np.int64) // 10 ** 6 // 1000
+            self.boum_data = normalise_time_column(self.boum_data, 'timestamp', unit='seconds')
             boum_data = interpolate_dataframe_to_resolution(
                 self.boum_data, 'timestamp',
-                600, self.boum_data.columns,
+                GRID_RESOLUTION, self.boum_data.columns,
                 "values")
-            boum_data['timestamp'] = pd.to_datetime(boum_data['timestamp'], unit='s')
+            boum_data['timestamp'] = from_epoch_seconds(boum_data['timestamp'])
             boum_data.set_index('timestamp', inplace=True)
             return boum_data
         except ValueError as value_error:
@@ -115,6 +116,76 @@ class DataPreprocessor:
         self.boum_data = self.boum_data.resample("30T").mean().dropna(how="all")
         return self.boum_data
 
+    def can_resample_corrected(self, columns):
+        """
+        This function checks whether resample_corrected_data can correct the data in one pass.
+        That requires a timestamp column and numeric temperature and voltage columns
+        that are not stored as float32.
+
+        Args:
+            columns (list): The temperature and voltage columns.
+
+        Returns:
+            bool: True if the single pass gives the same result as
+            preprocess_timestamps followed by correct_data.
+        """
+        if not columns or "timestamp" not in self.boum_data.columns:
+            return False
+        if not set(columns).issubset(self.boum_data.columns):
+            return False
+        dtypes = self.boum_data[columns].dtypes
+        return all(isinstance(dtype, np.dtype) and (dtype.kind in "iu" or dtype == np.float64)
+                   for dtype in dtypes)
+
+    def resample_corrected_data(self):
+        """
+        This function resamples the BOUM data to the corrected 30-minute interval in one pass.
+        Only the temperature and solar voltage columns are interpolated to the 10-minute
+        interval. The voltage threshold, the temperature correction and the masking of repeated
+        values are applied to the interpolated values as one array before the 30-minute means.
+        The result is the same as that of preprocess_timestamps followed by correct_data,
+        which are used instead for data this pass does not cover.
+
+        Returns:
+            DataFrame: The corrected BOUM data, or None if an error occurred.
+        """
+        temperature_columns = [col for col in self.boum_data.columns
+                               if col.startswith("temperature_boum")]
+        voltage_columns = [col.replace("temperature", "solarVoltage")
+                           for col in temperature_columns]
+        columns = temperature_columns + voltage_columns
+        if not self.can_resample_corrected(columns):
+            self.boum_data = self.preprocess_timestamps()
+            if self.boum_data is None:
+                return None
+            return self.correct_data()
+        try:
+            boum_data = normalise_time_column(self.boum_data[["timestamp"] + columns].copy(),
+                                              'timestamp', unit='seconds')
+            boum_data = interpolate_dataframe_to_resolution(
+                boum_data, 'timestamp',
+                GRID_RESOLUTION, boum_data.columns,
+                "values")
+        except ValueError as value_error:
+            print(f"Error preprocessing timestamps: {value_error}")
+            return None
+
+        values = boum_data[columns].to_numpy(dtype="float64", copy=True)
+        temperatures = values[:, :len(temperature_columns)]
+        voltages = values[:, len(temperature_columns):]
+        with np.errstate(invalid="ignore"):
+            voltages[~(voltages <= self.config_data.get('voltage_threshold'))] = np.nan
+        temperatures[:] = (self.config_data.get('temp_correction_factor') * temperatures +
+                           self.config_data.get('temp_offset'))
+        repeated = np.zeros(values.shape, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            repeated[1:] = np.round(np.diff(values, axis=0), 2) == 0
+        values[repeated] = np.nan
+
+        timestamps = pd.DatetimeIndex(from_epoch_seconds(boum_data['timestamp']), name='timestamp')
+        corrected_data = pd.DataFrame(values, index=timestamps, columns=columns)
+        return corrected_data.resample("30T").mean().dropna(how="all")
+
     def extract_columns(self):
         """
         This function extracts the relevant columns from the BOUM data.
@@ -414,13 +485,9 @@ class DataPreprocessor:
             ValueError: If an error occurred during data preprocessing.
         """
         try:
-            self.boum_data = self.preprocess_timestamps()
-            if self.boum_data is None:
-                raise ValueError("Failed to preprocess timestamps in boum data.")
-
-            self.boum_data = self.correct_data()
+            self.boum_data = self.resample_corrected_data()
             if self.boum_data is None:
-                raise ValueError("Failed to correct boum data.")
+                raise ValueError("Failed to resample and correct boum data.")
 
             self.boum_data, self.weather_data = self.rename_columns()
 
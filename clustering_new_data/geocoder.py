@@ -0,0 +1,178 @@
+"""
+This module contains a persistent cache for geocoding addresses with the Nominatim API.
+
+Addresses are normalised before lookup, so that different spellings of the same
+address (case, spacing, punctuation) share one entry. Addresses that were geocoded
+once are never sent to Nominatim again. Addresses that could not be found are cached
+as well, so that they are not retried on every run. Lookups that failed because of
+an error of the service are not cached and are retried on the next run.
+
+The module creates the following files:
+    -../data/geocode_cache.json: the coordinates of each normalised address
+"""
+import json
+import os
+import re
+import unicodedata
+from asyncio.log import logger
+
+import pandas as pd
+from geopy import Nominatim
+from geopy.exc import GeocoderServiceError
+from geopy.extra.rate_limiter import RateLimiter
+
+GEOCODE_CACHE_FILE = "../data/geocode_cache.json"
+USER_AGENT = "cluster_micro_climate"
+
+# Nominatim allows at most one request per second
+MIN_DELAY_SECONDS = 1.0
+
+# Columns of the survey data that make up an address
+ADDRESS_COLUMNS = ["street_name", "street_number", "postal_code", "city"]
+
+_cache = None
+_geocode = None
+
+
+def format_address(street_name, street_number, postal_code, city, country="Switzerland"):
+    """
+    This function builds the address that is sent to Nominatim.
+
+    Args:
+        street_name (str): The street name.
+        street_number (str): The street number.
+        postal_code (str): The postal code.
+        city (str): The city.
+        country (str, optional): The country (default: "Switzerland").
+
+    Returns:
+        str: The full address.
+    """
+    return f"{street_name}, {street_number}, {postal_code}, {city}, {country}"
+
+
+def normalise_address(address):
+    """
+    This function brings an address into a canonical form that is used as cache key.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        str: The normalised address.
+    """
+    address = unicodedata.normalize("NFKC", str(address)).casefold()
+    address = re.sub(r"[\"'.;]", " ", address)
+    parts = [" ".join(part.split()) for part in address.split(",")]
+    return ", ".join(part for part in parts if part)
+
+
+def load_cache():
+    """
+    This function loads the geocoding cache. The file is only read the first time.
+
+    Returns:
+        dict: A dictionary mapping normalised addresses to their coordinates,
+        or to None if the address could not be found.
+    """
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if os.path.exists(GEOCODE_CACHE_FILE):
+            with open(GEOCODE_CACHE_FILE, encoding="utf-8", mode="r") as cache_file:
+                _cache = json.load(cache_file)
+    return _cache
+
+
+def save_cache():
+    """
+    This function writes the geocoding cache to disk.
+    The file is replaced atomically, so an interrupted run never leaves it half written.
+    """
+    os.makedirs(os.path.dirname(GEOCODE_CACHE_FILE), exist_ok=True)
+    with open(f"{GEOCODE_CACHE_FILE}.tmp", encoding="utf-8", mode="w") as cache_file:
+        json.dump(load_cache(), cache_file, indent=2, sort_keys=True, ensure_ascii=False)
+    os.replace(f"{GEOCODE_CACHE_FILE}.tmp", GEOCODE_CACHE_FILE)
+
+
+def get_geocoder():
+    """
+    This function returns the rate limited Nominatim geocoder.
+    The geocoder is created on first use and shared afterwards,
+    so the rate limit holds across all calls in the process.
+    Errors are raised after the retries instead of being returned as None,
+    so that they can be told apart from addresses that were not found.
+
+    Returns:
+        RateLimiter: The rate limited geocode function.
+    """
+    global _geocode
+    if _geocode is None:
+        locator = Nominatim(user_agent=USER_AGENT)
+        _geocode = RateLimiter(locator.geocode, min_delay_seconds=MIN_DELAY_SECONDS,
+                               swallow_exceptions=False)
+    return _geocode
+
+
+def geocode_address(address, save=True):
+    """
+    This function returns the coordinates of an address, from the cache when possible.
+    Only results of successful lookups are cached, including addresses that were not found.
+
+    Args:
+        address (str): The address.
+        save (bool, optional): Whether to write the cache to disk after a lookup (default: True).
+
+    Returns:
+        dict: A dictionary containing the latitude and longitude of the address,
+        or None if the address is empty, could not be found or the lookup failed.
+    """
+    if pd.isna(address) or not str(address).strip():
+        return None
+    cache = load_cache()
+    key = normalise_address(address)
+    if key not in cache:
+        try:
+            location = get_geocoder()(address)
+        except GeocoderServiceError as error:
+            logger.warning("Geocoding of %s failed: %s", address, error)
+            return None
+        cache[key] = ({"latitude": location.latitude, "longitude": location.longitude}
+                      if location else None)
+        if save:
+            save_cache()
+    return cache[key]
+
+
+def geocode_survey(path="../data/survey_data.csv", columns=None):
+    """
+    This function fills the geocoding cache with all addresses of a survey CSV file.
+    Only addresses that are not cached yet are sent to Nominatim, one per second.
+    Rows without any address details are skipped.
+
+    Args:
+        path (str, optional): The path to the survey CSV file.
+        columns (list, optional): The address columns in the order street name,
+        street number, postal code and city (default: ADDRESS_COLUMNS).
+
+    Returns:
+        pd.DataFrame: The survey data with added latitude_geocoded and longitude_geocoded columns.
+    """
+    survey = pd.read_csv(path, dtype=str)
+    details = survey[columns or ADDRESS_COLUMNS].fillna("")
+    addresses = [format_address(*row) if any(part.strip() for part in row) else None
+                 for row in details.itertuples(index=False)]
+    coordinates = []
+    for number, address in enumerate(addresses, start=1):
+        coordinates.append(geocode_address(address, save=False) or {})
+        # Keep the progress of long runs in case they are interrupted
+        if number % 50 == 0:
+            save_cache()
+    save_cache()
+    survey["latitude_geocoded"] = [entry.get("latitude") for entry in coordinates]
+    survey["longitude_geocoded"] = [entry.get("longitude") for entry in coordinates]
+    return survey
+
+
+if __name__ == "__main__":
+    print(geocode_survey())
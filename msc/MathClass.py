@@ -1,6 +1,9 @@
 import math
 
 import numpy as np
+import pandas as pd
+
+from API_and_Data.time_index import to_naive_utc
 
 
 class Math:
@@ -42,14 +45,21 @@ class Math:
 
     @staticmethod
     def get_row_nearest(df, index, value_to_find):
-        """Gets the row in a dataframe which is nearest
-        to value_to_find which is a float.
+        """Gets the rows in a dataframe which are nearest
+        to value_to_find: from the first of the rows with the
+        largest index at or below it to the first row at or
+        above it. The dataframe is sorted by the index column
+        if it is not yet.
+        For many values use get_rows_nearest or get_rows_bracketing.
         """
-        Min = df[index] <= value_to_find
-        Max = df[index] >= value_to_find
-        idx_Min = df.ix[Min, index].idxmax()
-        idx_Max = df.ix[Max, index].idxmin()
-        return df.ix[idx_Min:idx_Max]
+        if not df[index].is_monotonic_increasing:
+            df = df.sort_values(index, kind="stable")
+        before, after = bracketing_positions(df[index], [value_to_find])
+        if before[0] < 0 or after[0] >= len(df):
+            raise ValueError(f"{value_to_find} is outside the range of {index}.")
+        # Rows with the same index as the one below the value are all included
+        first = df[index].searchsorted(df[index].iloc[before[0]], side="left")
+        return df.iloc[min(first, after[0]):after[0] + 1]
 
     @staticmethod
     def get_cov(sde, sdn, sdne):
@@ -72,9 +82,315 @@ class Math:
         return df.attitude * 180 / math.pi
 
 
+def lookup_values(values):
+    """
+    Converts index values or values to find to numbers for binary search.
+    Timestamps, datetimes and date strings become int64 nanoseconds since the epoch (naive UTC).
+
+    Args:
+        values (array-like or scalar): Numbers or timestamps.
+
+    Returns:
+        (ndarray, bool): The numbers and whether they are timestamps.
+    """
+    array = np.atleast_1d(np.asarray(values))
+    if pd.api.types.is_datetime64_any_dtype(values) or array.dtype.kind in "MOUS":
+        return to_naive_utc(array).to_numpy(dtype="datetime64[ns]").view(np.int64), True
+    return array, False
+
+
+def bracketing_positions(index_values, values_to_find):
+    """
+    Finds the rows around every value to find in a sorted index with binary search.
+
+    Args:
+        index_values (array-like): Index values sorted in ascending order, numbers or timestamps.
+        values_to_find (array-like or scalar): Values to find, of the same kind as the index values.
+
+    Returns:
+        (ndarray, ndarray): For every value to find the position of the last index value
+        at or below it (-1 if there is none) and of the first index value at or above it
+        (the length of the index if there is none). Missing values to find have neither.
+    """
+    missing = np.atleast_1d(pd.isna(values_to_find))
+    index_values, _ = lookup_values(index_values)
+    values_to_find, _ = lookup_values(values_to_find)
+    before = np.where(missing, -1, np.searchsorted(index_values, values_to_find, side="right") - 1)
+    after = np.where(missing, len(index_values), np.searchsorted(index_values, values_to_find, side="left"))
+    return before, after
+
+
+def nearest_positions(index_values, values_to_find, tolerance=None):
+    """
+    Finds the row nearest to every value to find in a sorted index with binary search.
+    Of several rows at the same distance the first one is taken.
+
+    Args:
+        index_values (array-like): Index values sorted in ascending order, numbers or timestamps.
+        values_to_find (array-like or scalar): Values to find, of the same kind as the index values.
+        tolerance (Optional[float or timedelta]): Largest distance to the nearest row.
+        A string or timedelta for timestamps, e.g. "10min".
+
+    Returns:
+        ndarray: For every value to find the position of the nearest row, or -1 if there is
+        no row within the tolerance.
+    """
+    missing = np.atleast_1d(pd.isna(values_to_find))
+    index_values, is_time = lookup_values(index_values)
+    values_to_find, _ = lookup_values(values_to_find)
+    if len(index_values) == 0:
+        return np.full(len(values_to_find), -1)
+    before = np.searchsorted(index_values, values_to_find, side="right") - 1
+    after = np.minimum(before + 1, len(index_values))
+    last = max(len(index_values) - 1, 0)
+    with np.errstate(invalid="ignore"):
+        distance_before = np.where(before >= 0, values_to_find - index_values[np.clip(before, 0, last)], np.inf)
+        distance_after = np.where(after < len(index_values),
+                                  index_values[np.clip(after, 0, last)] - values_to_find, np.inf)
+    nearest = np.where(distance_after < distance_before, after, before)
+    # first of several rows with the same index value
+    nearest = np.searchsorted(index_values, index_values[np.clip(nearest, 0, last)], side="left")
+    distance = np.minimum(distance_before, distance_after)
+    if tolerance is not None:
+        tolerance = pd.Timedelta(tolerance).value if is_time else tolerance
+        nearest[distance > tolerance] = -1
+    nearest[~np.isfinite(distance) | missing] = -1
+    return nearest
+
+
+def rows_at(df, positions, sorted_rows):
+    """
+    Returns the rows of a dataframe at positions in the order of its index column,
+    with a row of NaN wherever the position is outside the dataframe.
+
+    Args:
+        df (Pandas.DataFrame): Dataframe to take the rows from.
+        positions (ndarray): Positions in the order of the index column.
+        sorted_rows (ndarray or None): Positions of the rows in the order of the index column,
+        or None if the dataframe is sorted by it.
+
+    Returns:
+        Pandas.DataFrame: One row per position.
+    """
+    inside = (positions >= 0) & (positions < len(df))
+    positions = np.where(inside, positions, -1)
+    if sorted_rows is not None:
+        positions = np.where(inside, sorted_rows[np.clip(positions, 0, max(len(df) - 1, 0))], -1)
+    return df.reset_index(drop=True).reindex(positions).reset_index(drop=True)
+
+
+def sort_order(df, index):
+    """
+    Returns the positions of the rows of a dataframe in the order of its index column.
+
+    Args:
+        df (Pandas.DataFrame): Dataframe to work on
+        index (str): Name of the index column.
+
+    Returns:
+        (ndarray, ndarray or None): The index values in ascending order and the positions
+        of the rows in that order, or None if the dataframe is already sorted.
+    """
+    index_values = df[index]
+    if index_values.is_monotonic_increasing:
+        return index_values, None
+    sorted_rows = np.argsort(lookup_values(index_values)[0], kind="stable")
+    return index_values.iloc[sorted_rows], sorted_rows
+
+
+def get_rows_nearest(df, index, values_to_find, tolerance=None):
+    """
+    Gets the row of a dataframe nearest to every value to find with binary search over the index column,
+    e.g. the Boum reading nearest to each Fyta reading.
+    The dataframe is sorted by the index column if it is not yet.
+
+    Args:
+        df (Pandas.DataFrame): Dataframe to work on
+        index (str): Name of the index column, numbers or timestamps.
+        values_to_find (array-like or scalar): Values to find, of the same kind as the index column.
+        tolerance (Optional[float or timedelta]): Largest distance to the nearest row.
+        A string or timedelta for timestamps, e.g. "10min".
+
+    Returns:
+        Pandas.DataFrame: One row per value to find, in their order, and a row of NaN where no row
+        is within the tolerance.
+    """
+    index_values, sorted_rows = sort_order(df, index)
+    return rows_at(df, nearest_positions(index_values, values_to_find, tolerance), sorted_rows)
+
+
+def get_rows_bracketing(df, index, values_to_find):
+    """
+    Gets the rows of a dataframe around every value to find with binary search over the index column,
+    e.g. the readings before and after each daily maximum.
+    The dataframe is sorted by the index column if it is not yet.
+
+    Args:
+        df (Pandas.DataFrame): Dataframe to work on
+        index (str): Name of the index column, numbers or timestamps.
+        values_to_find (array-like or scalar): Values to find, of the same kind as the index column.
+
+    Returns:
+        (Pandas.DataFrame, Pandas.DataFrame): One row per value to find, in their order, with the last row
+        at or below it and the first row at or above it, and a row of NaN where there is none.
+    """
+    index_values, sorted_rows = sort_order(df, index)
+    before, after = bracketing_positions(index_values, values_to_find)
+    return rows_at(df, before, sorted_rows), rows_at(df, after, sorted_rows)
+
+
+def can_interpolate_vectorized(df, index_column, new_index_values, columns_to_interpolate,
+                               interpolation_method):
+    """
+    Checks whether interpolate_dataframe can use its vectorized implementation.
+    It covers numeric indices without NaN, numeric and object columns and
+    the "values" and "index" interpolation methods.
+
+    Args:
+        df (Pandas.DataFrame): Dataframe to work on
+        index_column (str or None): Name of the index column.
+        new_index_values (list/ndarray): new index.
+        columns_to_interpolate (list(str)): Name of the columns to use.
+        interpolation_method (str): Pandas interpolation method to use.
+
+    Returns:
+        bool: True if the vectorized implementation gives the same result as the pandas one.
+    """
+    if index_column is None or interpolation_method not in ("values", "index"):
+        return False
+    columns = list(columns_to_interpolate)
+    if len(set(columns)) != len(columns) or not df.columns.is_unique:
+        return False
+    old_index = np.asarray(df[index_column])
+    new_index = np.asarray(new_index_values)
+    for index in (old_index, new_index):
+        if index.dtype.kind not in "iuf" or (index.dtype.kind == "f" and np.isnan(index).any()):
+            return False
+    return all(isinstance(dtype, np.dtype) and dtype.kind in "iufO"
+               for dtype in df[columns].dtypes)
+
+
 def interpolate_dataframe(df, index_column, new_index_values, columns_to_interpolate, interpolation_method="values"):
     """
     Method to interpolate all columns of a dataframe which are in components to the new index passed.
+    Numeric columns are interpolated linearly over the index values with np.interp and
+    hold their first and last value outside the old index. Object columns take the value
+    of the next row of the old index that has one, or else of the last such row.
+    Inputs that this does not cover are passed to interpolate_dataframe_legacy,
+    which gives the same result with pandas.
+
+    Args:
+        df (Pandas.DataFrame): Dataframe to work on
+        index_column (str or None): Name of the index column.
+        If None, the dataframe's index is expected to be set and
+            used.
+            This also determines whether the returned dataframe still has the index as seperate column.
+        new_index_values (list/ndarray): new index.
+        x-values to interpolate new y-values from.
+        columns_to_interpolate (list(str)): Name of the columns to use.
+        interpolation_method (Optional[str]): Pandas interpolation method to use.
+        Defaults to values.
+        For other
+            possibble methods see the documentation of  Pandas.DataFrame.interpolate().
+
+    Returns:
+        (:obj: `pd.DataFrame`): Pandas Dataframe with new index and interpoalted values.
+    """
+    if not can_interpolate_vectorized(df, index_column, new_index_values, columns_to_interpolate,
+                                      interpolation_method):
+        return interpolate_dataframe_legacy(df, index_column, new_index_values, columns_to_interpolate,
+                                            interpolation_method)
+
+    # sorted old index, keeping the first of duplicate rows, and sorted new index
+    old_index, first_rows = np.unique(np.asarray(df[index_column]), return_index=True)
+
+    # object columns without any value in the kept rows are left to the pandas implementation,
+    # whose result type depends on the missing values (None may stay an object, NaN becomes float64)
+    if any(df[column].dtype == object and pd.isna(df[column].to_numpy()[first_rows]).all()
+           for column in columns_to_interpolate if column != index_column):
+        return interpolate_dataframe_legacy(df, index_column, new_index_values, columns_to_interpolate,
+                                            interpolation_method)
+    new_index = np.unique(np.asarray(new_index_values))
+    index_dtype = np.result_type(old_index, new_index)
+    old_index = old_index.astype(index_dtype, copy=False)
+    new_index = new_index.astype(index_dtype, copy=False)
+
+    # position of each new index value in the old index
+    positions = np.minimum(np.searchsorted(old_index, new_index), len(old_index) - 1)
+    found = old_index[positions] == new_index
+    inserted = not found.all()
+
+    columns = list(columns_to_interpolate)
+    if index_column not in columns:
+        columns.append(index_column)
+    interpolated = {}
+    for column in columns:
+        values = df[column].to_numpy()[first_rows]
+        if column == index_column:
+            interpolated[column] = new_index
+        elif values.dtype == object:
+            interpolated[column] = fill_objects(old_index, values, new_index)
+        elif values.dtype.kind in "iu" and not inserted:
+            interpolated[column] = values[positions]
+        else:
+            interpolated[column] = interpolate_values(old_index, values, new_index, positions, found)
+    return pd.DataFrame(interpolated, index=pd.Index(new_index, name=index_column), columns=columns)
+
+
+def interpolate_values(old_index, values, new_index, positions, found):
+    """
+    Interpolates a numeric column linearly over the index values.
+    Missing values are filled from the valid values around them and new index values
+    outside the valid values get the first or last valid value.
+
+    Args:
+        old_index (ndarray): sorted unique old index.
+        values (ndarray): values of the column at the old index.
+        new_index (ndarray): sorted unique new index.
+        positions (ndarray): position of each new index value in the old index.
+        found (ndarray): whether each new index value is part of the old index.
+
+    Returns:
+        ndarray: values of the column at the new index.
+    """
+    dtype = values.dtype if values.dtype.kind == "f" else np.dtype("float64")
+    values = values.astype(dtype, copy=False)
+    result = np.full(len(new_index), np.nan, dtype=dtype)
+    result[found] = values[positions[found]]
+    missing = np.isnan(result)
+    valid = ~np.isnan(values)
+    if valid.all():
+        result[missing] = np.interp(new_index[missing], old_index, values)
+    elif missing.any() and valid.any():
+        result[missing] = np.interp(new_index[missing], old_index[valid], values[valid])
+    return result
+
+
+def fill_objects(old_index, values, new_index):
+    """
+    Fills an object column at the new index with the value of the next old index row
+    that has one, or else with the value of the last such row.
+    The column must have at least one value.
+
+    Args:
+        old_index (ndarray): sorted unique old index.
+        values (ndarray): values of the column at the old index.
+        new_index (ndarray): sorted unique new index.
+
+    Returns:
+        ndarray: values of the column at the new index.
+    """
+    valid = ~pd.isna(values)
+    valid_index = old_index[valid]
+    following = np.searchsorted(valid_index, new_index, side="left")
+    return values[valid][np.minimum(following, len(valid_index) - 1)]
+
+
+def interpolate_dataframe_legacy(df, index_column, new_index_values, columns_to_interpolate, interpolation_method="values"):
+    """
+    Method to interpolate all columns of a dataframe which are in components to the new index passed.
+    This is the pandas implementation, used by interpolate_dataframe for inputs its
+    vectorized implementation does not cover.
 
     Args:
         df (Pandas.DataFrame): Dataframe to work on
@@ -133,7 +449,7 @@ def interpolate_dataframe(df, index_column, new_index_values, columns_to_interpo
 
 
 def interpolate_dataframe_to_resolution(df, index_column, resolution, columns_to_interpolate,
-                                        interpolation_method="values"):
+                                        interpolation_method="values", series_column=None):
     """
     Method to interpolate all columns of a dataframe which are in components to a time-interval specified by the
     resolution.
@@ -152,10 +468,16 @@ def interpolate_dataframe_to_resolution(df, index_column, resolution, columns_to
         Defaults to values.
         For other
             possibble methods see the documentation of  Pandas.DataFrame.interpolate().
+        series_column (Optional[str]): Name of the column holding the series ID of a long-format
+            dataframe. If given, every series is interpolated to its own grid,
+            see interpolate_series_to_resolution.
 
     Returns:
         Pandas.DataFrame: Dataframe with new index according to resolution and interpoalted values.
     """
+    if series_column is not None:
+        return interpolate_series_to_resolution(df, series_column, index_column, resolution,
+                                                columns_to_interpolate, interpolation_method)
 
     # get the old index as numpy array
     old_index = df[index_column].values
@@ -183,6 +505,119 @@ def interpolate_dataframe_to_resolution(df, index_column, resolution, columns_to
     return interpolate_dataframe(df, index_column, new_index, columns_to_interpolate, interpolation_method)
 
 
+def interpolate_series_to_resolution(df, series_column, index_column, resolution, columns_to_interpolate,
+                                     interpolation_method="values"):
+    """
+    Method to interpolate every series of a long-format dataframe to a time-interval specified by the
+    resolution, as interpolate_dataframe_to_resolution does for a single series.
+    Each series gets its own grid from its first to its last index value, so no union index
+    of all series is built.
+    All series are interpolated together on 2-D arrays: the rows are sorted by series and index,
+    every grid point is matched to the rows of its series with one searchsorted and every value
+    column is interpolated linearly between the valid values around each grid point.
+    The values equal those of interpolate_dataframe_to_resolution applied to each series.
+    A wide dataframe can be brought into long format with Pandas.DataFrame.melt.
+
+    Args:
+        df (Pandas.DataFrame): Long-format dataframe to work on, with one row per series and index value.
+        series_column (str): Name of the column holding the series ID.
+        index_column (str): Name of the index column.
+        resolution (float): resolution to interpolate the series to.
+        columns_to_interpolate (list(str)): Name of the numeric columns to use.
+        interpolation_method (Optional[str]): Pandas interpolation method to use.
+        Defaults to values.
+        Methods other than values and index interpolate the series one after another.
+
+    Returns:
+        Pandas.DataFrame: Long-format dataframe with the series ID as categorical column,
+        the index column and the interpolated columns, sorted by series and index.
+    """
+    columns = [column for column in columns_to_interpolate if column not in (series_column, index_column)]
+    if interpolation_method not in ("values", "index"):
+        frames = [interpolate_dataframe_to_resolution(group.sort_values(index_column, kind="stable"),
+                                                      index_column, resolution, columns, interpolation_method)
+                  .assign(**{series_column: series_id})
+                  for series_id, group in df.dropna(subset=[index_column]).groupby(series_column, sort=True)]
+        if not frames:
+            return pd.DataFrame(columns=[series_column, index_column] + columns)
+        result = pd.concat(frames, ignore_index=True)
+        result[series_column] = result[series_column].astype("category")
+        return result[[series_column, index_column] + columns]
+
+    # sort the rows by series and index, keeping the first of duplicate rows
+    codes, series_ids = pd.factorize(df[series_column], sort=True)
+    old_index = df[index_column].to_numpy(dtype="float64")
+    values = df[columns].to_numpy(dtype="float64", na_value=np.nan)
+    keep = (codes >= 0) & ~np.isnan(old_index)
+    codes, old_index, values = codes[keep], old_index[keep], values[keep]
+    if not ((np.diff(codes) >= 0) & ((np.diff(old_index) >= 0) | (np.diff(codes) > 0))).all():
+        order = np.lexsort((old_index, codes))
+        codes, old_index, values = codes[order], old_index[order], values[order]
+    first_rows = np.ones(len(codes), dtype=bool)
+    first_rows[1:] = (codes[1:] != codes[:-1]) | (old_index[1:] != old_index[:-1])
+    codes, old_index, values = codes[first_rows], old_index[first_rows], values[first_rows]
+
+    # grid of every series, rounded outwards to the resolution as in interpolate_dataframe_to_resolution
+    bounds = np.flatnonzero(np.diff(codes, prepend=-1, append=-1))
+    starts, stops = bounds[:-1], bounds[1:]
+    first_index, last_index = old_index[starts], old_index[stops - 1]
+    starttime = np.round(first_index / resolution) * resolution
+    starttime -= resolution * (starttime - Math.EPS > first_index)
+    endtime = np.round(last_index / resolution) * resolution
+    endtime += resolution * (endtime + Math.EPS < last_index)
+    lengths = np.ceil((endtime + resolution - starttime) / resolution).astype(np.int64)
+    grid_series = np.repeat(np.arange(len(starts)), lengths)
+    steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    new_index = starttime[grid_series] + steps * ((starttime + resolution) - starttime)[grid_series]
+
+    # first grid point at or after each row, found from the grid step and corrected for rounding errors
+    grid_offsets = np.cumsum(lengths) - lengths
+    row_series = np.repeat(np.arange(len(starts)), stops - starts)
+    row_offset, row_length = grid_offsets[row_series], lengths[row_series]
+    position = np.clip(np.ceil((old_index - starttime[row_series]) / resolution), 0, row_length - 1)
+    position = row_offset + position.astype(np.int64)
+    ahead = (position < row_offset + row_length - 1) & (new_index[position] < old_index)
+    position += ahead
+    behind = (position > row_offset) & (new_index[position - 1] >= old_index)
+    position -= behind
+
+    # last row of the series at or before each grid point
+    left = np.searchsorted(position, np.arange(len(new_index)), side="right") - 1
+
+    # last and next valid row of every row and column, with a trailing row of NaN as sentinel
+    rows = len(codes)
+    row_numbers = np.arange(rows)[:, None]
+    valid = ~np.isnan(values)
+    last_valid = np.maximum.accumulate(np.where(valid, row_numbers, -1), axis=0)
+    next_valid = np.minimum.accumulate(np.where(valid, row_numbers, rows)[::-1], axis=0)[::-1]
+    last_valid = np.vstack([last_valid, np.full((1, len(columns)), -1)])
+    next_valid = np.vstack([next_valid, np.full((1, len(columns)), rows)])
+    old_index = np.r_[old_index, np.nan]
+    values = np.vstack([values, np.full((1, len(columns)), np.nan)])
+
+    # valid rows of the series around each grid point, the nearest one on both sides at the ends
+    before = last_valid[left]
+    after = next_valid[left + 1]
+    has_before = before >= starts[grid_series][:, None]
+    has_after = after < stops[grid_series][:, None]
+    before = np.where(has_before, before, np.where(has_after, after, rows))
+    after = np.where(has_after, after, before)
+
+    # linear interpolation between the valid values, holding the first and last valid value
+    columns_index = np.arange(len(columns))
+    x_before, x_new = old_index[before], new_index[:, None]
+    y_before = values[before, columns_index]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (values[after, columns_index] - y_before) / (old_index[after] - x_before)
+        between = slope * (x_new - x_before) + y_before
+    interpolated = np.where((after != before) & (x_before != x_new), between, y_before)
+
+    result = pd.DataFrame(interpolated, columns=columns)
+    result.insert(0, index_column, new_index)
+    result.insert(0, series_column, pd.Categorical.from_codes(codes[starts][grid_series], series_ids))
+    return result
+
+
 def get_volume_boum_too(d):  # d = water table range in cm, measurement
     """Volume for a truncated cone
     """
@@ -10,6 +10,9 @@ import pandas as pd
 import seaborn as sns
 from matplotlib import pyplot as plt
 
+from API_and_Data.sensor_registry import load_registry, short_id
+from API_and_Data.weather_api import device_column, load_device_cells
+
 
 def set_color_palette(size):
     """
@@ -27,48 +30,47 @@ class Plotter:
     Class for plotting data.
     """
 
-    def __init__(self):
+    def __init__(self, metadata=None, device_cells=None):
         """
         Initializes the Plotter class.
+
+        Args:
+            metadata (pd.DataFrame): The sensor metadata table (default: built from the sensor registry).
+            device_cells (dict): The weather grid cell of each device
+            (default: loaded from the "weather-cells" snapshot).
         """
         self.location_styles = {"pot": ":", "sun": "-", "tank": "--", "temperature": "--", "light": "-"}
         self.date = pd.Timestamp(year=2023, month=10, day=30).strftime("%Y-%m-%d")
         self.end_date = pd.Timestamp(year=2023, month=10, day=30).normalize() - timedelta(days=1)
-        self.sensor_dict = {"loc_1": ["21328", "21329", "21331"], "loc_0": ["14541", "21356", "14539"],
-                            "loc_2": ["21335", "21332", "21334"], "loc_4": ["21349", "21350", "21351"],
-                            "loc_9": ["21341", "21343"], "loc_6": ["21355", "21347", "21348"],
-                            "loc_5": ["21337", "21338"], "loc_8": ["21326", "21327"],
-                            "loc_3": ["21344", "21345", "21346"], "loc_7": ["21352", "21353", "21354"]}
+        registry = load_registry()
+        self.registry = registry
+        self.sensor_dict = registry.sensor_dict()
         self.numerical_columns = ["latitude", "longitude", "floor", "pot_count", "rating_climate_user",
                                   "rating_user_tomato", "rating_user_basil", "min_temperature", "average_temperature",
                                   "max_temperature", "compass_degree"]
 
-        self.sensor_id_dict = {"655c77c8-0b0f-47c7-9f6c-fe517756829e": ["21328", "21329", "21331"],
-                               "13235f69-0f74-4ef7-955d-848e831ffc3c": ["14541", "21356", "14539"],
-                               "a2146308-f5e9-4cfe-a8c5-7b84cb4f70af": ["21335", "21332", "21334"],
-                               "2a650b37-9645-46e0-825e-4a5319c09b03": ["21349", "21350", "21351"],
-                               "32a5c848-366d-4029-8861-9689acf35b85": ["21341", "21343"],
-                               "188be60e-3894-4e80-8850-165ba1e0061c": ["21355", "21347", "21348"],
-                               "a27e798c-e69c-4603-b720-d195be6c8623": ["21337", "21338"],
-                               "64f7fddf-01ac-4826-aaab-fcf4232e5bc6": ["21326", "21327"],
-                               "cc1b8cb9-cafb-4bcf-b346-f4009c0403c8": ["21344", "21345", "21346"],
-                               "5fe95b01-dce7-4c29-aae6-a39009f9e166": ["21352", "21353", "21354"], }
-        self.device_dict = {"loc_1": "655c77c8-0b0f-47c7-9f6c-fe517756829e",
-                            "loc_0": "13235f69-0f74-4ef7-955d-848e831ffc3c",
-                            "loc_2": "a2146308-f5e9-4cfe-a8c5-7b84cb4f70af",
-                            "loc_4": "2a650b37-9645-46e0-825e-4a5319c09b03",
-                            "loc_9": "32a5c848-366d-4029-8861-9689acf35b85",
-                            "loc_6": "188be60e-3894-4e80-8850-165ba1e0061c",
-                            "loc_5": "a27e798c-e69c-4603-b720-d195be6c8623",
-                            "loc_8": "64f7fddf-01ac-4826-aaab-fcf4232e5bc6",
-                            "loc_3": "cc1b8cb9-cafb-4bcf-b346-f4009c0403c8",
-                            "loc_7": "5fe95b01-dce7-4c29-aae6-a39009f9e166", }
+        self.sensor_id_dict = registry.sensor_id_dict()
+        self.device_dict = registry.device_dict()
         self.cmap = "icefire"
         self.path = "../plots/"
         self.color = set_color_palette(10)
-        self.sensor_location = {"tank": [21328, 21335, 14541, 21355, 21352, 21349, 21344, 21339],
-                                "sun": [21329, 21332, 21356, 21347, 21337, 21353, 21350, 21326, 21345, 21341],
-                                "pot": [21331, 21334, 14539, 21348, 21338, 21354, 21351, 21327, 21346, 21343]}
+        self.sensor_location = registry.sensor_location()
+        self.metadata = metadata if metadata is not None else registry.metadata()
+        self.device_cells = device_cells if device_cells is not None else load_device_cells()
+
+    def location_of(self, sensor):
+        """
+        Method to get the location of a sensor from the metadata table.
+
+        Args:
+            sensor (str): Sensor ID.
+        Returns:
+            str: Location of the sensor, or an empty string if it is unknown.
+        """
+        sensor = str(sensor)
+        if sensor not in self.metadata.index or pd.isna(self.metadata.at[sensor, "location"]):
+            return ""
+        return self.metadata.at[sensor, "location"]
 
     def plot_one_plot(self, df, cols_to_plot, num_days, loc):
         """
@@ -96,9 +98,8 @@ class Plotter:
         for i, loc_val in enumerate(loc):
             for subtitle, sensors in self.sensor_dict.items():
                 columns = [(col, f"{col}_{sensor}") for sensor in sensors for col in cols_to_plot]
-                location_columns = [("location", f"location_{sensor}") for sensor in sensors]
                 try:
-                    data = df[columns + location_columns]
+                    data = df[columns]
                 except KeyError:
                     print(f"No weather_data for {columns[0][1]}")
                     continue
@@ -112,8 +113,7 @@ class Plotter:
                 ax.set_xticklabels(data[:: 5 * num_days].index.strftime("%b-%d %H:%M"), rotation=90, fontsize=10, )
                 legend_labels = set()
                 for sensor in sensors:
-                    sensor_location_col = ("location", f"location_{sensor}")
-                    location = df[sensor_location_col].iloc[0]
+                    location = self.location_of(sensor)
                     if loc_val in location:
                         line_style = self.location_styles.get(location, "-")
                         color = color_mapping[subtitle]
@@ -169,9 +169,8 @@ class Plotter:
             color_palette = sns.color_palette("colorblind", n_colors=len(cols_to_plot))
             color_mapping = dict(zip(list(cols_to_plot), color_palette))
             columns = [(col, f"{col}_{sensor}") for sensor in sensors for col in cols_to_plot]
-            location_columns = [("location", f"location_{sensor}") for sensor in sensors]
             try:
-                data = df[columns + location_columns]
+                data = df[columns]
             except KeyError:
                 print(f"No weather_data for {columns[0][1]}")
                 continue
@@ -179,10 +178,9 @@ class Plotter:
                 start_date = self.end_date - timedelta(days=num_days)
                 data = data[(data.index >= start_date) & (data.index <= self.end_date)]
             for sensor in sensors:
-                sensor_location_col = ("location", f"location_{sensor}")
                 for col in cols_to_plot:
                     col_name = (col, f"{col}_{sensor}")
-                    location = df[sensor_location_col].iloc[0]
+                    location = self.location_of(sensor)
                     if loc[0] in location:
                         line_style = self.location_styles[location]
                     else:
@@ -280,9 +278,8 @@ class Plotter:
             else:
                 ax1 = axs[i]
             columns = [(col, f"{col}_{sensor}") for sensor in sensors for col in cols_to_plot]
-            location_columns = [("location", f"location_{sensor}") for sensor in sensors]
             try:
-                data = df[columns + location_columns]
+                data = df[columns]
             except KeyError:
                 print(f"No weather_data for {columns[0][1]}")
                 continue
@@ -296,8 +293,7 @@ class Plotter:
             for sensor in sensors:
                 if sensor not in sensor_key:
                     continue
-                sensor_location_col = ("location", f"location_{sensor}")
-                location = (location_mapping.get(sensor) or df[sensor_location_col].iloc[0])
+                location = (location_mapping.get(sensor) or self.location_of(sensor))
                 location_mapping[sensor] = location
                 line_style = (self.location_styles[location] if len(cols_to_plot) > 1 else "-")
                 legend_labels = set()
@@ -373,9 +369,8 @@ class Plotter:
                     continue
                 ax1 = axs[day // num_cols, day % num_cols]
                 columns = [(col, f"{col}_{sensor}") for sensor in sensors for col in cols_to_plot]
-                location_columns = [("location", f"location_{sensor}") for sensor in sensors]
                 try:
-                    data = df[columns + location_columns]
+                    data = df[columns]
                 except KeyError:
                     print(f"No weather_data for {columns[0][1]}")
                     continue
@@ -386,14 +381,11 @@ class Plotter:
                 if not day_data.index.empty:
                     ax1.set_title(f'{subtitle} - {day_data.index[0].strftime("%Y-%m-%d")}')
                 for sensor in sensors:
-                    sensor_location_col = ("location", f"location_{sensor}")
                     legend_labels = set()
-                    for key, value in self.sensor_id_dict.items():
-                        if sensor in value:
-                            boum_id = key
+                    boum_id = self.registry.device_of(sensor)
                     for col in cols_to_plot:
                         col_name = (col, f"{col}_{sensor}")
-                        location = df[sensor_location_col].iloc[0]
+                        location = self.location_of(sensor)
                         if location in loc:
                             line_style = self.location_styles[location]
                         else:
@@ -419,8 +411,8 @@ class Plotter:
                                 ax2.set_yticks(range(0, 3501, 600))
                                 ax2.set_ylim(0, 3500)
                                 legend_labels.add(col_name)
-                boum_id = boum_id[:-28]
-                direct_normal_data = df["direct_normal_irradiance"][f"direct_normal_irradiance_{boum_id}"]
+                direct_normal_data = df["direct_normal_irradiance"][
+                    device_column("direct_normal_irradiance", boum_id, self.device_cells)]
                 if not day_data.index.empty:
                     day_direct_normal_data = direct_normal_data[(direct_normal_data.index >= day_data.index[0]) & (
                             direct_normal_data.index <= day_data.index[-1])]
@@ -766,7 +758,7 @@ class Plotter:
             ax2 = ax1.twinx()
             ax2.twinx()
             ax4 = axes[i, 1]
-            boum_device = self.device_dict[balcony][:8]
+            boum_device = short_id(self.device_dict[balcony])
             boum_temp_col = df_filtered["temperature_boum"][f"temperature_boum_{boum_device}"]
             boum_temp_col.plot(ax=ax1, label=f"Boum Temp ({boum_device})")
             for j, sensor in enumerate(self.sensor_dict[balcony]):
@@ -815,11 +807,7 @@ class Plotter:
             str: Key.
             None: If no key is found.
         """
-        target_value = int(target_value)
-        for key in self.sensor_location:
-            for value in self.sensor_location[key]:
-                if value == target_value:
-                    return key
+        return self.registry.location_of(target_value)
 
     def plot_average_day(self, df, sensor_list=None, boum_id="13235f69"):
         """
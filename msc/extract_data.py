@@ -6,97 +6,37 @@ from datetime import timedelta
 import numpy as np
 import pandas as pd
 
+from API_and_Data.sensor_registry import load_registry, short_id
+
 
 class ExtractData:
     """
     This class contains methods for extracting data from the raw data.
     """
 
-    def __init__(self, df, number_of_days):
+    def __init__(self, df, number_of_days, metadata=None):
         """
         Initialize the ExtractData class.
 
         Args:
             df (pd.DataFrame): The raw data.
             number_of_days (int): The number of days of data to use.
+            metadata (pd.DataFrame): The sensor metadata table (default: built from the sensor registry).
         """
         self.num_days = number_of_days
         self.data = df
-        self.sensor_dict = {"loc_1": ["21328", "21329", "21331"], "loc_0": ["14541", "21356", "14539"],
-                            "loc_2": ["21335", "21332", "21334"], "loc_4": ["21349", "21350", "21351"],
-                            "loc_9": ["21341", "21343"], "loc_6": ["21355", "21347", "21348"],
-                            "loc_5": ["21337", "21338"], "loc_8": ["21326", "21327"],
-                            "loc_3": ["21344", "21345", "21346"], "loc_7": ["21352", "21353", "21354"]}
-        self.device_dict = {"loc_1": "655c77c8-0b0f-47c7-9f6c-fe517756829e",
-                            "loc_0": "13235f69-0f74-4ef7-955d-848e831ffc3c",
-                            "loc_2": "a2146308-f5e9-4cfe-a8c5-7b84cb4f70af",
-                            "loc_4": "2a650b37-9645-46e0-825e-4a5319c09b03",
-                            "loc_9": "32a5c848-366d-4029-8861-9689acf35b85",
-                            "loc_6": "188be60e-3894-4e80-8850-165ba1e0061c",
-                            "loc_5": "a27e798c-e69c-4603-b720-d195be6c8623",
-                            "loc_8": "64f7fddf-01ac-4826-aaab-fcf4232e5bc6",
-                            "loc_3": "cc1b8cb9-cafb-4bcf-b346-f4009c0403c8",
-                            "loc_7": "5fe95b01-dce7-4c29-aae6-a39009f9e166"}
-        self.tank_sensor_list = ["21328", "21349", "21352", "21335", "14541", "21355", "21344", ]
-        self.sun_sensor_list = ["21329", "21332", "21356", "21347", "21337", "21353", "21350", "21326", "21345",
-                                "21341"]
-        self.sun_tank_sensor_list = ["21328", "21335", "14541", "21355", "21352", "21349", "21344", "21329", "21332",
-                                     "21356", "21347", "21337", "21353", "21350", "21326", "21345", "21341"]
-        self.orientation_dict = {"N": "a2146308-f5e9-4cfe-a8c5-7b84cb4f70af, "
-                                      "21335, 21332, 21334", "E": "5fe95b01-dce7-4c29-aae6-a39009f9e166, "
-                                                                  "587e4fdc-7241-4eec-9603-46ef4c5a6a01,"
-                                                                  "68979444-6c7a-4a3e-985d-c92cc5b1f713,"
-                                                                  "0e511a95-101b-4b6c-bc7a-e613be938ff5, "
-                                                                  "e35608d7-3d70-473d-86cd-bca176d31bdd, "
-                                                                  "995e0d31-3a6c-479f-935c-d1bb7ee3e578, "
-                                                                  "61c434e0-69c2-4358-a8dc-35ad45eefb4b, "
-                                                                  "8bef9470-9719-4c35-b8a9-71cb96c7dc3b, "
-                                                                  "613fd40a-0b0c-4134-a379-651d9c88cebb,"
-                                                                  "21352, 21353, 21354",
-                                 "S": "188be60e-3894-4e80-8850-165ba1e0061c, "
-                                      "655c77c8-0b0f-47c7-9f6c-fe517756829e,"
-                                      "13235f69-0f74-4ef7-955d-848e831ffc3c, cc1b8cb9-cafb-4bcf-b346-f4009c0403c8,"
-                                      "32a5c848-366d-4029-8861-9689acf35b85, 54fcc077-dc16-4e9b-875c-1ee00b430094,"
-                                      "84abf531-db6f-4906-8a94-eca491b65679,2ede5849-e317-4139-be09-bb1312984fa7,"
-                                      "d0611412-4fde-4daa-9e27-af31e9c90075,b504b5bf-8581-442c-888d-a3fdf7e1cd0e,"
-                                      "0c15a648-3980-435f-8054-fd7655e22fbd,6f655cfb-2fb5-4f1b-afde-0271a212a7ef,"
-                                      "045259fa-02a1-40e4-8263-441acbbc4cd4,23bb2b14-d004-47ae-89cc-b8ca2c51f2cf,"
-                                      "a4ab53f6-10cc-4574-8e48-bd3759f919d1,d4f22445-4d03-4bce-8411-84c9a04abe29,"
-                                      "188be60e-3894-4e80-8850-165ba1e0061c, 21339, 21341, 21343, 14541, 21356, 14539,"
-                                      "21355, 21347, 21348, 21344, 21345,21346, 21328, 21329,21331",
-                                 "W": "89199585-4f2f-466c-8f5a-beb40b02c452,8eb17c70-dfec-44a0-b327-0ed890544b77,"
-                                      "fd236b88-0eed-4a75-9c55-f2bc8852d909,658e3260-b994-49a0-9903-3e804df76d54,"
-                                      "e9b34a79-a4a2-4f0f-b46b-a86ae6fcc5a0,f8959e3a-fac2-4e5b-bcf1-a8e413d2e070,"
-                                      "28eef71d-270a-4820-8fbd-6f051416c64d,dde5ad50-f8b4-4006-9f75-b369137c1268,"
-                                      "cd56fb49-b883-4fab-b45e-20802aab4a0e,c8a40a31-18b1-4c06-9b06-bdc5fd5bea10,"
-                                      "2a650b37-9645-46e0-825e-4a5319c09b03,a27e798c-e69c-4603-b720-d195be6c8623,"
-                                      "64f7fddf-01ac-4826-aaab-fcf4232e5bc6,21349, 21350, 21351, 21337, "
-                                      "21338, 14540, 21326, 21327", }
-
-        self.device_list = ["54fcc077-dc16-4e9b-875c-1ee00b430094", "84abf531-db6f-4906-8a94-eca491b65679",
-                            "89199585-4f2f-466c-8f5a-beb40b02c452", "8eb17c70-dfec-44a0-b327-0ed890544b77",
-                            "587e4fdc-7241-4eec-9603-46ef4c5a6a01", "68979444-6c7a-4a3e-985d-c92cc5b1f713",
-                            "2ede5849-e317-4139-be09-bb1312984fa7", "fd236b88-0eed-4a75-9c55-f2bc8852d909",
-                            "658e3260-b994-49a0-9903-3e804df76d54", "e9b34a79-a4a2-4f0f-b46b-a86ae6fcc5a0",
-                            "d0611412-4fde-4daa-9e27-af31e9c90075", "f8959e3a-fac2-4e5b-bcf1-a8e413d2e070",
-                            "b504b5bf-8581-442c-888d-a3fdf7e1cd0e", "28eef71d-270a-4820-8fbd-6f051416c64d",
-                            "0e511a95-101b-4b6c-bc7a-e613be938ff5", "0c15a648-3980-435f-8054-fd7655e22fbd",
-                            "dde5ad50-f8b4-4006-9f75-b369137c1268", "cd56fb49-b883-4fab-b45e-20802aab4a0e",
-                            "e35608d7-3d70-473d-86cd-bca176d31bdd", "995e0d31-3a6c-479f-935c-d1bb7ee3e578",
-                            "61c434e0-69c2-4358-a8dc-35ad45eefb4b", "6f655cfb-2fb5-4f1b-afde-0271a212a7ef",
-                            "045259fa-02a1-40e4-8263-441acbbc4cd4", "c8a40a31-18b1-4c06-9b06-bdc5fd5bea10",
-                            "8bef9470-9719-4c35-b8a9-71cb96c7dc3b", "613fd40a-0b0c-4134-a379-651d9c88cebb",
-                            "23bb2b14-d004-47ae-89cc-b8ca2c51f2cf", "a4ab53f6-10cc-4574-8e48-bd3759f919d1",
-                            "d4f22445-4d03-4bce-8411-84c9a04abe29", "32a5c848-366d-4029-8861-9689acf35b85",
-                            "cc1b8cb9-cafb-4bcf-b346-f4009c0403c8", "a2146308-f5e9-4cfe-a8c5-7b84cb4f70af",
-                            "655c77c8-0b0f-47c7-9f6c-fe517756829e", "2a650b37-9645-46e0-825e-4a5319c09b03",
-                            "13235f69-0f74-4ef7-955d-848e831ffc3c", "a27e798c-e69c-4603-b720-d195be6c8623",
-                            "64f7fddf-01ac-4826-aaab-fcf4232e5bc6", "188be60e-3894-4e80-8850-165ba1e0061c",
-                            "5fe95b01-dce7-4c29-aae6-a39009f9e166", ]
-        self.sensor_location = {"tank": [21328, 21335, 14541, 21355, 21352, 21349, 21344, 21339],
-                                "sun": [21329, 21332, 21356, 21347, 21337, 21353, 21350, 21326, 21345, 21341, ],
-                                "pot": [21331, 21334, 14539, 21348, 21338, 21354, 21351, 21327, 21346, 21343, ]}
+        registry = load_registry()
+        self.registry = registry
+        self.sensor_dict = registry.sensor_dict()
+        self.device_dict = registry.device_dict()
+        self.tank_sensor_list = registry.sensors_at("tank")
+        self.sun_sensor_list = registry.sensors_at("sun")
+        self.sun_tank_sensor_list = self.tank_sensor_list + self.sun_sensor_list
+        self.orientation_dict = registry.orientation_dict()
+        self.device_list = list(registry.devices)
+        self.sensor_location = registry.sensor_location()
         self.location = ["sun", "tank", "pot"]
+        self.metadata = metadata if metadata is not None else registry.metadata()
         self.ground_df = pd.read_csv("../data/ground_truth.csv")
         self.max_df = self.extract_max_data()
         self.hottest_day, self.hottest_temperature = self.extract_hottest_day()
@@ -123,6 +63,19 @@ class ExtractData:
         """
         return self.sensor_location
 
+    def location_of(self, sensor):
+        """
+        Gets the location of a sensor from the metadata table.
+        Args:
+            sensor (str): The sensor ID.
+        Returns:
+            str: The location of the sensor, or an empty string if it is unknown.
+        """
+        sensor = str(sensor)
+        if sensor not in self.metadata.index or pd.isna(self.metadata.at[sensor, "location"]):
+            return ""
+        return self.metadata.at[sensor, "location"]
+
     def extract_day(self):
         """
         Extracts the day's data.
@@ -205,9 +158,8 @@ class ExtractData:
         for loc_val in loc:
             for subtitle, sensors in sensor_dict.items():
                 columns = [(col, f"{col}_{sensor}") for sensor in sensors for col in cols_to_plot]
-                location_columns = [("location", f"location_{sensor}") for sensor in sensors]
                 try:
-                    data = df[columns + location_columns]
+                    data = df[columns]
                 except KeyError:
                     print(f"No weather_data for {columns[0][1]}")
                     continue
@@ -215,8 +167,7 @@ class ExtractData:
                     start_date = end_date - timedelta(days=num_days - 1)
                     data = data[(data.index >= start_date) & (data.index <= end_date)]
                 for sensor in sensors:
-                    sensor_location_col = ("location", f"location_{sensor}")
-                    location = df[sensor_location_col].iloc[0]
+                    location = self.location_of(sensor)
                     if loc_val in location:
                         for col in cols_to_plot:
                             col_name = (col, f"{col}_{sensor}")
@@ -263,11 +214,7 @@ class ExtractData:
                 filtered_rows = self.ground_df[self.ground_df["fyta_sensors"].str.contains(sensor)]
                 compass_degree = filtered_rows["compass_degree"].iloc[0]
                 self.max_df.loc[self.max_df["sensor"] == sensor, "compass_degree"] = compass_degree
-        for sen in self.max_df["sensor"]:
-            for key, value in self.sensor_dict.items():
-                for val in value:
-                    if val == sen:
-                        self.max_df.loc[self.max_df["sensor"] == sen, "place"] = key
+        self.max_df["place"] = self.max_df["sensor"].map(self.registry.balcony_of)
         return self.max_df
 
     def add_boum_temperature_values(self):
@@ -382,16 +329,8 @@ class ExtractData:
         balcony_light_df = pd.DataFrame(light_dict, index=["min", "max", "mean"])
         balcony_temperature_df = balcony_temperature_df.T
         balcony_light_df = balcony_light_df.T
-        for idx in balcony_temperature_df.index:
-            for key, value in self.sensor_dict.items():
-                for val in value:
-                    if val == idx:
-                        balcony_temperature_df.loc[balcony_temperature_df.index == idx, "place"] = key
-        for idx in balcony_light_df.index:
-            for key, value in self.sensor_dict.items():
-                for val in value:
-                    if val == idx:
-                        balcony_light_df.loc[balcony_light_df.index == idx, "place"] = key
+        balcony_temperature_df["place"] = balcony_temperature_df.index.map(self.registry.balcony_of)
+        balcony_light_df["place"] = balcony_light_df.index.map(self.registry.balcony_of)
         result_df_temperature = (balcony_temperature_df.groupby("place").agg(["mean"]).round(1))
         result_df_light = balcony_light_df.groupby("place").agg(["mean"]).round(1)
         max_mean_temp_place = result_df_temperature["mean"].idxmax()
@@ -532,10 +471,8 @@ class ExtractData:
         for sensor in sensor_list:
             light_col = self.data["light"][f"light_{sensor}"]
             temperature_col = self.data["temperature"][f"temperature_{sensor}"]
-            for key, value in self.orientation_dict.items():
-                sensor = str(sensor)
-                if sensor in value:
-                    orientation = key
+            sensor = str(sensor)
+            orientation = self.registry.orientation_of(sensor)
             max_light_index = light_col.groupby(light_col.index.date).idxmax()
             max_temperature_index = temperature_col.groupby(temperature_col.index.date).idxmax()
 
@@ -557,14 +494,12 @@ class ExtractData:
         """
         max_values_list = []
         for device in device_list:
-            device_name = device[:8]
+            device_name = short_id(device)
             input_current_col = self.data["inputCurrent_boum"][f"inputCurrent_boum_{device_name}"]
             temperature_boum_col = self.data["temperature_boum"][f"temperature_boum_{device_name}"]
             temperature_esp_col = self.data["temperatureEsp_boum"][f"temperatureEsp_boum_{device_name}"]
-            for key, value in self.orientation_dict.items():
-                device = str(device)
-                if device in value:
-                    orientation = key
+            device = str(device)
+            orientation = self.registry.orientation_of(device)
             input_current_col = pd.to_datetime(input_current_col)
             temperature_boum_col = pd.to_datetime(temperature_boum_col)
             temperature_esp_col = pd.to_datetime(temperature_esp_col)
@@ -0,0 +1,281 @@
+"""
+This module contains a streaming resampler for live telemetry.
+
+The StreamingResampler brings the samples of every series onto a regular grid and
+averages the grid points in buckets, as interpolate_dataframe_to_resolution followed by
+resample(...).mean().dropna() does for the whole history.
+Every series only keeps its last valid sample, the position of its next grid point and
+the running sum of its open bucket, so adding samples takes time in the number of
+new samples and not in the length of the history.
+
+A grid point is finished as soon as a valid sample at or after it has arrived,
+a bucket as soon as its last grid point is finished.
+The grid points after the last valid sample and the open bucket are only emitted by flush,
+which ends a series the way the end of the history ends the batch path.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from msc.MathClass import Math
+
+
+class SeriesState:
+    """
+    The SeriesState class holds what the StreamingResampler keeps of one series.
+
+    Attributes:
+        start (float): The first grid point.
+        step (float): The distance between two grid points.
+        position (int): The number of grid points emitted.
+        last_index (float): The index of the last sample.
+        last_valid (tuple): The index and value of the last valid sample, or None.
+        bucket (float): The start of the open bucket, or None.
+        total (float): The sum of the values in the open bucket.
+        compensation (float): The rounding error of total.
+        count (int): The number of values in the open bucket.
+    """
+
+    def __init__(self, first_index: float, resolution: float):
+        """
+        Initializes the SeriesState class.
+        The grid starts at the first index rounded down to the resolution,
+        as in interpolate_dataframe_to_resolution.
+
+        Args:
+            first_index (float): The index of the first sample.
+            resolution (float): The distance between two grid points.
+        """
+        start = Math.round_partial(first_index, resolution)
+        if start - Math.EPS > first_index:
+            start -= resolution
+        self.start = start
+        self.step = (start + resolution) - start
+        self.position = 0
+        self.last_index = None
+        self.last_valid = None
+        self.bucket = None
+        self.total = 0.0
+        self.compensation = 0.0
+        self.count = 0
+
+    def grid(self, stop: int) -> np.ndarray:
+        """
+        Returns the grid points from the next one up to a position.
+
+        Args:
+            stop (int): The position after the last grid point.
+
+        Returns:
+            np.ndarray: The grid points.
+        """
+        return self.start + np.arange(self.position, max(stop, self.position)) * self.step
+
+    def grid_length(self, resolution: float) -> int:
+        """
+        Returns the number of grid points of the series if it ended with its last sample.
+        The grid ends at the last index rounded up to the resolution,
+        as in interpolate_dataframe_to_resolution.
+
+        Args:
+            resolution (float): The distance between two grid points.
+
+        Returns:
+            int: The number of grid points.
+        """
+        end = Math.round_partial(self.last_index, resolution)
+        if end + Math.EPS < self.last_index:
+            end += resolution
+        return math.ceil((end + resolution - self.start) / resolution)
+
+
+class StreamingResampler:
+    """
+    The StreamingResampler class resamples series whose samples arrive over time.
+    Each series is interpolated linearly to a grid of the resolution, starting
+    at its first sample, and the grid points are averaged in buckets aligned to multiples
+    of the bucket size. The results equal those of interpolate_dataframe_to_resolution
+    and resample(...).mean().dropna() on the whole history of each series.
+
+    Attributes:
+        resolution (float): The distance between two grid points, in the unit of the index.
+        bucket_size (float): The size of a bucket, in the unit of the index.
+        series (dict): The state of every series, by series ID.
+    """
+
+    def __init__(self, resolution: float = 600, bucket_size: float = 1800):
+        """
+        Initializes the StreamingResampler class.
+
+        Args:
+            resolution (float): The distance between two grid points (default: 10 minutes in seconds).
+            bucket_size (float): The size of a bucket (default: 30 minutes in seconds).
+        """
+        self.resolution = resolution
+        self.bucket_size = bucket_size
+        self.series = {}
+
+    def update(self, series_id, index_values, values) -> (pd.DataFrame, pd.DataFrame):
+        """
+        Adds new samples of a series and returns the grid points and buckets they finish.
+        Samples must arrive in order of their index. A sample with the same index as
+        the one before it is ignored, and samples with a NaN value only extend the series.
+
+        Args:
+            series_id (str): The series ID.
+            index_values (array-like): The index values of the new samples, e.g. seconds since the epoch.
+            values (array-like): The values of the new samples.
+
+        Returns:
+            (grid_points, buckets) (pd.DataFrame, pd.DataFrame): The finished grid points and
+            buckets, with the columns series, timestamp and value.
+
+        Raises:
+            ValueError: If the samples are not in order of their index.
+        """
+        index_values = np.asarray(index_values, dtype="float64")
+        values = np.asarray(values, dtype="float64")
+        keep = ~np.isnan(index_values)
+        index_values, values = index_values[keep], values[keep]
+        if len(index_values) == 0:
+            return self.to_frames(series_id, [], [], [], [])
+        state = self.series.get(series_id)
+        if state is None:
+            state = self.series[series_id] = SeriesState(index_values[0], self.resolution)
+        previous = state.last_index if state.last_index is not None else -np.inf
+        if (np.diff(index_values) < 0).any() or index_values[0] < previous:
+            raise ValueError(f"Samples of series {series_id} must arrive in order of their index.")
+
+        # keep the first of samples with the same index
+        first = np.r_[index_values[0] != previous, index_values[1:] != index_values[:-1]]
+        index_values, values = index_values[first], values[first]
+        if len(index_values) == 0:
+            return self.to_frames(series_id, [], [], [], [])
+        state.last_index = index_values[-1]
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return self.to_frames(series_id, [], [], [], [])
+
+        # grid points up to the last valid sample, interpolated from the valid samples around them
+        known_index, known_values = index_values[valid], values[valid]
+        if state.last_valid is not None:
+            known_index = np.r_[state.last_valid[0], known_index]
+            known_values = np.r_[state.last_valid[1], known_values]
+        grid = state.grid(int(np.floor((known_index[-1] - state.start) / state.step)) + 2)
+        grid = grid[grid <= known_index[-1]]
+        grid_values = np.interp(grid, known_index, known_values)
+        state.last_valid = (known_index[-1], known_values[-1])
+        return self.emit(series_id, state, grid, grid_values, final=False)
+
+    def flush(self, series_id=None) -> (pd.DataFrame, pd.DataFrame):
+        """
+        Ends series and returns their remaining grid points and open buckets.
+        The grid points after the last valid sample hold its value.
+        A series that receives samples again after flush starts a new grid.
+
+        Args:
+            series_id (str): The series ID (default: all series).
+
+        Returns:
+            (grid_points, buckets) (pd.DataFrame, pd.DataFrame): The remaining grid points and
+            buckets, with the columns series, timestamp and value.
+        """
+        series_ids = list(self.series) if series_id is None else [series_id]
+        frames = []
+        for current_id in series_ids:
+            state = self.series.pop(current_id, None)
+            if state is None or state.last_index is None:
+                continue
+            grid = state.grid(state.grid_length(self.resolution))
+            grid_values = np.full(len(grid), state.last_valid[1] if state.last_valid else np.nan)
+            frames.append(self.emit(current_id, state, grid, grid_values, final=True))
+        if not frames:
+            return self.to_frames(series_id, [], [], [], [])
+        return (pd.concat([grid_points for grid_points, _ in frames], ignore_index=True),
+                pd.concat([buckets for _, buckets in frames], ignore_index=True))
+
+    def emit(self, series_id, state: SeriesState, grid: np.ndarray, grid_values: np.ndarray,
+             final: bool) -> (pd.DataFrame, pd.DataFrame):
+        """
+        Adds new grid points to the buckets of a series and returns them with the finished buckets.
+        The values of a bucket are summed with Kahan summation in order, as pandas does for mean.
+
+        Args:
+            series_id (str): The series ID.
+            state (SeriesState): The state of the series.
+            grid (np.ndarray): The new grid points.
+            grid_values (np.ndarray): The values at the new grid points.
+            final (bool): Whether the open bucket is finished as well.
+
+        Returns:
+            (grid_points, buckets) (pd.DataFrame, pd.DataFrame): The new grid points and
+            the finished buckets.
+        """
+        state.position += len(grid)
+        if len(grid) == 0 and not final:
+            return self.to_frames(series_id, [], [], [], [])
+
+        # bucket of every grid point; the first one may continue the open bucket
+        labels = np.floor(grid / self.bucket_size) * self.bucket_size
+        if state.bucket is not None and (len(grid) == 0 or labels[0] != state.bucket):
+            labels = np.r_[state.bucket, labels]
+            values = np.r_[np.nan, grid_values]
+        else:
+            values = grid_values
+        new_bucket = np.r_[True, labels[1:] != labels[:-1]]
+        group = np.cumsum(new_bucket) - 1
+        bucket_starts = np.flatnonzero(new_bucket)
+        total = np.zeros(len(bucket_starts))
+        compensation = np.zeros(len(bucket_starts))
+        count = np.zeros(len(bucket_starts), dtype=np.int64)
+        if state.bucket is not None:
+            total[0], compensation[0], count[0] = state.total, state.compensation, state.count
+
+        # Kahan summation in order, over all buckets at once for every rank within a bucket
+        rank = np.arange(len(labels)) - bucket_starts[group]
+        for current_rank in range(rank.max() + 1 if len(rank) else 0):
+            selected = (rank == current_rank) & ~np.isnan(values)
+            groups, addends = group[selected], values[selected]
+            corrected = addends - compensation[groups]
+            new_total = total[groups] + corrected
+            compensation[groups] = new_total - total[groups] - corrected
+            total[groups] = new_total
+            count[groups] += 1
+
+        # the last bucket stays open until the grid point after it lies in a later bucket
+        finished = np.ones(len(bucket_starts), dtype=bool)
+        next_label = math.floor((state.start + state.position * state.step) / self.bucket_size) * self.bucket_size
+        if not final and next_label == labels[-1]:
+            finished[-1] = False
+            state.bucket, state.total = labels[-1], total[-1]
+            state.compensation, state.count = compensation[-1], count[-1]
+        else:
+            state.bucket, state.total, state.compensation, state.count = None, 0.0, 0.0, 0
+        finished &= count > 0
+        with np.errstate(invalid="ignore"):
+            means = total[finished] / count[finished]
+        return self.to_frames(series_id, grid, grid_values, labels[bucket_starts][finished], means)
+
+    @staticmethod
+    def to_frames(series_id, grid, grid_values, buckets, means) -> (pd.DataFrame, pd.DataFrame):
+        """
+        Returns grid points and buckets as dataframes.
+
+        Args:
+            series_id (str): The series ID.
+            grid (array-like): The grid points.
+            grid_values (array-like): The values at the grid points.
+            buckets (array-like): The starts of the buckets.
+            means (array-like): The mean values of the buckets.
+
+        Returns:
+            (grid_points, buckets) (pd.DataFrame, pd.DataFrame): The grid points and buckets,
+            with the columns series, timestamp and value.
+        """
+        return (pd.DataFrame({"series": [series_id] * len(grid),
+                              "timestamp": np.asarray(grid, dtype="float64"),
+                              "value": np.asarray(grid_values, dtype="float64")}),
+                pd.DataFrame({"series": [series_id] * len(buckets),
+                              "timestamp": np.asarray(buckets, dtype="float64"),
+                              "value": np.asarray(means, dtype="float64")}))
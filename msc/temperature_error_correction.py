@@ -8,29 +8,22 @@ from matplotlib import pyplot as plt
 from pandas import read_pickle
 from scipy import stats
 
+from API_and_Data.sensor_registry import load_registry
+
+# Balconies whose Boum device is corrected with the FYTA sensors next to it
+CORRECTION_BALCONIES = ["loc_2", "loc_3", "loc_1", "loc_4", "loc_0", "loc_5", "loc_6", "loc_7"]
+
 
 def extract_internal_external_temperatures():
     """
-    This function extracts the internal and external temperature columns from the dataframe.
+    This function extracts the internal and external temperature columns of the correction
+    balconies from the sensor registry.
 
     Returns:
         internal_temp_cols (list): A list of internal temperature column names.
         external_temp_cols (list): A list of external temperature column names.
     """
-    internal_temp_cols = ['temperature_boum_a2146308', 'temperature_boum_cc1b8cb9',
-                          'temperature_boum_655c77c8',
-                          'temperature_boum_2a650b37', 'temperature_boum_13235f69',
-                          'temperature_boum_a27e798c',
-                          'temperature_boum_188be60e', 'temperature_boum_5fe95b01']
-    external_temp_cols = [['temperature_21335', 'temperature_21334', 'temperature_21332'],
-                          ['temperature_21344', 'temperature_21346', 'temperature_21345'],
-                          ['temperature_21328', 'temperature_21331', 'temperature_21329'],
-                          ['temperature_21349', 'temperature_21351', 'temperature_21350'],
-                          ['temperature_14541', 'temperature_14539', 'temperature_21356'],
-                          ['temperature_21336', 'temperature_21338', 'temperature_21337'],
-                          ['temperature_21355', 'temperature_21348', 'temperature_21347'],
-                          ['temperature_21352', 'temperature_21354', 'temperature_21353']]
-    return internal_temp_cols, external_temp_cols
+    return load_registry().temperature_columns(CORRECTION_BALCONIES)
 
 
 def calculate_correction_slopes_and_intercepts(internal_temp_cols, external_temp_cols):
@@ -9,6 +9,11 @@ import seaborn as sns
 from matplotlib import pyplot as plt
 from pandas import read_pickle
 
+from API_and_Data.sensor_registry import load_registry
+
+# Balconies whose Boum device is checked for overheating
+OVERHEATING_BALCONIES = ["loc_2", "loc_3", "loc_1", "loc_4", "loc_0", "loc_6"]
+
 
 def plot_overheating(data: pd.DataFrame):
     """
@@ -37,15 +42,7 @@ def plot_overheating(data: pd.DataFrame):
             tuple: A tuple containing the internal temperature columns
             and the external temperature columns.
         """
-        internal_temp_columns = ['temperature_boum_a2146308', 'temperature_boum_cc1b8cb9',
-                                 'temperature_boum_655c77c8', 'temperature_boum_2a650b37',
-                                 'temperature_boum_13235f69', 'temperature_boum_188be60e']
-        external_temp_columns = [['temperature_21335', 'temperature_21334', 'temperature_21332'],
-                                 ['temperature_21344', 'temperature_21346', 'temperature_21345'],
-                                 ['temperature_21328', 'temperature_21331', 'temperature_21329'],
-                                 ['temperature_21349', 'temperature_21351', 'temperature_21350'],
-                                 ['temperature_21336', 'temperature_21338', 'temperature_21337']]
-        return internal_temp_columns, external_temp_columns
+        return load_registry().temperature_columns(OVERHEATING_BALCONIES)
 
     internal_temp_cols, external_temp_cols = extract_internal_external_temperatures()
     df_n = data.droplevel(0, axis=1)